@@ -3,5 +3,8 @@ from .threats import router as threats
 from .score import router as score
 from .clustering import router as clustering
 from .dashboard import router as dashboard
+from .iocs import router as iocs
+from .admin import router as admin
+from .graph import router as graph
 from .alerts import router as alerts
 from .commands import router as commands  # if commands exists
@@ -0,0 +1,164 @@
+# api/routes/admin.py
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+from core.profiler import list_profiles, profile_path
+from core.querylog import query_log
+from core.retention import archive_stats, policies
+from core.scheduler import scheduler
+from core.graph import graph_status
+from core.similarity import index_status
+from core.snapshot import snapshot_status
+from core.settings import settings
+from core.startup import startup_report
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    """Admin routes are closed unless ADMIN_TOKEN is set and presented."""
+    if not settings.ADMIN_TOKEN or x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def profiles(limit: int = Query(100, ge=1, le=1000)):
+    """
+    List captured profiles (newest first). Profile a request by sending
+    `X-Profile: <ADMIN_TOKEN>` with PROFILING_ENABLED=true; the response
+    carries the file name in `X-Profile-Name`.
+    """
+    try:
+        return {
+            "status": "success",
+            "enabled": settings.PROFILING_ENABLED,
+            "sample_rate": settings.PROFILE_SAMPLE_RATE,
+            "jobs": settings.PROFILE_JOBS,
+            "profiles": list_profiles(limit),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing profiles: {str(e)}")
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    """Folded stacks, ready for flamegraph.pl or speedscope."""
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+@router.get("/db/slow")
+async def db_slow_ops(limit: int = Query(50, ge=1, le=500)):
+    """
+    Slowest Mongo operations since the last reset (top-K) plus the most recent
+    ones over SLOW_OP_MS, each with its query shape, docs returned and caller.
+    """
+    try:
+        return {
+            "status": "success",
+            "since": query_log.since.isoformat(),
+            "threshold_ms": settings.SLOW_OP_MS,
+            "slowest": query_log.slowest_ops(limit),
+            "recent_slow": query_log.recent(limit),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading slow ops: {str(e)}")
+
+
+@router.get("/db/shapes")
+async def db_query_shapes(limit: int = Query(50, ge=1, le=1000),
+                          sort: str = Query("total_ms", pattern="^(total_ms|count|max_ms|avg_ms|docs)$")):
+    """Per-shape totals (count, total/avg/max ms, docs) and the callers issuing them."""
+    try:
+        return {"status": "success", "since": query_log.since.isoformat(), "shapes": query_log.top_shapes(limit, sort)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading query shapes: {str(e)}")
+
+
+@router.get("/db/n_plus_one")
+async def db_n_plus_one(limit: int = Query(50, ge=1, le=500)):
+    """Scopes that ran the same operation shape N_PLUS_ONE_THRESHOLD+ times."""
+    try:
+        return {"status": "success", "threshold": settings.N_PLUS_ONE_THRESHOLD, "findings": query_log.findings(limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading N+1 findings: {str(e)}")
+
+
+@router.post("/db/reset")
+async def db_reset():
+    """Clear the query log, e.g. before measuring a change."""
+    query_log.reset()
+    return {"status": "success", "since": query_log.since.isoformat()}
+
+
+@router.get("/startup")
+async def startup_timings():
+    """Time spent in each import / init phase of this worker."""
+    return {"status": "success", **startup_report.as_dict()}
+
+
+@router.get("/retention")
+async def retention_status():
+    """Retention policies in effect and the size of the Parquet archive."""
+    try:
+        return {
+            "status": "success",
+            "grace_hours": settings.RETENTION_GRACE_HOURS,
+            "policies": policies(),
+            "archive": archive_stats(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading retention status: {str(e)}")
+
+
+@router.post("/retention/run")
+async def retention_run():
+    """Run the retention job now (in the background, under its scheduler lease)."""
+    return {"status": "accepted", **scheduler.trigger(["retention"])}
+
+
+@router.get("/snapshot")
+async def analytics_snapshot_status():
+    """Columnar analytics snapshot: age, watermark, parts and rows."""
+    try:
+        return {"status": "success", "snapshot": snapshot_status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading snapshot status: {str(e)}")
+
+
+@router.post("/snapshot/run")
+async def analytics_snapshot_run():
+    """Refresh the analytics snapshot now (in the background, under its scheduler lease)."""
+    return {"status": "accepted", **scheduler.trigger(["snapshot"])}
+
+
+@router.get("/similarity")
+async def similarity_index_status():
+    """Similarity index: version, segments, rows and watermark."""
+    try:
+        return {"status": "success", "index": index_status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading similarity index: {str(e)}")
+
+
+@router.post("/similarity/run")
+async def similarity_index_run():
+    """Rebuild the similarity index now (in the background, under its scheduler lease)."""
+    return {"status": "accepted", **scheduler.trigger(["similarity"])}
+
+
+@router.get("/graph")
+async def correlation_graph_status():
+    """Correlation graph: version, node and edge counts, watermark."""
+    try:
+        return {"status": "success", "graph": graph_status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading correlation graph: {str(e)}")
+
+
+@router.post("/graph/run")
+async def correlation_graph_run():
+    """Rebuild the correlation graph now (in the background, under its scheduler lease)."""
+    return {"status": "accepted", **scheduler.trigger(["graph"])}
@@ -1,8 +1,8 @@
 # api/routes/alerts.py
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Body, Query
-from core.db import save_alert, get_alerts
+from core.db import save_alert
 from core.ws import manager
-from core.queries import serialize_doc
+from core.queries import get_alerts, serialize_doc
 
 router = APIRouter()
 
@@ -1,6 +1,7 @@
 # api/routes/clustering.py
 from fastapi import APIRouter, Query, HTTPException
-from core.clustering import run_clustering
+from core.clustering import assign_new_threats, clustering_status, run_clustering
+from core.queries import serialize_doc
 
 router = APIRouter()
 
@@ -17,3 +18,25 @@ async def clustering_run(n_clusters: int = Query(5, ge=2, le=20), limit: int = Q
         return {"status": "success", "data": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running clustering: {str(e)}")
+
+
+@router.post("/assign")
+async def clustering_assign():
+    """
+    Assign new or changed threats to the nearest centroid of the current fit
+    (what ingestion does after each sync). May start a background refit if
+    assignment quality has degraded.
+    """
+    try:
+        return {"status": "success", "data": serialize_doc(await assign_new_threats())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error assigning clusters: {str(e)}")
+
+
+@router.get("/model")
+async def clustering_model():
+    """Current clustering artifact version, its drift baseline and assignment quality since the fit."""
+    try:
+        return {"status": "success", "data": serialize_doc(await clustering_status())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading clustering model: {str(e)}")
@@ -1,7 +1,11 @@
 # api/routes/dashboard.py
+from datetime import datetime
 from fastapi import APIRouter, Query, HTTPException
 from core import queries
 from core.dashboard import get_dashboard_data
+from core.queries import serialize_doc
+from core.rollups import DIMENSIONS, get_trends
+from core.sightings import get_surging_iocs, get_top_sighted_iocs
 
 router = APIRouter()
 
@@ -47,6 +51,35 @@ async def top_iocs(limit: int = 10, role: str | None = Query(None)):
         raise HTTPException(status_code=500, detail=f"Error fetching top IOCs: {str(e)}")
 
 
+@router.get("/sighted_iocs")
+async def sighted_iocs(
+    limit: int = Query(10, ge=1, le=500),
+    window: str = Query("all", pattern="^(all|7d)$"),
+):
+    """
+    Most-sighted IOCs, counted across feeds as they are ingested
+    (all time, or within the last SIGHTING_WINDOW_DAYS days with window=7d).
+    """
+    try:
+        data = await get_top_sighted_iocs(limit=limit, window=window)
+        return {"status": "success", "iocs": serialize_doc(data)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching sighted IOCs: {str(e)}")
+
+
+@router.get("/surging_iocs")
+async def surging_iocs(
+    limit: int = Query(10, ge=1, le=500),
+    new_within_days: int | None = Query(None, ge=1, description="Only IOCs first seen within this many days"),
+):
+    """IOCs whose sightings grew most versus the previous window."""
+    try:
+        data = await get_surging_iocs(limit=limit, new_within_days=new_within_days)
+        return {"status": "success", "iocs": serialize_doc(data)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching surging IOCs: {str(e)}")
+
+
 @router.get("/trending_cves")
 async def trending_cves(limit: int = 10, role: str | None = Query(None)):
     """
@@ -78,3 +111,32 @@ async def dashboard_overview(role: str | None = Query(None)):
         return {"status": "success", "data": data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating dashboard overview: {str(e)}")
+
+
+@router.get("/trends")
+async def trends(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: datetime | None = Query(None, description="Default: 30 days (48 hours) before end"),
+    end: datetime | None = Query(None, description="Default: now"),
+    group_by: str = Query("priority", description="Comma-separated: source, priority, cluster, kev"),
+    source: str | None = None,
+    priority: str | None = None,
+    cluster: int | None = None,
+    kev: bool | None = None,
+):
+    """
+    Threat counts per hour or day (by first_seen), read from the rollup
+    collections, e.g. critical threats per day per source:
+    /dashboard/trends?priority=critical&group_by=source
+    """
+    dims = [d for d in group_by.split(",") if d]
+    unknown = set(dims) - set(DIMENSIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by dimension(s): {', '.join(sorted(unknown))}")
+    filters = {k: v for k, v in {"source": source, "priority": priority, "cluster": cluster, "kev": kev}.items()
+               if v is not None}
+    try:
+        data = await get_trends(granularity, start, end, dims, filters)
+        return {"status": "success", "granularity": granularity, "series": serialize_doc(data)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching trends: {str(e)}")
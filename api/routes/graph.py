@@ -0,0 +1,90 @@
+# api/routes/graph.py
+import time
+from fastapi import APIRouter, HTTPException, Query
+from core.graph import KINDS, graph_status, start_node
+from core.settings import settings
+
+router = APIRouter()
+
+KIND_PATTERN = f"^({'|'.join(KINDS)})$"
+
+
+def _start(node: str):
+    try:
+        graph, start = start_node(node)
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if start is None:
+        raise HTTPException(status_code=404, detail=f"Node not found: {node}")
+    return graph, start
+
+
+@router.get("/neighbors")
+async def graph_neighbors(
+    node: str = Query(..., description='"kind:value" (e.g. "malware:emotet") or a bare CVE id / indicator'),
+    kind: str | None = Query(None, pattern=KIND_PATTERN, description="Only neighbors of this kind"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Directly linked entities of one node, with the relation to each."""
+    graph, start = _start(node)
+    try:
+        started = time.perf_counter()
+        neighbors = graph.neighborhood(start, kind, limit)
+        took = round((time.perf_counter() - started) * 1000, 3)
+        return {"status": "success", "node": graph.describe(start), "took_ms": took, "neighbors": neighbors}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading graph neighbors: {str(e)}")
+
+
+@router.get("/pivot")
+async def graph_pivot(
+    node: str = Query(..., description='Start node, e.g. "CVE-2024-3400"'),
+    path: list[str] = Query(..., description="Kinds to follow hop by hop, e.g. path=malware&path=ioc"),
+    limit: int = Query(100, ge=1),
+):
+    """
+    Follow a path of entity kinds from a node, e.g. CVE -> exploiting malware
+    -> its IOCs with path=malware&path=ioc. Each hop keeps at most `limit` nodes.
+    """
+    unknown = [k for k in path if k not in KINDS]
+    if unknown or len(path) > settings.GRAPH_MAX_HOPS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"path must be at most {settings.GRAPH_MAX_HOPS} of {KINDS}, got {path}",
+        )
+    graph, start = _start(node)
+    try:
+        started = time.perf_counter()
+        hops = graph.pivot(start, path, min(limit, settings.GRAPH_MAX_FRONTIER))
+        took = round((time.perf_counter() - started) * 1000, 3)
+        return {"status": "success", "node": graph.describe(start), "took_ms": took, "hops": hops}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error pivoting in graph: {str(e)}")
+
+
+@router.get("/khop")
+async def graph_khop(
+    node: str = Query(..., description='Start node, e.g. "ioc:1.2.3.4"'),
+    k: int = Query(2, ge=1),
+    limit: int = Query(100, ge=1),
+):
+    """Everything within k hops of a node, grouped by distance."""
+    if k > settings.GRAPH_MAX_HOPS:
+        raise HTTPException(status_code=400, detail=f"k must be at most {settings.GRAPH_MAX_HOPS}")
+    graph, start = _start(node)
+    try:
+        started = time.perf_counter()
+        hops = graph.khop(start, k, min(limit, settings.GRAPH_MAX_FRONTIER))
+        took = round((time.perf_counter() - started) * 1000, 3)
+        return {"status": "success", "node": graph.describe(start), "took_ms": took, "hops": hops}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error expanding graph: {str(e)}")
+
+
+@router.get("/status")
+async def graph_info():
+    """Graph version, node / edge counts and the kinds and relations it holds."""
+    try:
+        return {"status": "success", "graph": graph_status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading correlation graph: {str(e)}")
@@ -0,0 +1,83 @@
+# api/routes/iocs.py
+import json
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from core.iocs import ioc_index
+from core.scanner import log_scanner, scan_stream
+from core.settings import settings
+
+router = APIRouter()
+
+
+@router.post("/match")
+async def match_iocs(payload: dict = Body(...)):
+    """
+    Bulk-match values (IPs, domains, URLs, hashes) against known indicators.
+    Example JSON:
+    {
+        "values": ["1.2.3.4", "login.evil.com", "http://bad.example/x"]
+    }
+    Domains also match listed parent domains; IPs also match listed CIDR ranges.
+    """
+    values = payload.get("values")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Missing 'values' list in body")
+    if len(values) > settings.IOC_MATCH_MAX_VALUES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many values ({len(values)}), max is {settings.IOC_MATCH_MAX_VALUES}",
+        )
+    try:
+        await ioc_index.refresh()
+        matches = ioc_index.match_many([str(v) for v in values])
+        return {"status": "success", "checked": len(values), "matched": len(matches), "matches": matches}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error matching IOCs: {str(e)}")
+
+
+@router.get("/stats")
+async def ioc_stats():
+    """
+    Size and approximate memory of each IOC index structure.
+    """
+    return {"status": "success", "index": ioc_index.stats()}
+
+
+@router.post("/refresh")
+async def refresh_iocs(full: bool = False):
+    """
+    Refresh the IOC index now (incremental by default, full rebuild with ?full=true).
+    """
+    try:
+        if full:
+            await ioc_index.rebuild()
+        else:
+            await ioc_index.refresh(force=True)
+        return {"status": "success", "index": ioc_index.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refreshing IOC index: {str(e)}")
+
+
+@router.post("/scan")
+async def scan_logs(request: Request, format: str = Query("text", pattern="^(text|ndjson)$")):
+    """
+    Stream raw log lines (plain text or NDJSON) in the request body and get
+    back NDJSON matches of known indicators as they are found.
+    Example:
+    curl -X POST --data-binary @proxy.log "http://host:port/iocs/scan?format=text"
+    Each match has the line number, field (NDJSON only), start/end offsets,
+    and the matched threat's source and priority.
+    """
+    async def results():
+        async for match in scan_stream(request.stream(), format):
+            yield json.dumps(match) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@router.get("/scanner")
+async def scanner_stats():
+    """
+    State of the log scanner automaton (pattern count, engine, last build).
+    """
+    return {"status": "success", "scanner": log_scanner.stats()}
@@ -1,6 +1,6 @@
 # api/routes/score.py
 from fastapi import APIRouter, Query, Body, HTTPException
-from core.scoring import get_scored_threats, analyze_threats
+from core.scoring import get_scored_threats, analyze_threats, rescore_pending
 from core.queries import serialize_doc
 
 router = APIRouter()
@@ -17,6 +17,18 @@ async def scored_threats(limit: int = 50, role: str | None = Query(None)):
         raise HTTPException(status_code=500, detail=f"Error fetching scored threats: {e}")
 
 
+@router.post("/rescore_pending")
+async def rescore_pending_threats(limit: int = Query(500, le=5000)):
+    """
+    Rescore threats whose EPSS/KEV enrichment changed since they were scored.
+    """
+    try:
+        count = await rescore_pending(limit=limit)
+        return {"status": "success", "rescored": count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rescoring threats: {e}")
+
+
 @router.post("/analyze")
 async def analyze_single_threat(threat: dict = Body(...), role: str | None = Query(None)):
     """
@@ -1,13 +1,157 @@
-from fastapi import APIRouter, HTTPException
-from core.extractor import fetch_and_store_all
+import asyncio
+import time
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from core.backfill import nvd_backfill
+from core.extractor import SOURCES
+from core.scheduler import JOBS, scheduler, get_runs
+from core.queries import serialize_doc
+from core.resilience import sources_health
+from core.retention import search_archive
+from core.similarity import find_threat, similar_threats
 from core.settings import settings
 
 router = APIRouter()
 
 @router.get("/fetch_all")
-async def fetch_all_threats():
+async def fetch_all_threats(
+    source: list[str] | None = Query(None, description="Sources to sync (default: all)"),
+    wait: bool = Query(False, description="Run the sync inside this request (legacy behaviour)"),
+):
+    """
+    Trigger ingestion. Returns immediately; syncs run in the background
+    under the scheduler's per-source lease. Use /threats/runs for results.
+    With wait=true the syncs run one after another inside the request,
+    still under their leases (a source another worker is syncing is skipped).
+    """
     try:
-        result = await fetch_and_store_all()
-        return {"status": "success", "fetched": result}
+        if wait:
+            runs = [await scheduler.run_source(s, trigger="manual") for s in source or SOURCES if s in JOBS]
+            fetched = {}
+            for run in runs:
+                fetched.update(run.get("counts") or {})
+            return {"status": "success", "fetched": fetched, "runs": serialize_doc(runs)}
+        return {"status": "accepted", **scheduler.trigger(source)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch threats: {str(e)}")
+
+
+@router.get("/runs")
+async def ingestion_runs(source: str | None = None, limit: int = Query(50, le=500)):
+    """
+    Ingestion run history (most recent first) with status, counts and durations.
+    """
+    try:
+        runs = await get_runs(source=source, limit=limit)
+        return {"status": "success", "runs": serialize_doc(runs)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch ingestion runs: {str(e)}")
+
+
+@router.get("/schedule")
+async def ingestion_schedule():
+    """
+    Scheduler state: interval, next run and whether a sync is running, per source.
+    """
+    return {"status": "success", "schedule": scheduler.status()}
+
+
+@router.get("/health/sources")
+async def source_health():
+    """
+    Per-source fetch health: circuit state, failure/retry counts,
+    last error and last success, plus the policy in effect.
+    """
+    return {"status": "success", "sources": sources_health()}
+
+
+@router.post("/backfill/nvd")
+async def start_nvd_backfill(restart: bool = Query(False, description="Discard progress and start over")):
+    """
+    Start (or resume) a full NVD history backfill in the background.
+    Completed pages are recorded, so calling this again after an
+    interruption continues where it stopped.
+    """
+    started = nvd_backfill.start(restart=restart)
+    return {"status": "accepted" if started else "already_running"}
+
+
+@router.get("/backfill/nvd")
+async def nvd_backfill_status():
+    """
+    NVD backfill progress: total pages, completed page ranges, failed pages.
+    """
+    try:
+        return {"status": "success", "backfill": serialize_doc(await nvd_backfill.status())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch backfill status: {str(e)}")
+
+
+@router.get("/archive")
+async def archived_threats(
+    cve_id: str | None = None,
+    indicator: str | None = None,
+    source: str | None = None,
+    start: datetime | None = Query(None, description="Earliest fetched_at day"),
+    end: datetime | None = Query(None, description="Latest fetched_at day"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Historical lookup in the Parquet archive of records that aged out of
+    Mongo under the retention policy (newest first). Multi-node
+    deployments need ARCHIVE_DIR on storage shared by all nodes.
+    """
+    if not (cve_id or indicator or source or start or end):
+        raise HTTPException(status_code=400, detail="Give at least one of cve_id, indicator, source, start, end")
+    try:
+        results = await asyncio.to_thread(search_archive, "threats", cve_id, indicator, source, start, end, limit)
+        return {"status": "success", "count": len(results), "results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching archive: {str(e)}")
+
+
+@router.get("/similar")
+async def similar_to_text(
+    q: str = Query(..., min_length=3, description="Free text, e.g. a report excerpt"),
+    k: int = Query(10, ge=1, le=100),
+    mode: str = Query("auto", pattern="^(auto|exact|approx)$"),
+):
+    """
+    Threats whose descriptions are most similar to the text (cosine over
+    TF-IDF), from the persisted similarity index.
+    """
+    try:
+        started = time.perf_counter()
+        results = await similar_threats(q, k, mode)
+        took = round((time.perf_counter() - started) * 1000, 2)
+        return {"status": "success", "took_ms": took, "results": serialize_doc(results)}
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching similar threats: {str(e)}")
+
+
+@router.get("/{threat_id}/similar")
+async def similar_to_threat(
+    threat_id: str,
+    k: int = Query(10, ge=1, le=100),
+    mode: str = Query("auto", pattern="^(auto|exact|approx)$"),
+):
+    """
+    Threats like this one. threat_id may be the ObjectId, a CVE id or an indicator.
+    """
+    threat = await find_threat(threat_id)
+    if threat is None:
+        raise HTTPException(status_code=404, detail="Threat not found")
+    text = threat.get("description") or threat.get("title")
+    if not text:
+        return {"status": "success", "threat_id": str(threat["_id"]), "results": []}
+    try:
+        started = time.perf_counter()
+        results = await similar_threats(text, k, mode, exclude={str(threat["_id"])})
+        took = round((time.perf_counter() - started) * 1000, 2)
+        return {"status": "success", "threat_id": str(threat["_id"]), "took_ms": took, "results": serialize_doc(results)}
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching similar threats: {str(e)}")
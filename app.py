@@ -1,29 +1,53 @@
 # app.py
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import time
+from core.startup import startup_report  # first, so import phases below are timed
 
-# Import the router objects directly
-from api.routes.threats import router as threats_router
-from api.routes.score import router as score_router
-from api.routes.clustering import router as clustering_router
-from api.routes.dashboard import router as dashboard_router
+with startup_report.phase("import fastapi"):
+    from fastapi import FastAPI, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import PlainTextResponse
+
+# Import the router objects directly (each phase shows what that router adds)
+with startup_report.phase("import threats router"):
+    from api.routes.threats import router as threats_router
+with startup_report.phase("import score router"):
+    from api.routes.score import router as score_router
+with startup_report.phase("import clustering router"):
+    from api.routes.clustering import router as clustering_router
+with startup_report.phase("import dashboard router"):
+    from api.routes.dashboard import router as dashboard_router
+with startup_report.phase("import iocs router"):
+    from api.routes.iocs import router as iocs_router
+with startup_report.phase("import admin router"):
+    from api.routes.admin import router as admin_router
+with startup_report.phase("import graph router"):
+    from api.routes.graph import router as graph_router
 
 # Optional routers (alerts, commands)
-try:
-    from api.routes.alerts import router as alerts_router
-    HAS_ALERTS = True
-except ImportError:
-    HAS_ALERTS = False
-
-try:
-    from api.routes.commands import router as commands_router
-    HAS_COMMANDS = True
-except ImportError:
-    HAS_COMMANDS = False
+with startup_report.phase("import optional routers"):
+    try:
+        from api.routes.alerts import router as alerts_router
+        HAS_ALERTS = True
+    except ImportError:
+        HAS_ALERTS = False
+
+    try:
+        from api.routes.commands import router as commands_router
+        HAS_COMMANDS = True
+    except ImportError:
+        HAS_COMMANDS = False
 
 from core.db import ensure_indexes
+from core.metrics import http_request_duration, render_metrics, route_template
+from core.profiler import profile_request
+from core.querylog import db_scope
+from core.scheduler import scheduler
+from core.scoring import load_model
 from core.settings import settings
 
+_background_tasks = set()
+
 
 # ------------------------
 # FastAPI app
@@ -44,6 +68,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ------------------------
+# Request metrics
+# ------------------------
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        with db_scope(f"{request.method} {request.url.path}"):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_request_duration.observe(
+            time.perf_counter() - started, request.method, route_template(request.scope), status)
+
+
+# ------------------------
+# On-demand profiling (only registered when enabled)
+# ------------------------
+if settings.PROFILING_ENABLED:
+    app.middleware("http")(profile_request)
+
+
 # ------------------------
 # Routers
 # ------------------------
@@ -51,6 +99,9 @@ app.include_router(threats_router, prefix="/threats", tags=["Threats"])
 app.include_router(score_router, prefix="/score", tags=["Scoring"])
 app.include_router(clustering_router, prefix="/clustering", tags=["Clustering"])
 app.include_router(dashboard_router, prefix="/dashboard", tags=["Dashboard"])
+app.include_router(iocs_router, prefix="/iocs", tags=["IOCs"])
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+app.include_router(graph_router, prefix="/graph", tags=["Graph"])
 
 if HAS_ALERTS:
     app.include_router(alerts_router, prefix="/alerts", tags=["Alerts"])
@@ -63,10 +114,28 @@ if HAS_COMMANDS:
 # ------------------------
 @app.on_event("startup")
 async def startup_event():
-    await ensure_indexes()  # Ensure DB indexes
+    if settings.ENSURE_INDEXES:
+        with startup_report.phase("ensure_indexes"):
+            await ensure_indexes()  # Ensure DB indexes
+    if settings.SCHEDULER_ENABLED:
+        with startup_report.phase("start scheduler"):
+            scheduler.start()
+    if settings.MODEL_WARMUP:
+        # load the model off the event loop; requests needing it wait for the same load
+        task = asyncio.create_task(load_model())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    startup_report.ready()
+    startup_report.print()
     print("✅ Startup complete. Using database:", settings.MONGO_DB)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if settings.SCHEDULER_ENABLED:
+        await scheduler.stop()
+
+
 # ------------------------
 # Root + Health
 # ------------------------
@@ -77,6 +146,11 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of app, Mongo, feed and scoring metrics."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health():
     return {"status": "ok", "database": settings.MONGO_DB}
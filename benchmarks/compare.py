@@ -0,0 +1,71 @@
+# benchmarks/compare.py
+"""
+Compare a benchmark result against a baseline and flag regressions.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 0.10
+
+Benchmarks are compared on per-item median time, so runs at different
+scales stay comparable. Exits with status 1 when any benchmark regressed.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> list[dict]:
+    rows = []
+    base_results, cur_results = baseline.get("results", {}), current.get("results", {})
+    for name in sorted(set(base_results) | set(cur_results)):
+        base, cur = base_results.get(name), cur_results.get(name)
+        if base is None or cur is None:
+            rows.append({"name": name, "status": "new" if base is None else "missing"})
+            continue
+        ratio = cur["per_item_us"] / base["per_item_us"] if base["per_item_us"] else float("inf")
+        # ignore differences that are within run-to-run noise of the baseline
+        noise = base.get("stdev_s", 0.0) / base["median_s"] if base.get("median_s") else 0.0
+        limit = max(threshold, 2 * noise)
+        if ratio > 1 + limit:
+            status = "REGRESSION"
+        elif ratio < 1 - limit:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append({"name": name, "status": status, "ratio": round(ratio, 3),
+                     "baseline_us": base["per_item_us"], "current_us": cur["per_item_us"]})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare benchmark results against a baseline")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown fraction")
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    if baseline["meta"].get("n") != current["meta"].get("n"):
+        print(f"⚠️ Comparing different scales ({baseline['meta'].get('scale')} vs {current['meta'].get('scale')})")
+
+    rows = compare(baseline, current, args.threshold)
+    icons = {"ok": "✅", "faster": "✅", "REGRESSION": "❌", "new": "⏭️", "missing": "⚠️"}
+    for row in rows:
+        if "ratio" in row:
+            print(f"{icons[row['status']]} {row['name']:32s} {row['baseline_us']:10.2f} → "
+                  f"{row['current_us']:10.2f} µs/item  x{row['ratio']:.3f}  {row['status']}")
+        else:
+            print(f"{icons[row['status']]} {row['name']:32s} {row['status']}")
+
+    regressions = [r for r in rows if r["status"] == "REGRESSION"]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/corpus.py
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+from core.synthetic import MALWARE, _description, epss_row, ioc_value, nvd_vulnerability
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+IOC_SOURCES = ["OTX", "ThreatFox"]
+IOC_TAGS = ["phishing", "fraud", "scam", "botnet", "c2", "ransomware", "loader", "stealer"]
+
+
+def parse_scale(value: str) -> int:
+    value = value.lower()
+    return SCALES[value] if value in SCALES else int(value)
+
+
+def cve_document(rng: random.Random, i: int, base_time: datetime, kev_fraction: float) -> dict:
+    """A CVE shaped like sync_nvd stores it (NVD + EPSS + KEV merged)."""
+    cve = nvd_vulnerability(rng, i, base_time)["cve"]
+    metrics = cve["metrics"].get("cvssMetricV31")
+    _, score, percentile = epss_row(rng, i)
+    kev = rng.random() < kev_fraction
+    doc = {
+        "cve_id": cve["id"],
+        "description": cve["descriptions"][0]["value"],
+        "published": datetime.fromisoformat(cve["published"]),
+        "cvss_score": metrics[0]["cvssData"]["baseScore"] if metrics else None,
+        "epss_score": score,
+        "percentile": percentile,
+        "kev_exploited": kev,
+        "source": "NVD",
+    }
+    if kev:
+        doc["kev_details"] = {"cveID": cve["id"], "dateAdded": "2026-01-01",
+                              "knownRansomwareCampaignUse": rng.choice(["Known", "Unknown"])}
+    return doc
+
+
+def ioc_document(rng: random.Random, i: int) -> dict:
+    """An indicator shaped like the OTX / ThreatFox fetchers store it."""
+    value, kind = ioc_value(rng, i)
+    source = rng.choice(IOC_SOURCES)
+    doc = {"indicator": value, "type": kind, "source": source}
+    if source == "OTX":
+        doc["title"] = f"{rng.choice(MALWARE)} campaign {i % 97}"
+    else:
+        doc["malware"] = rng.choice(MALWARE)
+        doc["confidence"] = rng.choice([50, 75, 90, 100])
+    if rng.random() < 0.4:
+        doc["tags"] = rng.sample(IOC_TAGS, rng.randint(1, 3))
+    if rng.random() < 0.3:
+        doc["description"] = _description(rng)
+    return doc
+
+
+def threat_documents(n: int, seed: int = 42, cve_fraction: float = 0.6, kev_fraction: float = 0.05,
+                     with_ids: bool = False):
+    """
+    Yield `n` seeded threat documents: a CVE/IOC mix with realistic
+    description lengths, a skewed EPSS distribution and a KEV fraction.
+    The same (n, seed) always yields the same corpus.
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2026, 1, 1)
+    for i in range(n):
+        if rng.random() < cve_fraction:
+            doc = cve_document(rng, i, base_time, kev_fraction)
+        else:
+            doc = ioc_document(rng, i)
+        doc["fetched_at"] = base_time - timedelta(seconds=i)
+        if with_ids:
+            doc["_id"] = ObjectId()
+        yield doc
+
+
+def batches(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
@@ -0,0 +1,309 @@
+# benchmarks/loadtest.py
+"""
+Open-loop HTTP + WebSocket load generator for sizing a deployment.
+
+    python -m benchmarks.loadtest --spawn --rate 200 --duration 60 --sockets 2000 --alert-rate 5
+    python -m benchmarks.loadtest --base-url http://10.0.0.5:8000 --mix "/dashboard/overview:1,/score/?limit=20:2"
+
+Requests are started on a fixed schedule (--rate per second) regardless of
+how fast earlier ones complete, and latency is measured from the scheduled
+start, so a saturated server shows up as growing latency instead of a
+silently lower request rate. Alerts are POSTed to /alerts/ with a send
+timestamp and timed until each /alerts/ws socket receives them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+import httpx
+import websockets
+
+# read-only routes: /score/analyze saves the threat it scores, so a mix
+# including it writes synthetic threats into the target database
+DEFAULT_MIX = (
+    "/dashboard/overview:2,/dashboard/top_iocs:2,/dashboard/trending_cves:2,/dashboard/sources_count:1,"
+    "/score/?limit=20:2,/alerts/?limit=20:2"
+)
+
+
+# ========================
+# Stats
+# ========================
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def summarize(latencies: list[float], errors: int = 0, elapsed: float | None = None) -> dict:
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    total = len(values) + errors
+    out = {
+        "count": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1] if values else None),
+    }
+    if elapsed:
+        out["rate"] = round(total / elapsed, 1)
+    return out
+
+
+def parse_mix(spec: str) -> list[tuple[str, int]]:
+    mix = []
+    for part in spec.split(","):
+        path, _, weight = part.rpartition(":")
+        mix.append((path, int(weight)) if path else (part, 1))
+    return mix
+
+
+def raise_fd_limit():
+    """Thousands of sockets need more than the usual 1024 file descriptors."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+# ========================
+# Load generator
+# ========================
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.http_latency: dict[str, list[float]] = defaultdict(list)
+        self.http_errors: dict[str, int] = defaultdict(int)
+        self.status_codes: dict[int, int] = defaultdict(int)
+        self.delivery: list[float] = []
+        self.alerts_sent: dict[str, float] = {}
+        self.alert_errors = 0
+        self.ws_connected = 0
+        self.ws_failed = 0
+        self.ws_closed = 0
+        self.ws_connect_latency: list[float] = []
+        self._stop = asyncio.Event()
+
+    # ---------- HTTP ----------
+    async def _request(self, client: httpx.AsyncClient, path: str, scheduled: float):
+        label = path.split("?")[0]
+        try:
+            resp = await client.get(path)
+            self.status_codes[resp.status_code] += 1
+            if resp.status_code >= 400:
+                self.http_errors[label] += 1
+                return
+            await resp.aread()
+            self.http_latency[label].append(time.perf_counter() - scheduled)
+        except Exception:
+            self.http_errors[label] += 1
+
+    async def http_traffic(self, client: httpx.AsyncClient):
+        paths, weights = zip(*parse_mix(self.args.mix))
+        interval = 1.0 / self.args.rate
+        tasks = set()
+        start = time.perf_counter()
+        i = 0
+        while not self._stop.is_set():
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            path = random.choices(paths, weights)[0]
+            task = asyncio.create_task(self._request(client, path, scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            i += 1
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.args.timeout)
+
+    # ---------- WebSocket ----------
+    async def _socket(self, url: str):
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(url, open_timeout=self.args.timeout, max_queue=None) as ws:
+                self.ws_connected += 1
+                self.ws_connect_latency.append(time.perf_counter() - started)
+                async for raw in ws:
+                    received = time.time()
+                    alert = json.loads(raw).get("alert", {})
+                    sent = alert.get("loadtest_sent")
+                    if sent is not None and alert.get("loadtest_run") == self.run_id:
+                        self.delivery.append(received - sent)
+                self.ws_closed += 1  # server ended the stream (e.g. send queue overflow)
+        except asyncio.CancelledError:
+            pass  # end of run
+        except websockets.ConnectionClosed:
+            self.ws_closed += 1
+        except Exception:
+            self.ws_failed += 1
+
+    async def open_sockets(self) -> list[asyncio.Task]:
+        url = self.args.base_url.replace("http", "ws", 1).rstrip("/") + "/alerts/ws"
+        tasks = []
+        per_tick = max(1, self.args.ws_connect_rate // 10)
+        for i in range(self.args.sockets):
+            tasks.append(asyncio.create_task(self._socket(url)))
+            if (i + 1) % per_tick == 0:
+                await asyncio.sleep(0.1)  # ramp up instead of a SYN flood
+        return tasks
+
+    async def inject_alerts(self, client: httpx.AsyncClient):
+        interval = 1.0 / self.args.alert_rate
+        while not self._stop.is_set():
+            alert_id = uuid.uuid4().hex
+            body = {
+                "title": f"loadtest alert {alert_id[:8]}",
+                "description": "synthetic alert injected by benchmarks.loadtest",
+                "severity": "high",
+                "loadtest_run": self.run_id,
+                "loadtest_id": alert_id,
+                "loadtest_sent": time.time(),
+            }
+            try:
+                resp = await client.post("/alerts/", json=body)
+                if resp.status_code >= 400:
+                    self.alert_errors += 1
+                else:
+                    self.alerts_sent[alert_id] = body["loadtest_sent"]
+            except Exception:
+                self.alert_errors += 1
+            await asyncio.sleep(interval)
+
+    # ---------- run ----------
+    async def run(self) -> dict:
+        args = self.args
+        self.run_id = uuid.uuid4().hex
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            sockets = []
+            if args.sockets:
+                print(f"⏳ Opening {args.sockets} WebSocket connections...")
+                sockets = await self.open_sockets()
+                await asyncio.sleep(1.0)
+                print(f"✅ {self.ws_connected} sockets connected, {self.ws_failed} failed")
+
+            print(f"⏳ Driving {args.rate} req/s for {args.duration}s...")
+            started = time.perf_counter()
+            workers = [asyncio.create_task(self.http_traffic(client))]
+            if args.alert_rate and args.sockets:
+                workers.append(asyncio.create_task(self.inject_alerts(client)))
+            await asyncio.sleep(args.duration)
+            self._stop.set()
+            await asyncio.gather(*workers, return_exceptions=True)
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(1.0)  # let in-flight alerts arrive
+            for task in sockets:
+                task.cancel()
+            await asyncio.gather(*sockets, return_exceptions=True)
+
+        all_latency = [v for values in self.http_latency.values() for v in values]
+        expected = len(self.alerts_sent) * self.ws_connected
+        return {
+            "meta": {
+                "started_at": datetime.utcnow().isoformat(),
+                "base_url": args.base_url,
+                "rate": args.rate,
+                "duration_s": args.duration,
+                "mix": args.mix,
+            },
+            "http": summarize(all_latency, sum(self.http_errors.values()), elapsed),
+            "endpoints": {label: summarize(self.http_latency[label], self.http_errors[label], elapsed)
+                          for label in sorted(set(self.http_latency) | set(self.http_errors))},
+            "status_codes": dict(self.status_codes),
+            "websocket": {
+                "requested": args.sockets,
+                "connected": self.ws_connected,
+                "failed": self.ws_failed,
+                "closed_by_server": self.ws_closed,
+                "connect": summarize(self.ws_connect_latency),
+                "alerts_sent": len(self.alerts_sent),
+                "alert_errors": self.alert_errors,
+                "deliveries": len(self.delivery),
+                "delivery_ratio": round(len(self.delivery) / expected, 4) if expected else None,
+                "delivery_latency": summarize(self.delivery),
+            },
+        }
+
+
+# ========================
+# Server process (--spawn)
+# ========================
+def spawn_server(port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, SCHEDULER_ENABLED="false")
+    cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, env=env)
+
+
+async def wait_healthy(base_url: str, server: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with code {server.returncode} (is mongod running?)")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {base_url} did not become healthy in {timeout}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP + WebSocket load test for the API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn app:app locally for the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when --spawn is used")
+    parser.add_argument("--rate", type=float, default=50.0, help="HTTP requests started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of steady load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated path:weight list")
+    parser.add_argument("--concurrency", type=int, default=500, help="max open HTTP connections")
+    parser.add_argument("--sockets", type=int, default=0, help="/alerts/ws connections to hold open")
+    parser.add_argument("--ws-connect-rate", type=int, default=500, help="new sockets per second during ramp-up")
+    parser.add_argument("--alert-rate", type=float, default=1.0, help="alerts injected per second")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    print(f"ℹ️ File descriptor limit: {raise_fd_limit()}")
+
+    server = None
+    if args.spawn:
+        port = int(httpx.URL(args.base_url).port or 8000)
+        server = spawn_server(port, args.workers)
+    try:
+        if server is not None:
+            asyncio.run(wait_healthy(args.base_url, server))
+        report = asyncio.run(LoadTest(args).run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps({k: report[k] for k in ("http", "websocket")}, indent=2))
+    if args.workers > 1 and args.sockets:
+        print("⚠️ With several workers each one broadcasts only its own alerts; "
+              "sockets on other workers will not receive them.")
+
+
+if __name__ == "__main__":
+    main()
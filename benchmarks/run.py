@@ -0,0 +1,287 @@
+# benchmarks/run.py
+"""
+Benchmark the hot paths against a seeded synthetic corpus.
+
+    python -m benchmarks.run --scale 1k
+    python -m benchmarks.run --scale 100k --only serialize,queries --out baseline.json
+    python -m benchmarks.compare baseline.json benchmarks/results/latest.json
+
+Benchmarks that touch MongoDB use a separate database (--db, dropped and
+reloaded per run) on MONGO_URI; they are skipped when mongod is unreachable.
+Feed ingestion runs in FEED_MODE=replay against a generated snapshot.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# ingest runs last: it writes feed data into the benchmark database
+BENCHMARKS = ["serialize", "queries", "scoring", "batch_scoring", "clustering", "ingest"]
+DB_BENCHMARKS = {"scoring", "batch_scoring", "clustering", "ingest", "queries"}
+
+
+# ========================
+# Timing
+# ========================
+async def measure(fn, items: int, repeat: int = 5, warmup: int = 1) -> dict:
+    """Run `fn` (sync or async) warmup+repeat times; `items` is the work per run."""
+    async def once():
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+
+    for _ in range(warmup):
+        await once()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await once()
+        runs.append(time.perf_counter() - started)
+    median = statistics.median(runs)
+    return {
+        "items": items,
+        "repeat": repeat,
+        "min_s": round(min(runs), 6),
+        "median_s": round(median, 6),
+        "mean_s": round(statistics.fmean(runs), 6),
+        "stdev_s": round(statistics.stdev(runs), 6) if len(runs) > 1 else 0.0,
+        "per_item_us": round(median / max(items, 1) * 1e6, 3),
+        "items_per_s": round(items / median, 1) if median else None,
+    }
+
+
+def with_items(result: dict, items: int) -> dict:
+    """Re-derive the per-item figures once the work per run is known."""
+    median = result["median_s"]
+    result["items"] = items
+    result["per_item_us"] = round(median / max(items, 1) * 1e6, 3)
+    result["items_per_s"] = round(items / median, 1) if median else None
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+# ========================
+# Benchmarks
+# ========================
+async def bench_serialize(args) -> dict:
+    from benchmarks.corpus import threat_documents
+    from core.queries import serialize_doc
+    n = min(args.n, args.cpu_cap)
+    docs = list(threat_documents(n, seed=args.seed, with_ids=True))
+    return await measure(lambda: [serialize_doc(d) for d in docs], n, args.repeat)
+
+
+async def load_corpus(args) -> float:
+    """Drop and reload the benchmark database with the corpus; returns seconds taken."""
+    from benchmarks.corpus import batches, threat_documents
+    from core.db import client, ensure_indexes, migrate, threats_collection
+    started = time.perf_counter()
+    await client.drop_database(args.db)
+    await ensure_indexes()
+    for batch in batches(threat_documents(args.n, seed=args.seed), 10_000):
+        await threats_collection.insert_many(batch, ordered=False)
+    # corpus docs are inserted raw: give them first_seen like stored threats
+    await migrate()
+    return time.perf_counter() - started
+
+
+async def bench_scoring(args) -> dict:
+    """analyze_threats one by one (model/rules + save + alert), as /score does."""
+    from core.db import get_all_threats
+    from core.scoring import analyze_threats
+    n = min(args.n, args.score_cap)
+    threats = await get_all_threats(limit=n)
+
+    async def run():
+        for t in threats:
+            await analyze_threats(dict(t))
+    return await measure(run, len(threats), args.repeat)
+
+
+async def bench_batch_scoring(args) -> dict:
+    """The scheduled scoring job over n threats flagged for rescoring."""
+    from core.db import get_all_threats, threats_collection
+    from core.scoring import run_scoring
+    n = min(args.n, args.score_cap)
+    ids = [t["_id"] for t in await get_all_threats(limit=n)]
+
+    async def run():
+        await threats_collection.update_many({"_id": {"$in": ids}}, {"$set": {"needs_rescore": True}})
+        await run_scoring(limit=n)
+    return await measure(run, len(ids), args.repeat)
+
+
+async def bench_clustering(args) -> dict:
+    from core.clustering import run_clustering
+    n = min(args.n, args.cluster_cap)
+    return await measure(lambda: run_clustering(n_clusters=8, limit=n), n, max(1, args.repeat // 2), warmup=0)
+
+
+async def bench_ingest(args) -> dict:
+    """fetch_and_store_all end to end, feeds served from a generated replay snapshot."""
+    from core.extractor import SOURCES, fetch_and_store_all
+    from core.synthetic import generate_snapshot
+    iocs = min(args.n, args.feed_ioc_cap)
+    generate_snapshot(args.snapshot_dir, cves=args.n, iocs=iocs, techniques=200, seed=args.seed)
+    # feeds return fewer records than the snapshot holds (e.g. one NVD page):
+    # per-item figures use what was actually stored
+    counts = {}
+
+    async def run():
+        counts.update(await fetch_and_store_all())
+    result = await measure(run, 0, max(1, args.repeat // 2), warmup=0)
+    result = with_items(result, sum(counts.get(source, 0) for source in SOURCES))
+    result["snapshot"] = {"cves": args.n, "iocs": iocs}
+    result["stored"] = {source: counts.get(source, 0) for source in SOURCES}
+    return result
+
+
+async def bench_queries(args) -> dict:
+    """Dashboard read paths; returns one result per query."""
+    from core import queries
+    from core.dashboard import get_dashboard_data
+    from core.scoring import get_scored_threats
+    from core.sightings import get_surging_iocs, get_top_sighted_iocs
+    cases = {
+        "count_by_source": lambda: queries.count_by_source(),
+        "top_iocs": lambda: queries.get_top_iocs(limit=10),
+        "top_iocs_security": lambda: queries.get_top_iocs(limit=10, role="security"),
+        "trending_cves": lambda: queries.get_trending_cves(limit=10),
+        "trending_cves_financial": lambda: queries.get_trending_cves(limit=10, role="financial"),
+        "alerts": lambda: queries.get_alerts(limit=10),
+        "scored_security": lambda: get_scored_threats(limit=50, role="security"),
+        "sighted_iocs": lambda: get_top_sighted_iocs(limit=10),
+        "surging_iocs": lambda: get_surging_iocs(limit=10),
+        "dashboard_overview": lambda: get_dashboard_data(),
+    }
+    return {name: await measure(fn, 1, args.repeat) for name, fn in cases.items()}
+
+
+RUNNERS = {
+    "serialize": bench_serialize,
+    "scoring": bench_scoring,
+    "batch_scoring": bench_batch_scoring,
+    "clustering": bench_clustering,
+    "ingest": bench_ingest,
+    "queries": bench_queries,
+}
+
+
+async def mongo_available() -> bool:
+    from core.db import client
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=3)
+        return True
+    except Exception:
+        return False
+
+
+# ========================
+# Runner
+# ========================
+async def run(args) -> dict:
+    selected = args.only.split(",") if args.only else BENCHMARKS
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "n": args.n,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": {},
+        "skipped": {},
+    }
+
+    needs_db = DB_BENCHMARKS & set(selected)
+    has_db = await mongo_available() if needs_db else False
+    if needs_db and has_db:
+        print(f"⏳ Loading {args.n} synthetic threats into '{args.db}'...")
+        report["meta"]["load_s"] = round(await load_corpus(args), 3)
+
+    for name in selected:
+        if name not in RUNNERS:
+            report["skipped"][name] = "unknown benchmark"
+            continue
+        if name in DB_BENCHMARKS and not has_db:
+            report["skipped"][name] = "mongod not reachable"
+            print(f"⏭️ {name}: mongod not reachable")
+            continue
+        print(f"⏳ {name}...")
+        result = await RUNNERS[name](args)
+        if name == "queries":
+            for query, r in result.items():
+                report["results"][f"queries.{query}"] = r
+        else:
+            report["results"][name] = result
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--scale", default="1k", help="1k, 10k, 100k, 1m or a number of documents")
+    parser.add_argument("--only", default="", help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", default="cti_bench", help="database used (and dropped) by DB benchmarks")
+    parser.add_argument("--out", default=None, help="result JSON path (default benchmarks/results/)")
+    parser.add_argument("--cpu-cap", type=int, default=200_000, help="max docs for in-memory benchmarks")
+    parser.add_argument("--score-cap", type=int, default=2_000, help="max threats scored per run")
+    parser.add_argument("--cluster-cap", type=int, default=20_000, help="max threats clustered per run")
+    parser.add_argument("--feed-ioc-cap", type=int, default=100_000, help="max IOCs in the replay snapshot")
+    args = parser.parse_args(argv)
+
+    # Must be set before core.* is imported: settings are read once at import
+    os.environ["MONGO_DB"] = args.db
+    os.environ["FEED_MODE"] = "replay"
+    args.snapshot_dir = os.environ["FEED_SNAPSHOT_DIR"] = tempfile.mkdtemp(prefix="cti-bench-snapshot-")
+    # never read (or overwrite) a real analytics snapshot
+    os.environ["ANALYTICS_SNAPSHOT_DIR"] = os.path.join(args.snapshot_dir, "analytics")
+    for key in ("SLACK_WEBHOOK", "WEBHOOK_URL", "ALERT_EMAIL"):
+        os.environ[key] = ""
+
+    from benchmarks.corpus import parse_scale
+    args.n = parse_scale(args.scale)
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(args.snapshot_dir, ignore_errors=True)
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}_{args.scale}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.out is None:
+        # stable name for benchmarks.compare
+        shutil.copyfile(out, os.path.join(RESULTS_DIR, "latest.json"))
+
+    for name, r in report["results"].items():
+        print(f"  {name:32s} median {r['median_s'] * 1000:10.2f} ms   {r['per_item_us']:10.2f} µs/item")
+    print(f"✅ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
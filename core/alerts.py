@@ -57,7 +57,11 @@ async def create_and_dispatch_alert(threat: dict, role: str | None = None):
     """
     Create an alert in DB, then dispatch to Slack, webhook, email, and WebSocket clients.
     Ensures ObjectId + datetime are JSON serializable before broadcasting.
+    Near-duplicate threats are skipped; their canonical threat carries the alert.
     """
+    if threat.get("duplicate_of"):
+        return None
+
     priority = threat.get("priority", "low")
     alert = {
         "threat_id": threat.get("cve_id") or threat.get("indicator"),
@@ -0,0 +1,196 @@
+# core/backfill.py
+import asyncio
+import math
+import time
+from collections import deque
+from datetime import datetime
+import httpx
+from core.db import backfill_collection, bulk_upsert
+from core.dedup import near_duplicates
+from core.epss import epss_table
+from core.enrichment import reset_kev_snapshot
+from core.extractor import NVD_API_URL, fetch_cisa_kev, nvd_headers, parse_nvd_items, safe_fetch
+from core.resilience import call_with_policy, source_timeout
+from core.scheduler import acquire_lease, release_lease, keep_lease
+from core.settings import settings
+from core.transport import feed_client
+
+STATE_ID = "nvd"
+# circuit breaker / source policy, separate from the scheduled "nvd" sync
+BREAKER = "nvd-backfill"
+
+
+class RateLimiter:
+    """Sliding-window limiter: at most `limit` acquisitions per `window` seconds."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._times: deque = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._times and now - self._times[0] >= self.window:
+                    self._times.popleft()
+                if len(self._times) < self.limit:
+                    self._times.append(now)
+                    return
+                await asyncio.sleep(self.window - (now - self._times[0]))
+
+
+def nvd_rate_limit() -> int:
+    if settings.NVD_RATE_LIMIT:
+        return settings.NVD_RATE_LIMIT
+    return 50 if settings.NVD_API_KEY else 5
+
+
+def page_ranges(pages: list[int]) -> list[list[int]]:
+    """Compress sorted page numbers into [first, last] ranges for reporting."""
+    ranges = []
+    for page in sorted(pages):
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ranges
+
+
+async def fetch_nvd_page(client: httpx.AsyncClient, start_index: int, page_size: int) -> dict:
+    resp = await client.get(
+        NVD_API_URL,
+        params={"startIndex": start_index, "resultsPerPage": page_size},
+        headers=nvd_headers(),
+        timeout=source_timeout("nvd"),
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+class NVDBackfill:
+    """
+    Loads the full NVD history page by page (`startIndex`), fetching pages
+    concurrently within the NVD rate budget. Every page is committed with
+    one bulk write and recorded in `backfill_state`, so an interrupted
+    backfill resumes with the pages it has not completed yet.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.kev_data: dict = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, restart: bool = False) -> bool:
+        if self.running:
+            return False
+        self._task = asyncio.create_task(self.run(restart=restart))
+        return True
+
+    async def run(self, restart: bool = False):
+        lease = "backfill:nvd"
+        if not await acquire_lease(lease):
+            print("⏭️ NVD backfill already running on another worker")
+            return
+        keeper = asyncio.create_task(keep_lease(lease))
+        try:
+            await self._run(restart)
+        except Exception as e:
+            await backfill_collection.update_one(
+                {"_id": STATE_ID}, {"$set": {"status": "error", "error": str(e), "updated_at": datetime.utcnow()}}
+            )
+            print(f"❌ NVD backfill failed: {e}")
+        finally:
+            keeper.cancel()
+            await release_lease(lease)
+
+    async def _run(self, restart: bool):
+        page_size = settings.NVD_BACKFILL_PAGE_SIZE
+        state = await backfill_collection.find_one({"_id": STATE_ID})
+        if restart or not state or state.get("page_size") != page_size:
+            state = {"_id": STATE_ID, "page_size": page_size, "completed": [], "started_at": datetime.utcnow()}
+            await backfill_collection.replace_one({"_id": STATE_ID}, state, upsert=True)
+
+        # KEV deltas only cover catalog changes, so backfilled CVEs get the full list here
+        self.kev_data = await safe_fetch("kev", fetch_cisa_kev)
+        if not self.kev_data:
+            # catalog unavailable: have the next NVD sync apply all of it instead
+            await reset_kev_snapshot()
+
+        limiter = RateLimiter(nvd_rate_limit(), settings.NVD_RATE_WINDOW)
+        semaphore = asyncio.Semaphore(settings.NVD_BACKFILL_CONCURRENCY)
+
+        async def fetch_limited(client, start: int, size: int):
+            # every attempt, retries included, spends from the NVD rate budget
+            await limiter.acquire()
+            return await fetch_nvd_page(client, start, size)
+
+        async with feed_client() as client:
+            # the first page tells us how many results there are
+            first = await call_with_policy(BREAKER, fetch_limited, client, 0, page_size)
+            total = first.get("totalResults", 0)
+            pages = math.ceil(total / page_size) if total else 0
+            completed = set(state.get("completed", []))
+            await backfill_collection.update_one(
+                {"_id": STATE_ID},
+                {"$set": {"status": "running", "total_results": total, "pages": pages, "updated_at": datetime.utcnow()},
+                 "$unset": {"error": ""}},
+            )
+            print(f"⏳ NVD backfill: {total} CVEs in {pages} pages, {len(completed)} already done")
+
+            async def run_page(page: int, data: dict | None = None):
+                async with semaphore:
+                    if data is None:
+                        data = await call_with_policy(BREAKER, fetch_limited, client, page * page_size, page_size)
+                    await self._store_page(page, data)
+
+            todo = [p for p in range(pages) if p not in completed]
+            tasks = [run_page(p, first if p == 0 else None) for p in todo]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        failed = [todo[i] for i, r in enumerate(results) if isinstance(r, Exception)]
+        status = "partial" if failed else "complete"
+        await backfill_collection.update_one(
+            {"_id": STATE_ID},
+            {"$set": {"status": status, "failed_pages": failed, "finished_at": datetime.utcnow(),
+                      "updated_at": datetime.utcnow()}},
+        )
+        print(f"✅ NVD backfill {status}: {len(todo) - len(failed)} pages stored, {len(failed)} failed")
+
+    async def _store_page(self, page: int, data: dict):
+        cves = parse_nvd_items(data)
+        now = datetime.utcnow()
+        for cve in cves:
+            cve["fetched_at"] = now
+            cve.update(epss_table.get(cve["cve_id"]) or {})
+            if self.kev_data:
+                cve["kev_exploited"] = cve["cve_id"] in self.kev_data
+                if cve["kev_exploited"]:
+                    cve["kev_details"] = self.kev_data[cve["cve_id"]]
+            await near_duplicates.annotate(cve)
+        # historical CVEs: scored by the scoring job, but never alerted on
+        await bulk_upsert(cves, "cve_id", quiet=True)
+        await backfill_collection.update_one(
+            {"_id": STATE_ID},
+            {"$addToSet": {"completed": page}, "$inc": {"stored": len(cves)}, "$set": {"updated_at": now}},
+        )
+
+    async def status(self) -> dict:
+        state = await backfill_collection.find_one({"_id": STATE_ID}) or {}
+        completed = state.pop("completed", [])
+        state.pop("_id", None)
+        state["completed_pages"] = len(completed)
+        state["completed_ranges"] = page_ranges(completed)
+        state["running_here"] = self.running
+        return state
+
+
+# single shared backfill runner
+nvd_backfill = NVDBackfill()
+
+if __name__ == "__main__":
+    asyncio.run(nvd_backfill.run())
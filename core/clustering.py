@@ -1,21 +1,168 @@
 # core/clustering.py
 import asyncio
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from core.db import threats_collection, save_threat
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from core.db import threats_collection, cluster_state_collection, cluster_models_bucket, CANONICAL_FILTER
+from core.profiler import profile_job
+from core.querylog import db_scope
+from core.rollups import schedule_rollup_refresh
+from core.settings import settings
+from core.snapshot import snapshot_frame, snapshot_usable
 
+_background_tasks: set[asyncio.Task] = set()
+# (version, artifact) of the last loaded clustering artifact
+_artifact_cache: dict = {}
+
+
+def _object_id(value):
+    """Snapshot rows carry _id as a string."""
+    return ObjectId(value) if isinstance(value, str) and ObjectId.is_valid(value) else value
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+# ========================
+# Versioned artifact: fitted vectorizer + centroids
+# ========================
+# The artifact is written to CLUSTER_MODEL_DIR on the node that fitted it and
+# published to GridFS; other nodes download the version cluster_state points
+# at before assigning.
+def _pointer_path() -> str:
+    return os.path.join(settings.CLUSTER_MODEL_DIR, "current.json")
+
+
+def _artifact_name(version: str) -> str:
+    return f"cluster-{version}.joblib"
+
+
+def _write_pointer(version: str):
+    tmp = f"{_pointer_path()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "path": _artifact_name(version)}, f)
+    os.replace(tmp, _pointer_path())
+
+
+def _prune_artifacts():
+    # keep the last CLUSTER_MODEL_KEEP versions for rollback / comparison
+    artifacts = sorted(n for n in os.listdir(settings.CLUSTER_MODEL_DIR) if n.startswith("cluster-"))
+    for name in artifacts[:-settings.CLUSTER_MODEL_KEEP]:
+        os.remove(os.path.join(settings.CLUSTER_MODEL_DIR, name))
+
+
+def save_artifact(vectorizer, kmeans, baseline: dict, fitted_on: int) -> str:
+    """Persist a fit as cluster-<version>.joblib and point current.json at it."""
+    import joblib
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(settings.CLUSTER_MODEL_DIR, exist_ok=True)
+    path = os.path.join(settings.CLUSTER_MODEL_DIR, _artifact_name(version))
+    joblib.dump({
+        "version": version,
+        "vectorizer": vectorizer,
+        "kmeans": kmeans,
+        "n_clusters": int(kmeans.n_clusters),
+        "fitted_at": datetime.utcnow(),
+        "fitted_on": fitted_on,
+        "baseline": baseline,
+    }, path, compress=3)
+    _write_pointer(version)
+    _prune_artifacts()
+    return version
+
+
+async def publish_artifact(version: str):
+    """Upload a locally saved version to GridFS, keeping the last CLUSTER_MODEL_KEEP there too."""
+    name = _artifact_name(version)
+    with open(os.path.join(settings.CLUSTER_MODEL_DIR, name), "rb") as f:
+        data = f.read()
+    await cluster_models_bucket.upload_from_stream(name, data, metadata={"version": version})
+    cursor = cluster_models_bucket.find({}, sort=[("metadata.version", -1)], skip=settings.CLUSTER_MODEL_KEEP)
+    async for old in cursor:
+        await cluster_models_bucket.delete(old._id)
+
+
+async def fetch_artifact(version: str) -> bool:
+    """Download `version` from GridFS and make it current here; False if it was not published."""
+    name = _artifact_name(version)
+    try:
+        grid_out = await cluster_models_bucket.open_download_stream_by_name(name)
+    except NoFile:
+        return False
+    data = await grid_out.read()
+
+    def install():
+        os.makedirs(settings.CLUSTER_MODEL_DIR, exist_ok=True)
+        path = os.path.join(settings.CLUSTER_MODEL_DIR, name)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+        _write_pointer(version)
+        _prune_artifacts()
+
+    await asyncio.to_thread(install)
+    return True
+
+
+def load_artifact() -> dict | None:
+    """The current artifact (cached until current.json points elsewhere), None if never fitted."""
+    import joblib
+    try:
+        with open(_pointer_path(), encoding="utf-8") as f:
+            pointer = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if _artifact_cache.get("version") != pointer["version"]:
+        artifact = joblib.load(os.path.join(settings.CLUSTER_MODEL_DIR, pointer["path"]))
+        _artifact_cache.clear()
+        _artifact_cache.update(version=pointer["version"], artifact=artifact)
+    return _artifact_cache["artifact"]
+
+
+def _assign(artifact: dict, texts: list[str]):
+    """Nearest centroid, distance to it, and whether the text had no known terms."""
+    X = artifact["vectorizer"].transform(texts)
+    distances = artifact["kmeans"].transform(X)
+    return distances.argmin(axis=1), distances.min(axis=1), X.getnnz(axis=1) == 0
+
+
+# ========================
+# Full fit
+# ========================
 async def run_clustering(n_clusters: int = 5, limit: int = 500):
     """
     Cluster threats based on their textual description using KMeans.
+    Only canonical members of near-duplicate groups are clustered.
+    The fit is saved as a new artifact version; threats not in the fit are
+    then assigned to its centroids by assign_new_threats.
     """
-    cursor = threats_collection.find({}).limit(limit)
-    threats = await cursor.to_list(length=limit)
+    with db_scope("clustering"):
+        async with profile_job("clustering", f"k{n_clusters}_n{limit}"):
+            return await _run_clustering(n_clusters, limit)
 
-    if not threats:
-        return {"status": "no_data", "clusters": []}
+async def _run_clustering(n_clusters: int, limit: int):
+    # heavy ML stack, imported on first clustering run rather than at startup
+    import numpy as np
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.cluster import KMeans
+
+    df = None
+    if snapshot_usable():
+        # columnar snapshot: no BSON decode, no load on the operational database
+        df = await asyncio.to_thread(snapshot_frame, ["_id", "description"], True, limit)
+    if df is None:
+        cursor = threats_collection.find(CANONICAL_FILTER, {"description": 1}).limit(limit)
+        df = pd.DataFrame(await cursor.to_list(length=limit))
 
-    df = pd.DataFrame(threats)
+    if df.empty:
+        return {"status": "no_data", "clusters": []}
 
     # Ensure description field
     if "description" not in df.columns:
@@ -29,23 +176,195 @@ async def run_clustering(n_clusters: int = 5, limit: int = 500):
     # KMeans clustering
     kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
     df["cluster"] = kmeans.fit_predict(X)
+    df["distance"] = kmeans.transform(X).min(axis=1)
 
-    results = []
-    for idx, row in df.iterrows():
-        threat = threats[idx]
-        threat["cluster"] = int(row["cluster"])
-        await save_threat(threat)  # update with cluster assignment
-        results.append({
-            "id": str(threat.get("_id")),
-            "description": threat.get("description"),
-            "cluster": int(row["cluster"]),
-        })
+    # drift baseline: how far the fitted threats sit from their centroid
+    baseline = {
+        "mean_distance": float(df["distance"].mean()),
+        "p95_distance": float(np.percentile(df["distance"], 95)),
+    }
+    version = await asyncio.to_thread(save_artifact, vectorizer, kmeans, baseline, len(df))
+    await publish_artifact(version)
+
+    # write back only the assignment, in one bulk write
+    clustered_at = datetime.utcnow()
+    ops = [
+        UpdateOne({"_id": _object_id(_id)}, {"$set": {
+            "cluster": int(cluster),
+            "cluster_version": version,
+            "cluster_distance": float(distance),
+            "cluster_text_hash": _text_hash(description),
+            "clustered_at": clustered_at,
+        }})
+        for _id, description, cluster, distance in zip(df["_id"], df["description"], df["cluster"], df["distance"])
+    ]
+    await threats_collection.bulk_write(ops, ordered=False)
+    # new version: every other threat is reassigned to the new centroids
+    await cluster_state_collection.replace_one(
+        {"_id": "threats"},
+        {"version": version, "watermark": None, "assigned": 0, "outliers": 0, "fitted_at": clustered_at},
+        upsert=True,
+    )
+    schedule_rollup_refresh()
+
+    results = [
+        {"id": str(_id), "description": description, "cluster": int(cluster)}
+        for _id, description, cluster in zip(df["_id"][:20], df["description"][:20], df["cluster"][:20])
+    ]
 
     return {
         "status": "success",
         "n_clusters": n_clusters,
-        "count": len(results),
-        "clusters": results[:20],  # preview first 20
+        "version": version,
+        "count": len(df),
+        "clusters": results,  # preview first 20
+    }
+
+
+# ========================
+# Incremental assignment
+# ========================
+async def assign_new_threats() -> dict:
+    """
+    Assign new or changed threats to the nearest centroid of the current
+    artifact, in batches. Right after a refit every threat outside the fit
+    is (re)assigned; afterwards only threats fetched since the last run,
+    and of those only the ones whose description changed.
+    """
+    state = await cluster_state_collection.find_one({"_id": "threats"}) or {}
+    artifact = await asyncio.to_thread(load_artifact)
+    current = state.get("version")
+    if current and (artifact is None or artifact["version"] < current):
+        # refitted on another node: never assign with older centroids
+        if await fetch_artifact(current):
+            artifact = await asyncio.to_thread(load_artifact)
+        if artifact is None or artifact["version"] != current:
+            return {"status": "stale_model", "version": current,
+                    "local_version": artifact["version"] if artifact else None}
+    if artifact is None:
+        return {"status": "no_model"}
+    version = artifact["version"]
+    if current != version:
+        state = {"version": version, "watermark": None, "assigned": 0, "outliers": 0}
+
+    started = datetime.utcnow()
+    query = dict(CANONICAL_FILTER)
+    if state.get("watermark"):
+        query["fetched_at"] = {"$gte": state["watermark"]}
+    else:
+        query["cluster_version"] = {"$ne": version}
+    cursor = threats_collection.find(query, {"description": 1, "cluster_version": 1, "cluster_text_hash": 1})
+    cursor.batch_size(settings.CLUSTER_ASSIGN_BATCH)
+
+    p95 = artifact["baseline"]["p95_distance"]
+    assigned = outliers = 0
+    batch = []
+
+    async def flush():
+        nonlocal assigned, outliers
+        texts = [t for _, t in batch]
+        clusters, distances, empty = await asyncio.to_thread(_assign, artifact, texts)
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne({"_id": _id}, {"$set": {
+                "cluster": int(cluster),
+                "cluster_version": version,
+                "cluster_distance": float(distance),
+                "cluster_text_hash": _text_hash(text),
+                "clustered_at": now,
+            }})
+            for (_id, text), cluster, distance in zip(batch, clusters, distances)
+        ]
+        await threats_collection.bulk_write(ops, ordered=False)
+        assigned += len(batch)
+        # far from every centroid, or no term the vectorizer knows
+        outliers += int(((distances > p95) | empty).sum())
+
+    async for doc in cursor:
+        text = str(doc.get("description") or "")
+        if doc.get("cluster_version") == version and doc.get("cluster_text_hash") == _text_hash(text):
+            continue
+        batch.append((doc["_id"], text))
+        if len(batch) >= settings.CLUSTER_ASSIGN_BATCH:
+            await flush()
+            batch = []
+    if batch:
+        await flush()
+
+    state["assigned"] = state.get("assigned", 0) + assigned
+    state["outliers"] = state.get("outliers", 0) + outliers
+    try:
+        # only while this version is current: a refit in the meantime resets the state
+        await cluster_state_collection.update_one(
+            {"_id": "threats", "$or": [{"version": version}, {"version": {"$exists": False}}]},
+            {"$set": {"version": version, "watermark": started}, "$inc": {"assigned": assigned, "outliers": outliers}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return {"status": "superseded", "version": version, "assigned": assigned}
+    if assigned:
+        schedule_rollup_refresh()
+
+    drift = check_drift(state)
+    if drift["drifted"]:
+        schedule_refit(artifact["n_clusters"])
+    return {"status": "success", "version": version, "assigned": assigned, "outliers": outliers, "drift": drift}
+
+
+# ========================
+# Drift monitoring
+# ========================
+def check_drift(state: dict) -> dict:
+    """
+    Assignment quality since the last fit: share of assigned threats beyond
+    the fit's p95 distance (about 5% when new threats look like the fitted
+    ones). Drifted once it exceeds CLUSTER_DRIFT_OUTLIER_RATE.
+    """
+    assigned = state.get("assigned", 0)
+    rate = state.get("outliers", 0) / assigned if assigned else 0.0
+    return {
+        "assigned": assigned,
+        "outlier_rate": round(rate, 4),
+        "threshold": settings.CLUSTER_DRIFT_OUTLIER_RATE,
+        "drifted": assigned >= settings.CLUSTER_DRIFT_MIN_SAMPLES and rate > settings.CLUSTER_DRIFT_OUTLIER_RATE,
+    }
+
+
+async def _refit(n_clusters: int):
+    from core.scheduler import acquire_lease, release_lease  # local import: core.scheduler imports this module
+
+    state = await cluster_state_collection.find_one({"_id": "threats"}) or {}
+    fitted_at = state.get("fitted_at")
+    if fitted_at and datetime.utcnow() - fitted_at < timedelta(hours=settings.CLUSTER_REFIT_COOLDOWN_H):
+        return
+    if not await acquire_lease("clustering:refit"):
+        return
+    try:
+        print(f"⚠️ Cluster assignment quality degraded ({check_drift(state)}); refitting in the background.")
+        result = await run_clustering(n_clusters=n_clusters, limit=settings.CLUSTER_REFIT_LIMIT)
+        print(f"✅ Clusters refitted: version {result.get('version')} on {result.get('count')} threats")
+    except Exception as e:
+        print(f"❌ Cluster refit failed: {e}")
+    finally:
+        await release_lease("clustering:refit")
+
+
+def schedule_refit(n_clusters: int):
+    task = asyncio.create_task(_refit(n_clusters))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def clustering_status() -> dict:
+    artifact = load_artifact()
+    state = await cluster_state_collection.find_one({"_id": "threats"}) or {}
+    state.pop("_id", None)
+    return {
+        "model": None if artifact is None else {
+            k: artifact[k] for k in ("version", "n_clusters", "fitted_at", "fitted_on", "baseline")
+        },
+        "state": state,
+        "drift": check_drift(state),
     }
 
 # Run standalone for testing
@@ -0,0 +1,114 @@
+# core/columnar.py
+import json
+import os
+import uuid
+from datetime import date, datetime
+from bson import ObjectId
+
+# pyarrow is imported lazily: only archive/snapshot jobs and historical
+# lookups need it, not every worker at startup
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def doc_json(doc: dict, exclude: set[str] = frozenset()) -> str:
+    """Whole document as compact JSON (ObjectId/datetime made safe)."""
+    return json.dumps({k: v for k, v in doc.items() if k not in exclude},
+                      default=_json_default, separators=(",", ":"))
+
+
+def _coerce(value, kind: str):
+    if value is None:
+        return None
+    if kind == "string":
+        return str(value)
+    if kind == "float":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == "bool":
+        return bool(value)
+    if kind == "timestamp":
+        return value if isinstance(value, datetime) else None
+    if kind == "int":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+
+def arrow_schema(columns: dict[str, str]):
+    import pyarrow as pa
+    types = {"string": pa.string(), "float": pa.float64(), "bool": pa.bool_(),
+             "timestamp": pa.timestamp("ms"), "int": pa.int64()}
+    return pa.schema([(name, types[kind]) for name, kind in columns.items()])
+
+
+def to_arrow_table(docs: list[dict], columns: dict[str, str], json_column: str | None = None):
+    """
+    Build an Arrow table column by column from Mongo documents.
+    `columns` maps field -> string/float/bool/int/timestamp; "_id" is
+    stored as its string form. With `json_column`, the full document is
+    kept as JSON so nothing is lost in the projection.
+    """
+    import pyarrow as pa
+    data = {
+        name: [_coerce(doc.get(name), kind) for doc in docs]
+        for name, kind in columns.items()
+    }
+    schema = arrow_schema(columns)
+    if json_column:
+        data[json_column] = [doc_json(doc) for doc in docs]
+        schema = schema.append(pa.field(json_column, pa.string()))
+    return pa.Table.from_pydict(data, schema=schema)
+
+
+def write_parquet(table, path: str, compression: str = "zstd"):
+    """Write atomically (tmp + rename) so readers never see a partial file."""
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # dot-prefixed so dataset readers skip it while it is being written
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+    pq.write_table(table, tmp, compression=compression)
+    os.replace(tmp, path)
+
+
+def partition_value(value) -> str:
+    """Safe hive partition value (source names, dates)."""
+    text = str(value if value not in (None, "") else "unknown")
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in text)
+
+
+def open_dataset(base_dir: str, partitions: dict[str, str] | None = None):
+    """
+    Hive-partitioned Parquet directory as a pyarrow dataset (None if absent).
+    Pass `partitions` to type partition columns explicitly, so filters don't
+    depend on type inference from directory names.
+    """
+    import pyarrow.dataset as ds
+    if not os.path.isdir(base_dir):
+        return None
+    partitioning = "hive"
+    if partitions:
+        partitioning = ds.partitioning(arrow_schema(partitions), flavor="hive")
+    return ds.dataset(base_dir, format="parquet", partitioning=partitioning,
+                      exclude_invalid_files=True, ignore_prefixes=[".", "_"])
+
+
+def read_dataset(base_dir: str, partitions: dict[str, str] | None = None, filter_expr=None,
+                 columns: list[str] | None = None, limit: int | None = None):
+    """Read with partition pruning and predicate pushdown."""
+    dataset = open_dataset(base_dir, partitions)
+    if dataset is None:
+        return None
+    if limit is None:
+        return dataset.to_table(filter=filter_expr, columns=columns)
+    return dataset.scanner(filter=filter_expr, columns=columns).head(limit)
@@ -1,7 +1,21 @@
 # core/dashboard.py
+import asyncio
 from core.db import get_data
 from core.scoring import get_scored_threats
+from core.querylog import traced
+from core.snapshot import load_snapshot, snapshot_usable
 
+
+def snapshot_cluster_counts() -> dict | None:
+    """Threats per cluster, counted over the columnar snapshot (None if it cannot be read)."""
+    table = load_snapshot(["cluster"], canonical_only=True)
+    if table is None:
+        return None
+    counts = table["cluster"].drop_null().value_counts().to_pylist()
+    return {c["values"]: c["counts"] for c in counts}
+
+
+@traced
 async def get_dashboard_data(role: str | None = None):
     """
     Aggregate key dashboard metrics for threats:
@@ -14,19 +28,20 @@ async def get_dashboard_data(role: str | None = None):
     # Get scored threats (AI / rule-based scoring applied)
     scored = await get_scored_threats(limit=500, role=role) or []
 
-    # Get clustered threats (if clustering pipeline was executed)
-    clustered = await get_data("clustered_threats") or []
-
     # Compute summary metrics
     total = len(scored)
     high_risk = sum(1 for t in scored if t.get("priority") in ["high", "critical"])
     critical_risk = sum(1 for t in scored if t.get("priority") == "critical")
 
     # Build cluster stats
-    cluster_summary = {}
-    for c in clustered:
-        cluster_name = c.get("cluster", "unknown")
-        cluster_summary[cluster_name] = cluster_summary.get(cluster_name, 0) + 1
+    cluster_summary = await asyncio.to_thread(snapshot_cluster_counts) if snapshot_usable() else None
+    if cluster_summary is None:
+        # clustered threats (if clustering pipeline was executed)
+        clustered = await get_data("clustered_threats") or []
+        cluster_summary = {}
+        for c in clustered:
+            cluster_name = c.get("cluster", "unknown")
+            cluster_summary[cluster_name] = cluster_summary.get(cluster_name, 0) + 1
 
     # Ensure top threats are serializable (avoid ObjectId/datetime issues)
     def safe_threat(t: dict):
@@ -1,11 +1,60 @@
 # core/db.py
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import ASCENDING, DESCENDING
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne, WriteConcern, read_preferences
 from core.settings import settings
-from datetime import datetime
+from core.metrics import MongoMetricsListener
+from core.querylog import QueryLogListener
+from datetime import datetime, timedelta
 
-client = AsyncIOMotorClient(settings.MONGO_URI)
+
+
+def client_options() -> dict:
+    """Pool, compression and monitoring options for the shared client."""
+    listeners = [MongoMetricsListener()]
+    if settings.MONGO_MONITORING:
+        listeners.append(QueryLogListener())
+    options = {
+        "event_listeners": listeners,
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        # connect=False: no sockets/threads until first use, so serve.py can
+        # import this module in the gunicorn master and fork workers safely
+        "connect": False,
+    }
+    if settings.MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = settings.MONGO_MAX_IDLE_TIME_MS
+    if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+        options["zlibCompressionLevel"] = settings.MONGO_ZLIB_LEVEL
+    return options
+
+
+def analytics_read_preference():
+    """Read preference for dashboard/export/training reads (may be slightly stale)."""
+    name = settings.MONGO_ANALYTICS_READ_PREFERENCE
+    if name == "primary":
+        return read_preferences.Primary()
+    cls = {
+        "primaryPreferred": read_preferences.PrimaryPreferred,
+        "secondary": read_preferences.Secondary,
+        "secondaryPreferred": read_preferences.SecondaryPreferred,
+        "nearest": read_preferences.Nearest,
+    }[name]
+    return cls(max_staleness=settings.MONGO_ANALYTICS_MAX_STALENESS_S)
+
+
+def bulk_write_concern() -> WriteConcern:
+    w = int(settings.MONGO_BULK_W) if settings.MONGO_BULK_W.isdigit() else settings.MONGO_BULK_W
+    return WriteConcern(w=w, j=settings.MONGO_BULK_JOURNAL)
+
+
+client = AsyncIOMotorClient(settings.MONGO_URI, **client_options())
 db = client[settings.MONGO_DB]
+# same pool, different routing: reads that tolerate replication lag
+analytics_db = client.get_database(settings.MONGO_DB, read_preference=analytics_read_preference())
 
 # Collections
 threats_collection = db["threats"]
@@ -13,20 +62,128 @@ alerts_collection = db["alerts"]
 users_collection = db["users"]
 roles_collection = db["roles"]
 clustered_collection = db["clustered_threats"]  # ✅ for clustering results
+locks_collection = db["locks"]                  # scheduler leases
+runs_collection = db["ingestion_runs"]          # scheduler run history
+backfill_collection = db["backfill_state"]      # resumable backfill progress
+rollups_hourly_collection = db["threat_rollups_hourly"]  # trend counts (core.rollups)
+rollups_daily_collection = db["threat_rollups_daily"]
+rollup_state_collection = db["rollup_state"]
+cluster_state_collection = db["cluster_state"]   # incremental cluster assignment / drift
+sightings_collection = db["indicator_sightings"]  # per-indicator sighting counters (core.sightings)
+# fitted clustering artifacts, so every node assigns with the centroids cluster_state points at
+cluster_models_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="cluster_models")
+# last applied EPSS / KEV snapshots for delta re-enrichment (core.enrichment)
+enrichment_state_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="enrichment_state")
+
+# Read-only views for dashboard / export / training queries
+threats_read_collection = analytics_db["threats"]
+alerts_read_collection = analytics_db["alerts"]
+sightings_read_collection = analytics_db["indicator_sightings"]
+# Bulk ingestion writes with their own (usually lighter) write concern
+threats_ingest_collection = threats_collection.with_options(write_concern=bulk_write_concern())
+sightings_ingest_collection = sightings_collection.with_options(write_concern=bulk_write_concern())
+
+# Fields that are large and not needed to list or score threats
+HEAVY_FIELDS = {"kev_details": 0}
+
+# Only canonical members of a near-duplicate group (see core.dedup)
+CANONICAL_FILTER = {"duplicate_of": {"$exists": False}}
+
+# unique keys of a threat document, in the order they identify it
+UPSERT_KEYS = ("cve_id", "indicator", "technique_id", "url", "content_hash")
+# keys naming the threat itself: such docs are never near-duplicates of another
+IDENTITY_KEYS = ("cve_id", "indicator", "technique_id")
+
+# fields core.scoring reads, and the ones it writes back
+SCORING_INPUTS = ("title", "description", "cvss_score", "epss_score", "percentile", "kev_exploited")
+SCORING_OUTPUTS = ("score", "priority", "role_scores", "analyzed_at", "ai_label")
+
+
+def _stale_fields(doc: dict) -> dict:
+    """Fields to $unset on upsert: a dedup-annotated doc that is no longer a near-duplicate."""
+    return {"duplicate_of": ""} if "dedup_group" in doc and "duplicate_of" not in doc else {}
 
 
 async def ensure_indexes():
-    """Create necessary indexes once on startup."""
-    # unique on CVE and indicator (sparse so both can coexist)
-    await threats_collection.create_index([("cve_id", ASCENDING)], unique=True, sparse=True)
-    await threats_collection.create_index([("indicator", ASCENDING)], unique=True, sparse=True)
-    await threats_collection.create_index([("fetched_at", DESCENDING)])
-    # alerts indexes
-    await alerts_collection.create_index([("created_at", DESCENDING)])
-    # users/roles
-    await users_collection.create_index([("username", ASCENDING)], unique=True)
-    # clustered threats
-    await clustered_collection.create_index([("cluster", ASCENDING)])
+    """
+    Create necessary indexes. One createIndexes command per collection, all
+    collections in parallel; existing indexes are a cheap no-op. Then apply
+    the one-off data migrations (idempotent).
+    """
+    from core.scoring import ROLES  # local import: core.scoring imports this module
+
+    await asyncio.gather(
+        threats_collection.create_indexes([
+            # unique on CVE and indicator (sparse so both can coexist)
+            IndexModel([("cve_id", ASCENDING)], unique=True, sparse=True),
+            IndexModel([("indicator", ASCENDING)], unique=True, sparse=True),
+            IndexModel([("fetched_at", DESCENDING)]),
+            # near-duplicate groups / content-hash keys for keyless docs
+            IndexModel([("content_hash", ASCENDING)], unique=True, sparse=True),
+            IndexModel([("dedup_group", ASCENDING)]),
+            IndexModel([("duplicate_of", ASCENDING)], sparse=True),
+            # CVEs whose EPSS/KEV enrichment changed and need rescoring
+            IndexModel([("needs_rescore", ASCENDING)], partialFilterExpression={"needs_rescore": True}),
+            # retention: set once a doc is archived (core/retention.py), TTL deletes it at that time
+            IndexModel([("purge_at", ASCENDING)], expireAfterSeconds=0),
+            # rollups: bucket time, and what changed since the last refresh
+            IndexModel([("first_seen", ASCENDING)]),
+            IndexModel([("analyzed_at", ASCENDING)], sparse=True),
+            IndexModel([("clustered_at", ASCENDING)], sparse=True),
+            # scored views: overall, and one per role (core.scoring.ROLES)
+            IndexModel([("score", DESCENDING)]),
+            *[IndexModel([(f"role_scores.{role}.score", DESCENDING)]) for role in ROLES],
+        ]),
+        # alerts indexes
+        alerts_collection.create_indexes([
+            IndexModel([("created_at", DESCENDING)]),
+            IndexModel([("purge_at", ASCENDING)], expireAfterSeconds=0),
+        ]),
+        # users/roles
+        users_collection.create_indexes([IndexModel([("username", ASCENDING)], unique=True)]),
+        # clustered threats
+        clustered_collection.create_indexes([IndexModel([("cluster", ASCENDING)])]),
+        # scheduler run history
+        runs_collection.create_indexes([IndexModel([("source", ASCENDING), ("started_at", DESCENDING)])]),
+        # indicator sightings: top-IOC and surging-IOC rankings, window refresh
+        sightings_collection.create_indexes([
+            IndexModel([("count", DESCENDING)]),
+            IndexModel([("count_7d", DESCENDING)]),
+            IndexModel([("surge", DESCENDING)]),
+            IndexModel([("last_seen", DESCENDING)]),
+        ]),
+        # trend rollups: $merge target key (must be unique) and range scans on t
+        *[
+            rollups.create_indexes([IndexModel([("t", ASCENDING), ("source", ASCENDING), ("priority", ASCENDING),
+                                                ("cluster", ASCENDING), ("kev", ASCENDING)], unique=True)])
+            for rollups in (rollups_hourly_collection, rollups_daily_collection)
+        ],
+    )
+    await migrate()
+
+
+async def migrate():
+    """One-off data fixes; cheap no-ops once applied."""
+    # threats stored before first_seen existed: rollups bucket them by fetched_at
+    await threats_collection.update_many(
+        {"first_seen": {"$exists": False}},
+        [{"$set": {"first_seen": {"$ifNull": ["$fetched_at", "$$NOW"]}}}],
+    )
+    # CVEs / techniques / IOCs linked as near-duplicates before they were exempt (core.dedup)
+    await threats_collection.update_many(
+        {"duplicate_of": {"$exists": True}, "$or": [{f: {"$exists": True}} for f in IDENTITY_KEYS]},
+        [
+            # back to their own group, keyed as core.dedup.doc_key does
+            {"$set": {"dedup_group": {"$switch": {
+                "branches": [
+                    {"case": {"$gt": [f"${f}", None]}, "then": {"$concat": [f"{f}:", {"$toString": f"${f}"}]}}
+                    for f in IDENTITY_KEYS
+                ],
+                "default": "$dedup_group",
+            }}}},
+            {"$unset": "duplicate_of"},
+        ],
+    )
 
 
 # ----------------------
@@ -34,29 +191,148 @@ async def ensure_indexes():
 # ----------------------
 async def save_threat(data: dict):
     """
-    Upsert threat document using cve_id or indicator as unique key.
+    Upsert threat document by its unique key (UPSERT_KEYS: cve_id, indicator,
+    technique_id or url). Keyless documents are keyed by their content hash.
+    Documents are linked to a near-duplicate group; one that is no longer a
+    near-duplicate loses its stale duplicate_of.
     Returns the upserted key/object id.
     """
+    from core.dedup import content_hash, near_duplicates  # local import: core.dedup depends on this module
+
     doc = data.copy()
     # ensure fetched_at
     if "fetched_at" not in doc:
         doc["fetched_at"] = datetime.utcnow()
-    key = {}
-    if doc.get("cve_id"):
-        key = {"cve_id": doc["cve_id"]}
-    elif doc.get("indicator"):
-        key = {"indicator": doc["indicator"]}
+    if "dedup_group" not in doc:
+        await near_duplicates.annotate(doc)
+    if doc.get("_id"):
+        key = {"_id": doc["_id"]}
     else:
-        # fallback: generate doc as new record
-        result = await threats_collection.insert_one(doc)
-        return str(result.inserted_id)
+        # same key order as core.dedup.doc_key
+        field = next((f for f in UPSERT_KEYS if doc.get(f)), None)
+        if field is None:
+            # fallback: content hash of the normalized text
+            doc["content_hash"] = content_hash(doc)
+            field = "content_hash"
+        key = {field: doc[field]}
 
-    await threats_collection.update_one(key, {"$set": doc}, upsert=True)
+    # never (re)arm retention from a rewrite of a loaded doc
+    doc.pop("purge_at", None)
+    # first_seen is the rollup bucket time: set once, never moved by re-saves
+    first_seen = doc.pop("first_seen", None) or doc["fetched_at"]
+    update = {"$set": doc, "$setOnInsert": {"first_seen": first_seen}}
+    stale = _stale_fields(doc)
+    if stale:
+        update["$unset"] = stale
+    await threats_collection.update_one(key, update, upsert=True)
     return key
 
 
+async def save_scores(threat: dict, inputs: dict, filled: dict | None = None):
+    """
+    Write back only the scoring results of a stored threat (plus inputs the
+    scorer `filled` in, e.g. EPSS from the daily table), so enrichment or
+    ingestion writes made while it was being scored are kept. needs_rescore
+    is cleared only if the stored inputs are still the ones it was scored
+    from (`inputs`, as read); otherwise it stays flagged for the next run.
+    """
+    filled = filled or {}
+    await threats_collection.bulk_write([
+        UpdateOne({"_id": threat["_id"]}, {"$set": {**filled, **{f: threat[f] for f in SCORING_OUTPUTS if f in threat}}}),
+        UpdateOne({"_id": threat["_id"], **inputs, **filled}, {"$set": {"needs_rescore": False}}),
+    ], ordered=True)
+
+
+def _upsert_pipeline(doc: dict, now: datetime, quiet: bool) -> list[dict]:
+    """
+    Update pipeline for bulk_upsert: compares the stored scoring inputs with
+    the incoming ones before overwriting them.
+    """
+    # every stored threat has fetched_at: without one this is an insert
+    is_new = {"$not": [{"$gt": ["$fetched_at", None]}]}
+    changed = [{"$ne": [f"${f}", {"$literal": doc[f]}]} for f in SCORING_INPUTS if f in doc]
+    return [
+        {"$set": {
+            "needs_rescore": {"$or": [{"$eq": ["$needs_rescore", True]}, is_new, *changed]},
+            "first_seen": {"$ifNull": ["$first_seen", doc.get("first_seen") or doc.get("fetched_at") or now]},
+            **({"rescore_quiet": {"$cond": [is_new, True, "$rescore_quiet"]}} if quiet else {}),
+        }},
+        {"$set": {k: {"$literal": v} for k, v in doc.items() if k not in ("first_seen", "purge_at", "needs_rescore")}},
+        {"$unset": ["purge_at", *_stale_fields(doc)]},
+    ]
+
+
+async def bulk_upsert(docs: list[dict], unique_field: str, collection=None, quiet: bool = False):
+    """
+    Upsert many documents by a unique field in one unordered bulk write.
+    Documents without the field are skipped. Returns the number of ops sent.
+    A re-fetched record is live again, so any pending retention purge is cleared.
+    New records, and records whose scoring inputs (SCORING_INPUTS) changed,
+    are flagged for the scheduled scoring job (new ones with `quiet` are
+    scored without alerting, e.g. historical backfill).
+    """
+    collection = collection if collection is not None else threats_ingest_collection
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne({unique_field: doc[unique_field]}, _upsert_pipeline(doc, now, quiet), upsert=True)
+        for doc in docs
+        if doc.get(unique_field)
+    ]
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        if unique_field == "indicator" and settings.SIGHTINGS_ENABLED:
+            await record_sightings([doc for doc in docs if doc.get(unique_field)], now)
+    return len(ops)
+
+
+async def record_sightings(docs: list[dict], now: datetime | None = None):
+    """
+    Count indicator sightings from one fetched batch. An indicator counts
+    once per occurrence in the batch (e.g. once per OTX pulse listing it),
+    but a source is counted again only SIGHTING_DEDUP_HOURS after it last
+    was, so re-polling a feed that still lists the indicator adds nothing.
+    The day bucket and window counters are $inc-ed along with the total;
+    core.sightings.refresh_windows rolls the windows forward.
+    """
+    now = now or datetime.utcnow()
+    day = now.strftime("%Y-%m-%d")
+    cutoff = now - timedelta(hours=settings.SIGHTING_DEDUP_HOURS)
+    seen: dict[str, dict] = {}
+    for doc in docs:
+        entry = seen.setdefault(doc["indicator"], {"type": doc.get("type"), "sources": {}})
+        source = str(doc.get("source") or "unknown").replace(".", "_")
+        entry["sources"][source] = entry["sources"].get(source, 0) + 1
+
+    # first make sure every indicator has its counter document
+    await sightings_ingest_collection.bulk_write([
+        UpdateOne(
+            {"_id": indicator},
+            {
+                "$setOnInsert": {"first_seen": now, "type": entry["type"], "count": 0},
+                "$max": {"last_seen": now},
+                "$addToSet": {"sources": {"$each": list(entry["sources"])}},
+            },
+            upsert=True,
+        )
+        for indicator, entry in seen.items()
+    ], ordered=False)
+    # then count the sources not counted within the dedup window
+    await sightings_ingest_collection.bulk_write([
+        UpdateOne(
+            {"_id": indicator, f"counted.{source}": {"$not": {"$gt": cutoff}}},
+            {
+                "$inc": {"count": n, f"daily.{day}": n, "count_7d": n, "surge": n},
+                "$set": {f"counted.{source}": now},
+            },
+        )
+        for indicator, entry in seen.items()
+        for source, n in entry["sources"].items()
+    ], ordered=False)
+
+
 async def get_all_threats(limit: int = 100):
-    cursor = threats_collection.find({}).sort("fetched_at", -1).limit(limit)
+    # kev_details is not needed to score; save_threat's $set leaves it in place
+    cursor = threats_collection.find(CANONICAL_FILTER, HEAVY_FIELDS).sort("fetched_at", -1).limit(limit)
     return await cursor.to_list(length=limit)
 
 
@@ -72,16 +348,6 @@ async def get_trending_cves(limit: int = 10):
     return await cursor.to_list(length=limit)
 
 
-async def get_top_iocs(limit: int = 10):
-    pipeline = [
-        {"$match": {"indicator": {"$exists": True}}},
-        {"$group": {"_id": "$indicator", "count": {"$sum": 1}, "latest": {"$max": "$fetched_at"}}},
-        {"$sort": {"count": -1, "latest": -1}},
-        {"$limit": limit}
-    ]
-    return await threats_collection.aggregate(pipeline).to_list(length=limit)
-
-
 # ----------------------
 # Alerts operations
 # ----------------------
@@ -133,7 +399,14 @@ async def get_data(collection_name: str, limit: int = 100):
     """
     Generic fetch for any collection by name.
     Example: await get_data("clustered_threats")
+    Reads use the analytics read preference (may lag the primary).
     """
-    collection = db[collection_name]
+    collection = analytics_db[collection_name]
     cursor = collection.find({}).limit(limit)
     return await cursor.to_list(length=limit)
+
+
+# Create indexes once (e.g. a deploy step) so workers can start with ENSURE_INDEXES=false
+if __name__ == "__main__":
+    asyncio.run(ensure_indexes())
+    print("✅ Indexes ensured on", settings.MONGO_DB)
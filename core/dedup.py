@@ -0,0 +1,210 @@
+# core/dedup.py
+import asyncio
+import hashlib
+import re
+import numpy as np
+from core.db import IDENTITY_KEYS, UPSERT_KEYS, threats_collection
+from core.settings import settings
+
+# ========================
+# MinHash parameters
+# ========================
+NUM_PERM = 64          # signature length
+BANDS = 16             # LSH bands (NUM_PERM / BANDS rows per band)
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3       # word shingles
+# Mersenne prime 2**61 - 1: a * x (both < 2**32) fits in uint64, and the
+# reduction mod p is a mask, a shift and an add
+_PRIME = np.uint64(2**61 - 1)
+_MASK32 = 0xFFFFFFFF
+
+_rng = np.random.RandomState(1337)
+_A = _rng.randint(1, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> list[str]:
+    """Lowercase and tokenize text into alphanumeric words."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def threat_text(doc: dict) -> str:
+    """Text used to compare threats: description, falling back to title/name."""
+    return doc.get("description") or doc.get("title") or doc.get("name") or ""
+
+
+def content_hash(doc: dict) -> str:
+    """Stable hash of a document's normalized text, used as key for keyless docs."""
+    tokens = normalize_text(threat_text(doc))
+    title = " ".join(normalize_text(doc.get("title") or ""))
+    raw = title + "\x00" + " ".join(tokens)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _mod_prime(v: np.ndarray) -> np.ndarray:
+    """v mod 2**61 - 1 for uint64 v."""
+    v = (v & _PRIME) + (v >> np.uint64(61))
+    return np.where(v >= _PRIME, v - _PRIME, v)
+
+
+def minhash_signature(tokens: list[str]) -> np.ndarray | None:
+    """Compute a MinHash signature over word shingles (None if text is empty)."""
+    if not tokens:
+        return None
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") & _MASK32
+         for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # (a * x + b) mod p for every permutation, then min over shingles
+    perms = _mod_prime(_mod_prime(hashes[:, None] * _A[None, :]) + _B[None, :])
+    return perms.min(axis=0)
+
+
+def estimate_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity from two signatures."""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def doc_key(doc: dict) -> str | None:
+    """Readable unique key of a threat document (matches the upsert keys)."""
+    for field in UPSERT_KEYS:
+        if doc.get(field):
+            return f"{field}:{doc[field]}"
+    return None
+
+
+# ========================
+# LSH index
+# ========================
+class NearDuplicateIndex:
+    """
+    In-memory MinHash/LSH index mapping new threat texts to a canonical group.
+    The first document seen for a group is its canonical member; later
+    near-duplicates are linked to it with `duplicate_of`.
+
+    Only keyless text (posts, pulses) is indexed and linked: CVEs, ATT&CK
+    techniques and IOCs have their own identifiers, and templated
+    descriptions of two different CVEs are often near-identical. The index
+    holds at most `max_groups` groups, oldest evicted first.
+    """
+
+    def __init__(self, threshold: float = 0.7, min_tokens: int = 8, max_groups: int = 50000):
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self.max_groups = max_groups
+        self._buckets: dict[tuple[int, bytes], list[str]] = {}
+        self._signatures: dict[str, np.ndarray] = {}
+        self._warm = False
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _bands(self, sig: np.ndarray):
+        for b in range(BANDS):
+            yield b, sig[b * ROWS:(b + 1) * ROWS].tobytes()
+
+    def add(self, group: str, sig: np.ndarray):
+        if group in self._signatures:
+            return
+        while len(self._signatures) >= self.max_groups:
+            self._evict(next(iter(self._signatures)))
+        self._signatures[group] = sig
+        for band in self._bands(sig):
+            self._buckets.setdefault(band, []).append(group)
+
+    def _evict(self, group: str):
+        sig = self._signatures.pop(group)
+        for band in self._bands(sig):
+            bucket = self._buckets[band]
+            bucket.remove(group)
+            if not bucket:
+                del self._buckets[band]
+
+    def query(self, sig: np.ndarray) -> str | None:
+        """Return the best matching canonical group above threshold, if any."""
+        best, best_sim = None, 0.0
+        seen = set()
+        for band in self._bands(sig):
+            for group in self._buckets.get(band, ()):
+                if group in seen:
+                    continue
+                seen.add(group)
+                sim = estimate_similarity(sig, self._signatures[group])
+                if sim >= self.threshold and sim > best_sim:
+                    best, best_sim = group, sim
+        return best
+
+    async def warm(self, limit: int | None = None):
+        """
+        Load the newest canonical keyless groups from MongoDB once, so dedup
+        survives restarts. Threats stored before dedup existed have no
+        dedup_group yet and are indexed under their key.
+        """
+        async with self._lock:
+            if self._warm:
+                return
+            limit = min(limit or settings.DEDUP_WARM_LIMIT, self.max_groups)
+            query = {"duplicate_of": {"$exists": False}, **{f: {"$exists": False} for f in IDENTITY_KEYS}}
+            cursor = threats_collection.find(
+                query, {"dedup_group": 1, "description": 1, "title": 1, "name": 1, "url": 1, "content_hash": 1},
+            ).sort("fetched_at", -1).limit(limit)
+            loaded = []
+            async for doc in cursor:
+                group = doc.get("dedup_group") or doc_key(doc)
+                tokens = normalize_text(threat_text(doc))
+                sig = minhash_signature(tokens)
+                if group and sig is not None and len(tokens) >= self.min_tokens:
+                    loaded.append((group, sig))
+            # oldest first, so eviction drops the oldest groups
+            for group, sig in reversed(loaded):
+                self.add(group, sig)
+            self._warm = True
+            print(f"✅ Near-duplicate index warmed with {len(self)} groups")
+
+    async def annotate(self, doc: dict) -> dict:
+        """
+        Assign `content_hash`, `dedup_group` and (for near-duplicates)
+        `duplicate_of` to a threat document in place.
+        Documents with their own identifier (IDENTITY_KEYS) are never merged.
+        """
+        if not self._warm:
+            await self.warm()
+
+        key = doc_key(doc)
+        if key is None:
+            # keyless docs (e.g. from /score/analyze) are keyed by their text
+            doc["content_hash"] = content_hash(doc)
+            key = doc_key(doc)
+
+        tokens = normalize_text(threat_text(doc))
+        if any(doc.get(f) for f in IDENTITY_KEYS) or len(tokens) < self.min_tokens:
+            doc["dedup_group"] = key
+            return doc
+
+        sig = minhash_signature(tokens)
+        group = self.query(sig)
+        if group is None or group == key:
+            doc["dedup_group"] = key
+            self.add(key, sig)
+        else:
+            doc["dedup_group"] = group
+            doc["duplicate_of"] = group
+        return doc
+
+
+# single shared index used by ingestion and save_threat
+near_duplicates = NearDuplicateIndex(
+    threshold=settings.DEDUP_THRESHOLD,
+    min_tokens=settings.DEDUP_MIN_TOKENS,
+    max_groups=settings.DEDUP_MAX_GROUPS,
+)
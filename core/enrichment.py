@@ -0,0 +1,194 @@
+# core/enrichment.py
+import asyncio
+import io
+from datetime import datetime
+import numpy as np
+from gridfs.errors import NoFile
+from pymongo import UpdateOne
+from core.db import enrichment_state_bucket, threats_ingest_collection
+from core.epss import EPSSTable, epss_table
+from core.settings import settings
+
+BATCH_SIZE = 1000
+
+
+# ========================
+# Snapshots of the last applied EPSS / KEV data
+# ========================
+# Kept in GridFS rather than on local disk: the delta jobs run on whichever
+# node holds the scheduler lease, and a node without the previous snapshot
+# would re-flag the whole corpus.
+def _dumps(obj) -> bytes:
+    import joblib
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer, compress=3)
+    return buffer.getvalue()
+
+
+def _loads(data: bytes):
+    import joblib
+    return joblib.load(io.BytesIO(data))
+
+
+async def _save_state(name: str, obj):
+    data = await asyncio.to_thread(_dumps, obj)
+    file_id = await enrichment_state_bucket.upload_from_stream(name, data)
+    # older revisions of the same snapshot are dead weight
+    async for old in enrichment_state_bucket.find({"filename": name, "_id": {"$ne": file_id}}):
+        await enrichment_state_bucket.delete(old._id)
+
+
+async def _load_state(name: str):
+    try:
+        grid_out = await enrichment_state_bucket.open_download_stream_by_name(name)
+    except NoFile:
+        return None
+    return await asyncio.to_thread(_loads, await grid_out.read())
+
+
+async def save_epss_snapshot(table: EPSSTable):
+    await _save_state("epss_snapshot.joblib", {
+        "scores": table._scores,
+        "percentiles": table._percentiles,
+        "overflow": table._overflow,
+        "count": table.count,
+        "score_date": table.score_date,
+        "model_version": table.model_version,
+    })
+
+
+async def load_epss_snapshot() -> EPSSTable:
+    table = EPSSTable()
+    state = await _load_state("epss_snapshot.joblib")
+    if state is not None:
+        table._scores, table._percentiles = state["scores"], state["percentiles"]
+        table._overflow, table.count = state["overflow"], state["count"]
+        table.score_date, table.model_version = state["score_date"], state["model_version"]
+    return table
+
+
+async def save_kev_snapshot(kev_ids: set[str]):
+    await _save_state("kev_snapshot.joblib", sorted(kev_ids))
+
+
+async def reset_kev_snapshot():
+    """Forget the last applied KEV list: the next NVD sync applies the full catalog."""
+    async for old in enrichment_state_bucket.find({"filename": "kev_snapshot.joblib"}):
+        await enrichment_state_bucket.delete(old._id)
+
+
+async def load_kev_snapshot() -> set[str] | None:
+    ids = await _load_state("kev_snapshot.joblib")
+    return set(ids) if ids is not None else None
+
+
+# ========================
+# Diffs
+# ========================
+def diff_epss(new: EPSSTable, old: EPSSTable, threshold: float | None = None):
+    """
+    Yield (cve_id, score, percentile) for CVEs whose EPSS score or
+    percentile moved by at least `threshold` (or that are new).
+    Dense per-year arrays are compared with NumPy, not per CVE.
+    """
+    threshold = settings.EPSS_DELTA_THRESHOLD if threshold is None else threshold
+    for year, scores in new._scores.items():
+        new_s = np.frombuffer(scores, dtype=np.float32)
+        new_p = np.frombuffer(new._percentiles[year], dtype=np.float32)
+        old_s = np.full(len(new_s), np.nan, dtype=np.float32)
+        old_p = np.full(len(new_s), np.nan, dtype=np.float32)
+        if year in old._scores:
+            prev_s = np.frombuffer(old._scores[year], dtype=np.float32)[:len(new_s)]
+            prev_p = np.frombuffer(old._percentiles[year], dtype=np.float32)[:len(new_s)]
+            old_s[:len(prev_s)] = prev_s
+            old_p[:len(prev_p)] = prev_p
+        present = ~np.isnan(new_s)
+        with np.errstate(invalid="ignore"):
+            moved = (np.abs(new_s - old_s) >= threshold) | (np.abs(new_p - old_p) >= threshold)
+        changed = present & (moved | np.isnan(old_s))
+        for number in np.nonzero(changed)[0]:
+            yield f"CVE-{year}-{int(number):04d}", float(new_s[number]), float(new_p[number])
+
+    for (year, number), (score, percentile) in new._overflow.items():
+        prev = old._overflow.get((year, number))
+        if prev is None or abs(prev[0] - score) >= threshold or abs(prev[1] - percentile) >= threshold:
+            yield f"CVE-{year}-{number:04d}", score, percentile
+
+
+async def _flush(ops: list) -> int:
+    if not ops:
+        return 0
+    result = await threats_ingest_collection.bulk_write(ops, ordered=False)
+    # unacknowledged writes (MONGO_BULK_W=0) report no counts
+    return result.modified_count if result.acknowledged else len(ops)
+
+
+# ========================
+# Delta re-enrichment
+# ========================
+async def apply_epss_delta() -> dict:
+    """Push changed EPSS values to stored CVEs and mark them for rescoring."""
+    if not len(epss_table):
+        return {"epss_changed": 0, "epss_updated": 0}
+    previous = await load_epss_snapshot()
+    if previous.score_date and previous.score_date == epss_table.score_date:
+        return {"epss_changed": 0, "epss_updated": 0}
+
+    now = datetime.utcnow()
+    changed = updated = 0
+    ops = []
+    for cve_id, score, percentile in diff_epss(epss_table, previous):
+        changed += 1
+        ops.append(UpdateOne(
+            {"cve_id": cve_id},
+            {"$set": {"epss_score": round(score, 5), "percentile": round(percentile, 5),
+                      "enriched_at": now, "needs_rescore": True}},
+        ))
+        if len(ops) >= BATCH_SIZE:
+            updated += await _flush(ops)
+            ops = []
+    updated += await _flush(ops)
+    await save_epss_snapshot(epss_table)
+    return {"epss_changed": changed, "epss_updated": updated}
+
+
+async def apply_kev_delta(kev_data: dict) -> dict:
+    """Flag CVEs added to / removed from KEV since the last snapshot."""
+    if not kev_data:
+        return {"kev_added": 0, "kev_removed": 0, "kev_updated": 0}
+    current = set(kev_data)
+    previous = await load_kev_snapshot()
+    if previous is None:
+        previous = set()
+    added, removed = current - previous, previous - current
+
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"cve_id": cve_id},
+            {"$set": {"kev_exploited": True, "kev_details": kev_data[cve_id],
+                      "enriched_at": now, "needs_rescore": True}},
+        )
+        for cve_id in added
+    ] + [
+        UpdateOne(
+            {"cve_id": cve_id},
+            {"$set": {"kev_exploited": False, "enriched_at": now, "needs_rescore": True},
+             "$unset": {"kev_details": ""}},
+        )
+        for cve_id in removed
+    ]
+    updated = 0
+    for i in range(0, len(ops), BATCH_SIZE):
+        updated += await _flush(ops[i:i + BATCH_SIZE])
+    await save_kev_snapshot(current)
+    return {"kev_added": len(added), "kev_removed": len(removed), "kev_updated": updated}
+
+
+async def reenrich_stored_cves(kev_data: dict) -> dict:
+    """Run both EPSS and KEV deltas; returns counts for the run history."""
+    result = await apply_epss_delta()
+    result.update(await apply_kev_delta(kev_data))
+    if result["epss_updated"] or result["kev_updated"]:
+        print(f"✅ Re-enriched stored CVEs: {result}")
+    return result
@@ -0,0 +1,178 @@
+# core/epss.py
+import math
+import sys
+import time
+import zlib
+from array import array
+from core.resilience import source_timeout
+from core.settings import settings
+from core.transport import feed_client
+
+# CVE numbers below this are stored in dense per-year arrays; the rare
+# very large ones (e.g. CVE-2017-1000xxx) go to a small overflow dict.
+DENSE_LIMIT = 200000
+_NAN = float("nan")
+
+
+def parse_cve_id(cve_id: str) -> tuple[int, int] | None:
+    """'CVE-2024-12345' -> (2024, 12345)."""
+    parts = cve_id.split("-")
+    if len(parts) != 3 or parts[0].upper() != "CVE":
+        return None
+    try:
+        return int(parts[1]), int(parts[2])
+    except ValueError:
+        return None
+
+
+class EPSSTable:
+    """
+    Compact EPSS score table: one float32 array of scores and one of
+    percentiles per CVE year, indexed by CVE number (NaN = no score).
+    Lookups are O(1) and the whole daily file fits in a few MB.
+    """
+
+    def __init__(self):
+        self._scores: dict[int, array] = {}
+        self._percentiles: dict[int, array] = {}
+        self._overflow: dict[tuple[int, int], tuple[float, float]] = {}
+        self.count = 0
+        self.score_date: str | None = None
+        self.model_version: str | None = None
+        self.loaded_at: float | None = None
+
+    def __len__(self):
+        return self.count
+
+    def set(self, year: int, number: int, score: float, percentile: float):
+        if number >= DENSE_LIMIT:
+            if (year, number) not in self._overflow:
+                self.count += 1
+            self._overflow[(year, number)] = (score, percentile)
+            return
+        scores = self._scores.get(year)
+        if scores is None:
+            scores = self._scores[year] = array("f")
+            self._percentiles[year] = array("f")
+        if number >= len(scores):
+            grow = number + 1 - len(scores)
+            scores.extend([_NAN] * grow)
+            self._percentiles[year].extend([_NAN] * grow)
+        if math.isnan(scores[number]):
+            self.count += 1
+        scores[number] = score
+        self._percentiles[year][number] = percentile
+
+    def lookup(self, year: int, number: int) -> tuple[float, float] | None:
+        if number >= DENSE_LIMIT:
+            return self._overflow.get((year, number))
+        scores = self._scores.get(year)
+        if scores is None or number >= len(scores):
+            return None
+        score = scores[number]
+        if math.isnan(score):
+            return None
+        return score, self._percentiles[year][number]
+
+    def get(self, cve_id: str) -> dict | None:
+        """EPSS fields for a CVE id, shaped like the stored threat fields."""
+        key = parse_cve_id(cve_id or "")
+        if key is None:
+            return None
+        hit = self.lookup(*key)
+        if hit is None:
+            return None
+        return {"epss_score": round(hit[0], 5), "percentile": round(hit[1], 5)}
+
+    def items(self):
+        """Yield (year, number, score, percentile) for every stored CVE."""
+        for year, scores in self._scores.items():
+            percentiles = self._percentiles[year]
+            for number, score in enumerate(scores):
+                if not math.isnan(score):
+                    yield year, number, score, percentiles[number]
+        for (year, number), (score, percentile) in self._overflow.items():
+            yield year, number, score, percentile
+
+    def swap(self, other: "EPSSTable"):
+        """Replace this table's contents with another's (references stay valid)."""
+        self._scores, self._percentiles, self._overflow = other._scores, other._percentiles, other._overflow
+        self.count, self.score_date, self.model_version = other.count, other.score_date, other.model_version
+        self.loaded_at = other.loaded_at
+
+    def memory_bytes(self) -> int:
+        dense = sum(a.buffer_info()[1] * a.itemsize for a in self._scores.values())
+        dense += sum(a.buffer_info()[1] * a.itemsize for a in self._percentiles.values())
+        return dense + sys.getsizeof(self._overflow) + len(self._overflow) * 120
+
+    def stats(self) -> dict:
+        return {
+            "cves": self.count,
+            "years": len(self._scores),
+            "score_date": self.score_date,
+            "model_version": self.model_version,
+            "loaded_at": self.loaded_at,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+    # ---------- parsing ----------
+    def feed_line(self, line: str):
+        """Parse one line of the EPSS CSV (comment, header or data row)."""
+        if not line:
+            return
+        if line.startswith("#"):
+            # e.g. #model_version:v2023.03.01,score_date:2024-05-01T00:00:00+0000
+            for part in line[1:].split(","):
+                key, _, value = part.partition(":")
+                if key == "model_version":
+                    self.model_version = value
+                elif key == "score_date":
+                    self.score_date = value
+            return
+        cve, _, rest = line.partition(",")
+        key = parse_cve_id(cve)
+        if key is None:
+            return  # header row
+        score, _, percentile = rest.partition(",")
+        try:
+            self.set(key[0], key[1], float(score), float(percentile))
+        except ValueError:
+            pass
+
+
+async def stream_epss_table(url: str | None = None) -> EPSSTable:
+    """
+    Download the daily gzipped EPSS CSV and parse it while it streams;
+    neither the compressed nor the decompressed file is held in memory.
+    """
+    table = EPSSTable()
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip container
+    pending = b""
+    async with feed_client() as client:
+        async with client.stream("GET", url or settings.EPSS_CSV_URL, timeout=source_timeout("epss")) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes():
+                pending += inflater.decompress(chunk)
+                lines = pending.split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    table.feed_line(line.decode("ascii", errors="ignore").strip())
+    pending += inflater.flush()
+    for line in pending.split(b"\n"):
+        table.feed_line(line.decode("ascii", errors="ignore").strip())
+    table.loaded_at = time.time()
+    return table
+
+
+# single shared table used by the extractor and scorer
+epss_table = EPSSTable()
+
+
+async def refresh_epss_table(force: bool = False) -> EPSSTable:
+    """Reload the shared table if it is older than EPSS_REFRESH_HOURS."""
+    age = time.time() - epss_table.loaded_at if epss_table.loaded_at else None
+    if force or age is None or age > settings.EPSS_REFRESH_HOURS * 3600:
+        new_table = await stream_epss_table()
+        epss_table.swap(new_table)
+        print(f"✅ EPSS table loaded: {len(epss_table)} CVEs, {epss_table.memory_bytes() // 1024} KiB")
+    return epss_table
@@ -1,30 +1,54 @@
 # core/extractor.py
-import httpx
+import asyncio
 from datetime import datetime
-from core.db import threats_collection
+from core.db import bulk_upsert
+from core.dedup import near_duplicates
+from core.enrichment import reenrich_stored_cves
+from core.epss import epss_table, refresh_epss_table
+from core.resilience import call_with_policy, source_timeout, CircuitOpenError
+from core.rollups import schedule_rollup_refresh
+from core.scanner import log_scanner
 from core.settings import settings
+from core.transport import feed_client, replaying
+
+# Feed endpoints (EPSS lives in settings.EPSS_CSV_URL)
+NVD_API_URL = "https://services.nvd.nist.gov/rest/json/cves/2.0"
+KEV_URL = "https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json"
+OTX_URL = "https://otx.alienvault.com/api/v1/pulses/subscribed"
+THREATFOX_URL = "https://threatfox-api.abuse.ch/api/v1/"
+MITRE_URL = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/master/enterprise-attack/enterprise-attack.json"
+REDDIT_URL = "https://www.reddit.com/r/cybersecurity/top/.json?limit=10&t=day"
+
+# strong references to fire-and-forget tasks so they are not garbage collected
+_background_tasks: set = set()
 
 # ========================
 # Utility: Safe Fetch
 # ========================
-async def safe_fetch(fetch_func, *args, **kwargs):
-    """Wrapper to safely fetch data from sources without crashing the pipeline."""
+async def safe_fetch(source, fetch_func, *args, **kwargs):
+    """
+    Wrapper to safely fetch data from sources without crashing the pipeline.
+    Applies the source's timeout budget, retry/backoff and circuit breaker
+    (see core.resilience); returns empty results once those are exhausted.
+    """
     try:
-        return await fetch_func(*args, **kwargs)
+        return await call_with_policy(source, fetch_func, *args, **kwargs)
+    except CircuitOpenError as e:
+        print(f"⏭️ {e}")
     except Exception as e:
         print(f"❌ Error fetching from {fetch_func.__name__}: {e}")
-        return [] if "fetch_" in fetch_func.__name__ else {}
+    return [] if "fetch_" in fetch_func.__name__ else {}
 
 # ========================
 # 1. NVD CVE Data
 # ========================
-async def fetch_nvd_data(limit=100):
-    url = f"https://services.nvd.nist.gov/rest/json/cves/2.0?resultsPerPage={limit}"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, timeout=settings.FETCH_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.json()
+def nvd_headers() -> dict:
+    """An NVD API key raises the rate limit from 5 to 50 requests per 30s."""
+    return {"apiKey": settings.NVD_API_KEY} if settings.NVD_API_KEY else {}
+
 
+def parse_nvd_items(data: dict) -> list[dict]:
+    """Convert an NVD 2.0 API page into threat documents."""
     cves = []
     for item in data.get("vulnerabilities", []):
         cve = item.get("cve", {})
@@ -54,31 +78,29 @@ async def fetch_nvd_data(limit=100):
         })
     return cves
 
-# ========================
-# 2. EPSS Scores
-# ========================
-async def fetch_epss_scores(limit=1000):
-    url = f"https://api.first.org/data/v1/epss?limit={limit}"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, timeout=settings.FETCH_TIMEOUT)
+
+async def fetch_nvd_data(limit=100):
+    url = f"{NVD_API_URL}?resultsPerPage={limit}"
+    async with feed_client() as client:
+        resp = await client.get(url, headers=nvd_headers(), timeout=source_timeout("nvd"))
         resp.raise_for_status()
         data = resp.json()
+    return parse_nvd_items(data)
 
-    epss_data = {}
-    for row in data.get("data", []):
-        epss_data[row["cve"]] = {
-            "epss_score": float(row["epss"]),
-            "percentile": float(row["percentile"])
-        }
-    return epss_data
+# ========================
+# 2. EPSS Scores
+# ========================
+async def fetch_epss_scores():
+    """Refresh the shared compact EPSS table from the full daily CSV (see core.epss)."""
+    return await refresh_epss_table()
 
 # ========================
 # 3. CISA KEV
 # ========================
 async def fetch_cisa_kev():
-    url = "https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, timeout=settings.FETCH_TIMEOUT)
+    url = KEV_URL
+    async with feed_client() as client:
+        resp = await client.get(url, timeout=source_timeout("kev"))
         resp.raise_for_status()
         data = resp.json()
     return {item["cveID"]: item for item in data.get("vulnerabilities", [])}
@@ -87,24 +109,30 @@ async def fetch_cisa_kev():
 # 4. AlienVault OTX
 # ========================
 async def fetch_otx(limit=10):
-    if not settings.OTX_API_KEY:
+    if not settings.OTX_API_KEY and not replaying():
         print("⚠️ No OTX API Key configured.")
         return []
 
-    url = f"https://otx.alienvault.com/api/v1/pulses/subscribed?limit={limit}"
-    headers = {"X-OTX-API-KEY": settings.OTX_API_KEY}
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, headers=headers, timeout=settings.FETCH_TIMEOUT)
+    url = f"{OTX_URL}?limit={limit}"
+    headers = {"X-OTX-API-KEY": settings.OTX_API_KEY or ""}
+    async with feed_client() as client:
+        resp = await client.get(url, headers=headers, timeout=source_timeout("otx"))
         resp.raise_for_status()
         data = resp.json()
 
     iocs = []
     for pulse in data.get("results", []):
+        # pulse context used to link indicators to malware / ATT&CK / CVEs (core.graph)
+        malware = [m.get("display_name") if isinstance(m, dict) else m for m in pulse.get("malware_families") or []]
+        attack_ids = [a.get("id") if isinstance(a, dict) else a for a in pulse.get("attack_ids") or []]
         for indicator in pulse.get("indicators", []):
             iocs.append({
                 "indicator": indicator.get("indicator"),
                 "type": indicator.get("type"),
                 "title": pulse.get("name"),
+                "malware_families": [m for m in malware if m],
+                "attack_ids": [a for a in attack_ids if a],
+                "tags": pulse.get("tags") or [],
                 "source": "OTX"
             })
     return iocs
@@ -113,59 +141,55 @@ async def fetch_otx(limit=10):
 # 5. Abuse.ch ThreatFox
 # ========================
 async def fetch_threatfox(limit=50):
-    if not settings.THREATFOX_API_KEY:
+    if not settings.THREATFOX_API_KEY and not replaying():
         print("⚠️ No ThreatFox API Key configured.")
         return []
 
-    url = "https://threatfox-api.abuse.ch/api/v1/"
+    url = THREATFOX_URL
     payload = {"query": "get_iocs", "limit": limit}
-    headers = {"Auth-Key": settings.THREATFOX_API_KEY}
+    headers = {"Auth-Key": settings.THREATFOX_API_KEY or ""}
 
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=payload, headers=headers, timeout=settings.FETCH_TIMEOUT)
-            resp.raise_for_status()
-
-            # Try parsing JSON safely
-            try:
-                data = resp.json()
-            except Exception:
-                print(f"❌ ThreatFox returned non-JSON response: {resp.text[:200]}...")
-                return []
-
-        # Ensure data is dict
-        if not isinstance(data, dict):
-            print(f"❌ Unexpected ThreatFox response type: {type(data)}, value: {str(data)[:200]}")
-            return []
+    async with feed_client() as client:
+        resp = await client.post(url, json=payload, headers=headers, timeout=source_timeout("threatfox"))
+        resp.raise_for_status()
 
-        # Handle API errors
-        if "error" in data:
-            print(f"❌ ThreatFox API error: {data['error']}")
+        # Try parsing JSON safely
+        try:
+            data = resp.json()
+        except Exception:
+            print(f"❌ ThreatFox returned non-JSON response: {resp.text[:200]}...")
             return []
 
-        iocs = []
-        for ioc in data.get("data", []):
-            iocs.append({
-                "indicator": ioc.get("ioc"),
-                "type": ioc.get("ioc_type"),
-                "malware": ioc.get("malware"),
-                "confidence": ioc.get("confidence_level"),
-                "source": "ThreatFox"
-            })
-        print(f"✅ Fetched {len(iocs)} IOCs from ThreatFox")
-        return iocs
+    # Ensure data is dict
+    if not isinstance(data, dict):
+        print(f"❌ Unexpected ThreatFox response type: {type(data)}, value: {str(data)[:200]}")
+        return []
 
-    except Exception as e:
-        print(f"❌ Error fetching from ThreatFox: {e}")
+    # Handle API errors
+    if "error" in data:
+        print(f"❌ ThreatFox API error: {data['error']}")
         return []
 
+    iocs = []
+    for ioc in data.get("data", []):
+        iocs.append({
+            "indicator": ioc.get("ioc"),
+            "type": ioc.get("ioc_type"),
+            "malware": ioc.get("malware"),
+            "confidence": ioc.get("confidence_level"),
+            "tags": ioc.get("tags") or [],
+            "source": "ThreatFox"
+        })
+    print(f"✅ Fetched {len(iocs)} IOCs from ThreatFox")
+    return iocs
+
 # ========================
 # 6. MITRE ATT&CK
 # ========================
 async def fetch_mitre_attack():
-    url = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/master/enterprise-attack/enterprise-attack.json"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, timeout=settings.FETCH_TIMEOUT)
+    url = MITRE_URL
+    async with feed_client() as client:
+        resp = await client.get(url, timeout=source_timeout("mitre"))
         resp.raise_for_status()
         data = resp.json()
 
@@ -184,10 +208,10 @@ async def fetch_mitre_attack():
 # 7. Reddit Cybersecurity
 # ========================
 async def fetch_reddit():
-    url = "https://www.reddit.com/r/cybersecurity/top/.json?limit=10&t=day"
+    url = REDDIT_URL
     headers = {"User-Agent": "Mozilla/5.0 (CyberThreatBot)"}
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, headers=headers, timeout=settings.FETCH_TIMEOUT)
+    async with feed_client() as client:
+        resp = await client.get(url, headers=headers, timeout=source_timeout("reddit"))
         resp.raise_for_status()
         data = resp.json()
 
@@ -203,57 +227,101 @@ async def fetch_reddit():
     return posts
 
 # ========================
-# 8. Master Fetcher
+# 8. Per-source sync
 # ========================
-async def fetch_and_store_all():
-    nvd_data = await safe_fetch(fetch_nvd_data)
-    epss_scores = await safe_fetch(fetch_epss_scores)
-    kev_data = await safe_fetch(fetch_cisa_kev)
-    otx_data = await safe_fetch(fetch_otx)
-    threatfox_data = await safe_fetch(fetch_threatfox)
-    mitre_data = await safe_fetch(fetch_mitre_attack)
-    reddit_data = await safe_fetch(fetch_reddit)
+async def store_items(data, unique_field):
+    """Upsert fetched items by their unique key in one bulk write (prevents duplicates)."""
+    items = [item for item in data if item.get(unique_field)]
+    for item in items:
+        item["fetched_at"] = datetime.utcnow()
+        await near_duplicates.annotate(item)
+    await bulk_upsert(items, unique_field)
+
+
+async def sync_nvd():
+    """Fetch NVD CVEs, merge EPSS + KEV enrichment and store them."""
+    nvd_data = await safe_fetch("nvd", fetch_nvd_data)
+    # on failure the previously loaded EPSS table stays in use
+    await safe_fetch("epss", fetch_epss_scores)
+    kev_data = await safe_fetch("kev", fetch_cisa_kev)
 
     # Merge NVD + EPSS + KEV
     for cve in nvd_data:
         cve_id = cve["cve_id"]
-        if cve_id in epss_scores:
-            cve.update(epss_scores[cve_id])
+        epss = epss_table.get(cve_id)
+        if epss:
+            cve.update(epss)
         if cve_id in kev_data:
             cve["kev_exploited"] = True
             cve["kev_details"] = kev_data[cve_id]
         else:
             cve["kev_exploited"] = False
         cve["fetched_at"] = datetime.utcnow()
+        await near_duplicates.annotate(cve)
+
+    await bulk_upsert(nvd_data, "cve_id")
+    counts = {"nvd": len(nvd_data), "epss": len(epss_table), "kev": len(kev_data)}
+
+    # Push EPSS/KEV changes to CVEs stored by earlier runs
+    try:
+        counts.update(await reenrich_stored_cves(kev_data))
+    except Exception as e:
+        print(f"❌ Re-enrichment of stored CVEs failed: {e}")
+    return counts
+
+
+async def sync_otx():
+    otx_data = await safe_fetch("otx", fetch_otx)
+    await store_items(otx_data, "indicator")
+    return {"otx": len(otx_data)}
+
+
+async def sync_threatfox():
+    threatfox_data = await safe_fetch("threatfox", fetch_threatfox)
+    await store_items(threatfox_data, "indicator")
+    return {"threatfox": len(threatfox_data)}
+
+
+async def sync_mitre():
+    mitre_data = await safe_fetch("mitre", fetch_mitre_attack)
+    await store_items(mitre_data, "technique_id")
+    return {"mitre": len(mitre_data)}
+
+
+async def sync_reddit():
+    reddit_data = await safe_fetch("reddit", fetch_reddit)
+    await store_items(reddit_data, "url")
+    return {"reddit": len(reddit_data)}
+
+
+# Independently schedulable sources (EPSS and KEV enrich NVD, so they sync with it)
+SOURCES = {
+    "nvd": sync_nvd,
+    "otx": sync_otx,
+    "threatfox": sync_threatfox,
+    "mitre": sync_mitre,
+    "reddit": sync_reddit,
+}
+
+# Sources whose new records change the indicator set
+INDICATOR_SOURCES = {"otx", "threatfox"}
+
+
+def schedule_scanner_rebuild():
+    """Rebuild the log-scanner automaton with the new indicators, off the request path."""
+    task = asyncio.create_task(log_scanner.rebuild())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# ========================
+# 9. Master Fetcher
+# ========================
+async def fetch_and_store_all():
+    results = {}
+    for sync in SOURCES.values():
+        results.update(await sync())
 
-        await threats_collection.update_one(   # ✅ must await motor
-            {"cve_id": cve_id},
-            {"$set": cve},
-            upsert=True
-        )
-
-    # Store other sources (prevent duplicates by using unique keys)
-    async def bulk_insert_safe(data, unique_field):
-        for item in data:
-            if not item.get(unique_field):
-                continue
-            await threats_collection.update_one(   # ✅ must await motor
-                {unique_field: item[unique_field]},
-                {"$set": item},
-                upsert=True
-            )
-
-    await bulk_insert_safe(otx_data, "indicator")
-    await bulk_insert_safe(threatfox_data, "indicator")
-    await bulk_insert_safe(mitre_data, "technique_id")
-    await bulk_insert_safe(reddit_data, "url")
-
-    return {
-        "nvd": len(nvd_data),
-        "epss": len(epss_scores),
-        "kev": len(kev_data),
-        "otx": len(otx_data),
-        "threatfox": len(threatfox_data),
-        "mitre": len(mitre_data),
-        "reddit": len(reddit_data)
-    }
+    schedule_scanner_rebuild()
+    schedule_rollup_refresh()
+    return results
@@ -0,0 +1,387 @@
+# core/graph.py
+"""
+Correlation graph linking CVEs, IOCs, malware, OTX pulses, ATT&CK
+techniques and Reddit posts, for pivots such as CVE -> malware -> IOCs.
+
+Edges come from the fields the fetchers store (ThreatFox malware/tags,
+OTX pulse name/malware families/ATT&CK ids/tags, MITRE technique ids) and
+from CVE / technique ids mentioned in titles and descriptions.
+
+The graph is kept as compact arrays, saved as .npy and memory-mapped by
+every worker:
+
+    hashes.npy          sorted 64-bit hashes of the node keys ("cve:CVE-2024-1234")
+    kinds.npy           node kind codes
+    labels.npy + label_offsets.npy   node keys, concatenated
+    indptr.npy, neighbors.npy, neighbor_kinds.npy, rels.npy
+                        CSR adjacency over both edge directions; each row holds a
+                        neighbor once (rels is a bitmask of RELATIONS), grouped by kind
+    src.npy, dst.npy, rel.npy         unique edges by node hash, for updates
+
+A node is found by binary search over the hashes and its neighbors of one
+kind are one slice of the CSR arrays, so a pivot never leaves the process. Ingestion
+merges the edges of newly fetched threats into a new version; a full
+rebuild drops edges of threats that no longer exist.
+
+Both run under cluster-wide leases (ingest:graph) on whichever node holds
+them, so every node serving /graph must see the same GRAPH_DIR: one node,
+or shared storage with more than one.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+import numpy as np
+from core.db import threats_collection, threats_read_collection
+from core.settings import settings
+
+KINDS = ["cve", "ioc", "malware", "pulse", "technique", "post"]
+RELATIONS = ["reported_in", "attributed_to", "references", "mentions", "uses", "exploits", "related"]
+KIND_CODE = {k: i for i, k in enumerate(KINDS)}
+REL_CODE = {r: i for i, r in enumerate(RELATIONS)}
+
+CVE_RE = re.compile(r"\bCVE-\d{4}-\d{4,}\b", re.IGNORECASE)
+TECHNIQUE_RE = re.compile(r"\bT\d{4}(?:\.\d{3})?\b")
+
+PROJECTION = {f: 1 for f in (
+    "cve_id", "indicator", "type", "title", "description", "malware", "malware_families",
+    "attack_ids", "tags", "technique_id", "url", "source",
+)}
+
+_build_lock = asyncio.Lock()
+# (manifest mtime, Graph) of the last loaded graph
+_graph_cache: dict = {}
+
+
+# ========================
+# Entities and edges
+# ========================
+def node_key(kind: str, value: str) -> str:
+    value = str(value).strip()
+    if kind in ("cve", "technique"):
+        value = value.upper()
+    elif kind == "malware":
+        value = value.lower()
+    return f"{kind}:{value}"
+
+
+def node_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _mentions(text, source_key: str, rel: str = "mentions") -> list[tuple[str, str, str]]:
+    if not text:
+        return []
+    text = str(text)
+    edges = [(source_key, node_key("cve", m), rel) for m in CVE_RE.findall(text)]
+    edges += [(source_key, node_key("technique", m), "uses") for m in TECHNIQUE_RE.findall(text)]
+    return edges
+
+
+def doc_edges(doc: dict) -> list[tuple[str, str, str]]:
+    """(node key, node key, relation) edges contributed by one threat document."""
+    edges = []
+    if doc.get("cve_id"):
+        cve = node_key("cve", doc["cve_id"])
+        edges += [e for e in _mentions(doc.get("description"), cve) if e[1] != cve]
+
+    elif doc.get("technique_id"):
+        technique = node_key("technique", doc["technique_id"])
+        edges += [e for e in _mentions(doc.get("description"), technique) if e[1] != technique]
+
+    elif doc.get("indicator"):
+        # OTX lists CVEs as indicators of type "CVE"
+        is_cve = str(doc.get("type") or "").upper() == "CVE" or CVE_RE.fullmatch(str(doc["indicator"]))
+        ioc = node_key("cve" if is_cve else "ioc", doc["indicator"])
+        malware = [m for m in [doc.get("malware"), *(doc.get("malware_families") or [])] if m]
+        for name in malware:
+            edges.append((ioc, node_key("malware", name), "attributed_to"))
+        if doc.get("title"):
+            pulse = node_key("pulse", doc["title"])
+            edges.append((ioc, pulse, "references" if is_cve else "reported_in"))
+            edges += [(pulse, node_key("malware", name), "mentions") for name in malware]
+            edges += [(pulse, node_key("technique", t), "uses") for t in doc.get("attack_ids") or []]
+            edges += _mentions(doc["title"], pulse, "references")
+        for tag in doc.get("tags") or []:
+            if CVE_RE.fullmatch(str(tag)):
+                cve = node_key("cve", tag)
+                edges.append((ioc, cve, "related"))
+                # a ThreatFox IOC tagged with a CVE: its malware exploits that CVE
+                edges += [(node_key("malware", name), cve, "exploits") for name in malware]
+
+    elif doc.get("url"):
+        edges += _mentions(doc.get("title"), node_key("post", doc["url"]))
+    return edges
+
+
+# ========================
+# Persisted graph
+# ========================
+def _manifest_path() -> str:
+    return os.path.join(settings.GRAPH_DIR, "manifest.json")
+
+
+def read_manifest() -> dict | None:
+    try:
+        with open(_manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Graph:
+    def __init__(self, manifest: dict):
+        base = os.path.join(settings.GRAPH_DIR, manifest["version"])
+        # plain ndarray views of the mapping: np.memmap indexing is several times slower
+        load = lambda name: np.asarray(np.load(os.path.join(base, name), mmap_mode="r"))
+        self.manifest = manifest
+        self.hashes, self.kinds = load("hashes.npy"), load("kinds.npy")
+        self.labels, self.label_offsets = load("labels.npy"), load("label_offsets.npy")
+        self.indptr, self.neighbor_ids, self.rels = load("indptr.npy"), load("neighbors.npy"), load("rels.npy")
+        self.neighbor_kinds = load("neighbor_kinds.npy")
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def label(self, node: int) -> str:
+        return bytes(self.labels[self.label_offsets[node]:self.label_offsets[node + 1]]).decode("utf-8")
+
+    def lookup(self, key: str) -> int | None:
+        h = np.uint64(node_hash(key))
+        i = int(np.searchsorted(self.hashes, h))
+        return i if i < len(self.hashes) and self.hashes[i] == h else None
+
+    def resolve(self, ref: str) -> int | None:
+        """Node for "kind:value", or a bare value tried as each kind in turn."""
+        kind, _, value = ref.partition(":")
+        if kind in KIND_CODE and value:
+            return self.lookup(node_key(kind, value))
+        for kind in KINDS:
+            node = self.lookup(node_key(kind, ref))
+            if node is not None:
+                return node
+        return None
+
+    def neighbors(self, node: int, kind: str | None = None):
+        """(neighbor ids, relation codes) of one node, optionally of one kind."""
+        lo, hi = int(self.indptr[node]), int(self.indptr[node + 1])
+        if kind is not None:
+            row_kinds = self.neighbor_kinds[lo:hi]
+            code = KIND_CODE[kind]
+            lo, hi = lo + int(np.searchsorted(row_kinds, code)), lo + int(np.searchsorted(row_kinds, code, "right"))
+        return self.neighbor_ids[lo:hi], self.rels[lo:hi]
+
+    def describe(self, node: int, rels: int | None = None) -> dict:
+        out = {"node": self.label(node), "kind": KINDS[self.kinds[node]],
+               "degree": int(self.indptr[node + 1] - self.indptr[node])}
+        if rels is not None:
+            out["relations"] = [r for i, r in enumerate(RELATIONS) if rels >> i & 1]
+        return out
+
+    def neighborhood(self, node: int, kind: str | None, limit: int) -> list[dict]:
+        ids, rels = self.neighbors(node, kind)
+        return [self.describe(int(n), int(r)) for n, r in zip(ids[:limit], rels[:limit])]
+
+    def expand(self, frontier, kind: str | None, exclude, limit: int):
+        """
+        One hop from a set of nodes: new neighbors (optionally of one kind),
+        at most `limit`, and whether more were left out. Stops reading rows
+        once the limit is exceeded, so hub nodes (a malware family with
+        thousands of IOCs) cost no more than `limit` entries.
+        """
+        # a row lists each neighbor once: this many entries give limit + 1 new ones
+        cap = limit + 1 + len(exclude)
+        found = np.zeros(0, dtype=np.int32)
+        pending, pending_rows = [], 0
+        for n in frontier:
+            ids = self.neighbors(int(n), kind)[0][:cap]
+            pending.append(ids)
+            pending_rows += len(ids)
+            if pending_rows >= cap:
+                found = np.setdiff1d(np.concatenate([found, *pending]), exclude)
+                pending, pending_rows = [], 0
+                if len(found) > limit:
+                    return found[:limit], True
+        if pending:
+            found = np.setdiff1d(np.concatenate([found, *pending]), exclude)
+        return found[:limit], len(found) > limit
+
+    def pivot(self, start: int, path: list[str | None], limit: int) -> list[dict]:
+        """Follow a kind path (e.g. ["malware", "ioc"]) from `start`, hop by hop."""
+        frontier = np.array([start], dtype=np.int64)
+        seen = frontier
+        hops = []
+        for kind in path:
+            frontier, truncated = self.expand(frontier, kind, seen, limit)
+            seen = np.concatenate([seen, frontier])
+            hops.append({
+                "kind": kind or "any",
+                "count": len(frontier),
+                "truncated": truncated,
+                "nodes": [self.describe(int(n)) for n in frontier],
+            })
+            if not len(frontier):
+                break
+        return hops
+
+    def khop(self, start: int, k: int, limit: int) -> list[dict]:
+        return self.pivot(start, [None] * k, limit)
+
+
+def get_graph() -> Graph | None:
+    """The current graph, reloaded when the manifest changes; None if never built."""
+    try:
+        mtime = os.stat(_manifest_path()).st_mtime
+    except OSError:
+        return None
+    if _graph_cache.get("mtime") != mtime:
+        manifest = read_manifest()
+        if manifest is None:
+            return None
+        _graph_cache.clear()
+        _graph_cache.update(mtime=mtime, graph=Graph(manifest))
+    return _graph_cache["graph"]
+
+
+def start_node(ref: str) -> tuple[Graph, int | None]:
+    """The current graph and the node for `ref`; LookupError if no graph was built yet."""
+    graph = get_graph()
+    if graph is None:
+        raise LookupError("Correlation graph not built yet; run POST /admin/graph/run")
+    return graph, graph.resolve(ref)
+
+
+# ========================
+# Build / update
+# ========================
+def _write_graph(base: str, labels: dict[int, str], src, dst, rel) -> dict:
+    """Nodes sorted by hash, CSR over both edge directions, edge lists for the next update."""
+    hashes = np.array(sorted(labels), dtype=np.uint64)
+    keys = [labels[int(h)] for h in hashes]
+    kinds = np.array([KIND_CODE[k.partition(":")[0]] for k in keys], dtype=np.uint8)
+    encoded = [k.encode("utf-8") for k in keys]
+    label_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=label_offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    u, v = np.searchsorted(hashes, src), np.searchsorted(hashes, dst)
+    rows, cols = np.concatenate([u, v]), np.concatenate([v, u])
+    masks = np.left_shift(1, np.concatenate([rel, rel]).astype(np.uint8)).astype(np.uint8)
+
+    # rows grouped by neighbor kind; one entry per (node, neighbor), relations OR-ed together
+    order = np.lexsort((cols, kinds[cols], rows))
+    rows, cols, masks = rows[order], cols[order], masks[order]
+    first = np.r_[True, (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])] if len(rows) else np.zeros(0, bool)
+    starts = np.flatnonzero(first)
+    masks = np.bitwise_or.reduceat(masks, starts) if len(starts) else masks
+    rows, cols = rows[starts], cols[starts]
+    indptr = np.zeros(len(hashes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(hashes)), out=indptr[1:])
+
+    os.makedirs(base, exist_ok=True)
+    arrays = {
+        "hashes": hashes, "kinds": kinds, "labels": blob, "label_offsets": label_offsets,
+        "indptr": indptr, "neighbors": cols.astype(np.int32), "neighbor_kinds": kinds[cols], "rels": masks,
+        "src": src, "dst": dst, "rel": rel,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(base, f"{name}.npy"), array)
+    return {"nodes": len(hashes), "edges": len(src)}
+
+
+def _merge(previous: Graph | None, edges: list[tuple[str, str, str]], base: str) -> dict:
+    labels: dict[int, str] = {}
+    src, dst, rel = [], [], []
+    for a, b, r in edges:
+        ha, hb = node_hash(a), node_hash(b)
+        labels[ha], labels[hb] = a, b
+        src.append(ha)
+        dst.append(hb)
+        rel.append(REL_CODE[r])
+    src, dst = np.array(src, dtype=np.uint64), np.array(dst, dtype=np.uint64)
+    rel = np.array(rel, dtype=np.uint8)
+
+    if previous is not None:
+        old_base = os.path.join(settings.GRAPH_DIR, previous.manifest["version"])
+        for i, h in enumerate(previous.hashes):
+            labels.setdefault(int(h), previous.label(i))
+        src = np.concatenate([np.load(os.path.join(old_base, "src.npy")), src])
+        dst = np.concatenate([np.load(os.path.join(old_base, "dst.npy")), dst])
+        rel = np.concatenate([np.load(os.path.join(old_base, "rel.npy")), rel])
+
+    # one copy of each (a, b, relation); the same pair seen from b's side also counts
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    keep = lo != hi
+    edge_table = np.stack([lo[keep], hi[keep], rel[keep].astype(np.uint64)], axis=1)
+    edge_table = np.unique(edge_table, axis=0) if len(edge_table) else edge_table.reshape(0, 3)
+    return _write_graph(base, labels, edge_table[:, 0], edge_table[:, 1], edge_table[:, 2].astype(np.uint8))
+
+
+async def _collect_edges(collection, query: dict) -> list[tuple[str, str, str]]:
+    edges = []
+    async for doc in collection.find(query, PROJECTION):
+        edges += doc_edges(doc)
+    return edges
+
+
+def _drop_old_versions(keep: set[str]):
+    # the version just replaced stays until the next publish: workers that
+    # read the previous manifest may still be mapping its arrays
+    for name in os.listdir(settings.GRAPH_DIR):
+        path = os.path.join(settings.GRAPH_DIR, name)
+        if name not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+async def _publish(previous: Graph | None, edges: list, started: datetime, full: bool) -> dict:
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    stats = await asyncio.to_thread(_merge, previous, edges, os.path.join(settings.GRAPH_DIR, version))
+    manifest = {
+        "version": version,
+        **stats,
+        "watermark": started.isoformat(),
+        "built_at": datetime.utcnow().isoformat(),
+    }
+    manifest["full_at"] = manifest["built_at"] if full else (previous.manifest.get("full_at") if previous else None)
+    replaced = read_manifest()
+    tmp = f"{_manifest_path()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, _manifest_path())
+    _drop_old_versions({version, replaced["version"] if replaced else None})
+    return {"mode": "full" if full else "update", **stats}
+
+
+async def build_graph() -> dict:
+    """Full rebuild from every stored threat."""
+    async with _build_lock:
+        os.makedirs(settings.GRAPH_DIR, exist_ok=True)
+        started = datetime.utcnow()
+        edges = await _collect_edges(threats_read_collection, {})
+        return await _publish(None, edges, started, full=True)
+
+
+async def update_graph() -> dict:
+    """After ingestion: merge the edges of threats fetched since the watermark."""
+    manifest = read_manifest()
+    if manifest is None:
+        return await build_graph()
+    async with _build_lock:
+        previous = get_graph()
+        started = datetime.utcnow()
+        query = {"fetched_at": {"$gte": datetime.fromisoformat(manifest["watermark"])}}
+        edges = await _collect_edges(threats_collection, query)
+        return await _publish(previous, edges, started, full=False)
+
+
+async def run_graph() -> dict:
+    """Scheduled job: full rebuild (drops edges of deleted threats)."""
+    return await build_graph()
+
+
+def graph_status() -> dict:
+    manifest = read_manifest()
+    return {**(manifest or {}), "kinds": KINDS, "relations": RELATIONS}
@@ -0,0 +1,330 @@
+# core/iocs.py
+import asyncio
+import ipaddress
+import socket
+import re
+import sys
+import time
+from datetime import datetime
+from core.db import threats_collection
+from core.settings import settings
+
+_HASH_RE = re.compile(r"^[0-9a-f]{32}$|^[0-9a-f]{40}$|^[0-9a-f]{64}$")
+_TERMINAL = "\0"  # marks the end of a domain in the suffix trie
+
+
+# ========================
+# Value normalization
+# ========================
+def normalize_value(value: str) -> str:
+    """Canonical form used for every structure: stripped, lowercased, no trailing dot."""
+    return (value or "").strip().lower().rstrip(".")
+
+
+def classify_value(value: str) -> str:
+    """Guess the kind of an IOC value: ip, cidr, url, hash or domain."""
+    if "://" in value:
+        return "url"
+    first = value[:1]
+    # only values that can be addresses pay for ipaddress parsing
+    maybe_ip = first.isdigit() or first == "[" or ":" in value
+    if "/" in value:
+        if maybe_ip:
+            try:
+                ipaddress.ip_network(value, strict=False)
+                return "cidr"
+            except ValueError:
+                pass
+        return "url"
+    if len(value) in (32, 40, 64) and _HASH_RE.match(value):
+        return "hash"
+    if maybe_ip:
+        host = strip_port(value)
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                socket.inet_pton(family, host)
+                return "ip"
+            except OSError:
+                pass
+    return "domain"
+
+
+def strip_port(value: str) -> str:
+    """Remove a trailing :port (ThreatFox `ip:port` IOCs) but keep bare IPv6."""
+    if value.startswith("["):
+        return value[1:value.find("]")] if "]" in value else value
+    if value.count(":") == 1:
+        return value.split(":", 1)[0]
+    return value
+
+
+def url_host(value: str) -> str:
+    """Host part of a URL, without credentials or port."""
+    rest = value.split("://", 1)[-1]
+    host = rest.split("/", 1)[0].split("?", 1)[0].split("#", 1)[0]
+    host = host.rsplit("@", 1)[-1]
+    return strip_port(host)
+
+
+def _deep_sizeof(obj, seen=None) -> int:
+    """Approximate memory footprint of nested dict/list/tuple/set structures."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += _deep_sizeof(k, seen) + _deep_sizeof(v, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _deep_sizeof(item, seen)
+    return size
+
+
+# ========================
+# CIDR table
+# ========================
+class CidrTable:
+    """
+    Longest-prefix match over IP networks.
+    Networks are kept in one hash table per prefix length (a flattened radix
+    tree); lookups probe only the prefix lengths actually present, longest first.
+    """
+
+    def __init__(self):
+        self._tables: dict[tuple[int, int], dict[int, tuple]] = {}  # (version, prefixlen) -> {network_int: meta}
+        self._lengths: dict[int, list[int]] = {4: [], 6: []}
+
+    def __len__(self):
+        return sum(len(t) for t in self._tables.values())
+
+    def add(self, network: str, meta: tuple):
+        net = ipaddress.ip_network(network, strict=False)
+        key = (net.version, net.prefixlen)
+        if key not in self._tables:
+            self._tables[key] = {}
+            self._lengths[net.version] = sorted(self._lengths[net.version] + [net.prefixlen], reverse=True)
+        self._tables[key][int(net.network_address)] = meta
+
+    def lookup(self, ip: str):
+        try:
+            # inet_pton is far cheaper than ipaddress for the common IPv4 case
+            value, version, bits = int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big"), 4, 32
+        except OSError:
+            try:
+                value, version, bits = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big"), 6, 128
+            except OSError:
+                return None
+        for length in self._lengths[version]:
+            masked = value & (((1 << length) - 1) << (bits - length))
+            hit = self._tables[(version, length)].get(masked)
+            if hit is not None:
+                return hit
+        return None
+
+    def memory_bytes(self) -> int:
+        return _deep_sizeof(self._tables)
+
+
+# ========================
+# Domain suffix trie
+# ========================
+class DomainTrie:
+    """Trie over reversed domain labels: `evil.com` also matches `a.b.evil.com`."""
+
+    def __init__(self):
+        self._root: dict = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, domain: str, meta: tuple):
+        node = self._root
+        for label in reversed(domain.split(".")):
+            node = node.setdefault(label, {})
+        if _TERMINAL not in node:
+            self._count += 1
+        node[_TERMINAL] = meta
+
+    def lookup(self, domain: str):
+        """Return the meta of the most specific listed suffix of a domain, or None."""
+        node = self._root
+        found = None
+        for label in reversed(domain.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            meta = node.get(_TERMINAL)
+            if meta is not None:
+                found = meta
+        return found
+
+    def memory_bytes(self) -> int:
+        return _deep_sizeof(self._root)
+
+
+# ========================
+# IOC index
+# ========================
+class IOCIndex:
+    """
+    In-process indicator index built from the `threats` collection.
+    - exact: hash table of exact values (hashes, URLs, IPs, domains)
+    - cidr: IP range matching
+    - domains: suffix matching for domains/hostnames
+    Each entry carries (indicator, type, source, priority, threat_id).
+
+    Refreshes add indicators fetched or rescored since the last one; every
+    IOC_REBUILD_SECONDS the index is rebuilt instead, which drops indicators
+    deleted by retention.
+    """
+
+    def __init__(self):
+        self._reset()
+        self._watermark: datetime | None = None
+        self._scored_watermark: datetime | None = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _reset(self):
+        self.exact: dict[str, tuple] = {}
+        self.cidr = CidrTable()
+        self.domains = DomainTrie()
+
+    def __len__(self):
+        return len(self.exact) + len(self.cidr)
+
+    # ---------- building ----------
+    def add(self, doc: dict):
+        value = normalize_value(doc.get("indicator"))
+        if not value:
+            return
+        meta = (
+            doc.get("indicator"),
+            doc.get("type"),
+            doc.get("source"),
+            doc.get("priority"),
+            str(doc.get("_id")) if doc.get("_id") is not None else None,
+        )
+        kind = classify_value(value)
+        if kind == "cidr":
+            self.cidr.add(value, meta)
+            return
+        if kind == "ip":
+            value = strip_port(value)
+        if kind == "domain":
+            self.domains.add(value, meta)
+        self.exact[value] = meta
+
+    async def rebuild(self):
+        """
+        Rebuild every structure from scratch (drops indicators deleted from
+        Mongo). Lookups keep using the old structures until the new ones are
+        complete.
+        """
+        async with self._lock:
+            fresh = IOCIndex()
+            await fresh._load({"indicator": {"$exists": True}})
+            self.exact, self.cidr, self.domains = fresh.exact, fresh.cidr, fresh.domains
+            self._watermark, self._scored_watermark = fresh._watermark, fresh._scored_watermark
+            self._refreshed_at = self._rebuilt_at = time.monotonic()
+
+    async def refresh(self, force: bool = False):
+        """Incrementally add indicators fetched or rescored since the last refresh."""
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < settings.IOC_REFRESH_SECONDS:
+            return
+        if self._watermark is None or now - self._rebuilt_at >= settings.IOC_REBUILD_SECONDS:
+            await self.rebuild()
+            return
+        async with self._lock:
+            await self._load({"indicator": {"$exists": True}, "$or": [
+                {"fetched_at": {"$gt": self._watermark}},
+                {"analyzed_at": {"$gt": self._scored_watermark}},
+            ]})
+
+    async def _load(self, query: dict):
+        projection = {"indicator": 1, "type": 1, "source": 1, "priority": 1, "fetched_at": 1, "analyzed_at": 1}
+        async for doc in threats_collection.find(query, projection):
+            self.add(doc)
+            fetched, analyzed = doc.get("fetched_at"), doc.get("analyzed_at")
+            if isinstance(fetched, datetime) and (self._watermark is None or fetched > self._watermark):
+                self._watermark = fetched
+            if isinstance(analyzed, datetime) and (self._scored_watermark is None or analyzed > self._scored_watermark):
+                self._scored_watermark = analyzed
+        if self._watermark is None:
+            self._watermark = datetime.min
+        if self._scored_watermark is None:
+            self._scored_watermark = datetime.min
+        self._refreshed_at = time.monotonic()
+
+    # ---------- lookups ----------
+    def match(self, raw: str):
+        """Return (kind, matched_on, meta) for a value, or None."""
+        value = normalize_value(raw)
+        if not value:
+            return None
+        # most hits are exact, and a dict probe is the cheapest check we have
+        hit = self.exact.get(value)
+        if hit is not None:
+            return "exact", value, hit
+        kind = classify_value(value)
+
+        if kind == "url":
+            value = url_host(value)
+            hit = self.exact.get(value)
+            if hit is not None:
+                return "exact", value, hit
+            kind = classify_value(value)
+
+        if kind in ("ip", "cidr"):
+            value = strip_port(value.split("/", 1)[0])
+            hit = self.exact.get(value)
+            if hit is not None:
+                return "exact", value, hit
+            hit = self.cidr.lookup(value)
+            return ("cidr", value, hit) if hit else None
+
+        if kind == "domain":
+            hit = self.domains.lookup(value)
+            if hit:
+                return "domain_suffix", value, hit
+        return None
+
+    def match_many(self, values: list[str]) -> list[dict]:
+        results = []
+        for raw in values:
+            found = self.match(raw)
+            if found is None:
+                continue
+            kind, matched_on, (indicator, ioc_type, source, priority, threat_id) = found
+            results.append({
+                "value": raw,
+                "match": kind,
+                "matched_on": matched_on,
+                "indicator": indicator,
+                "type": ioc_type,
+                "source": source,
+                "priority": priority,
+                "threat_id": threat_id,
+            })
+        return results
+
+    # ---------- reporting ----------
+    def stats(self) -> dict:
+        return {
+            "indicators": len(self),
+            "watermark": self._watermark.isoformat() if self._watermark and self._watermark != datetime.min else None,
+            "structures": {
+                "exact": {"entries": len(self.exact), "bytes": _deep_sizeof(self.exact)},
+                "cidr": {"entries": len(self.cidr), "bytes": self.cidr.memory_bytes()},
+                "domains": {"entries": len(self.domains), "bytes": self.domains.memory_bytes()},
+            },
+        }
+
+
+# single shared index used by the /iocs routes
+ioc_index = IOCIndex()
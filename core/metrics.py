@@ -0,0 +1,196 @@
+# core/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from pymongo import monitoring
+
+# Latency buckets (seconds) shared by the request/DB/fetch histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+REGISTRY: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()  # Mongo events arrive on executor threads
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._function = function  # evaluated at scrape time, costs nothing in the hot path
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        if self._function is not None:
+            lines.append(f"{self.name} {self._function()}")
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labelnames, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+def route_template(scope: dict) -> str:
+    """
+    Path template of the matched route (/threats/{id}), not the raw path, so
+    label cardinality stays bounded. Newer FastAPI keeps the router-local
+    route in scope["route"] and the prefixed one in its own scope entry.
+    """
+    effective = scope.get("fastapi", {}).get("effective_route_context") if isinstance(scope.get("fastapi"), dict) else None
+    if effective is not None and getattr(effective, "path", None):
+        return effective.path
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ========================
+# Application metrics
+# ========================
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("collection", "op"))
+mongo_commands = Counter(
+    "mongo_commands_total", "MongoDB commands by outcome", ("collection", "op", "outcome"))
+fetch_duration = Histogram(
+    "feed_fetch_duration_seconds", "Feed fetch duration per source (incl. retries)", ("source", "outcome"))
+fetch_records = Counter(
+    "feed_fetch_records_total", "Records returned by feed fetches", ("source",))
+scoring_batch_size = Histogram(
+    "scoring_batch_size", "Threats scored per batch", (), buckets=SIZE_BUCKETS)
+scoring_item_duration = Histogram(
+    "scoring_item_duration_seconds", "Time to score one threat (incl. save/alert)")
+model_inference_duration = Histogram(
+    "model_inference_duration_seconds", "AI model predict() latency")
+
+
+# ========================
+# MongoDB command listener
+# ========================
+class MongoMetricsListener(monitoring.CommandListener):
+    """Times every command by collection and operation name."""
+
+    def __init__(self):
+        self._started: dict[int, tuple] = {}
+
+    def started(self, event):
+        cmd = event.command
+        collection = cmd.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = cmd.get("collection")
+        if not isinstance(collection, str):
+            collection = "-"
+        self._started[event.request_id] = (collection, event.command_name)
+
+    def _finish(self, event, outcome: str):
+        collection, op = self._started.pop(event.request_id, ("-", event.command_name))
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, op)
+        mongo_commands.inc(collection, op, outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
@@ -0,0 +1,162 @@
+# core/profiler.py
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from core.metrics import route_template
+from core.settings import settings
+
+# Only one sampler runs at a time; concurrent requests are simply not profiled
+_active = threading.Lock()
+
+
+# ========================
+# Statistical sampler
+# ========================
+class StackSampler:
+    """
+    Samples the Python stack of one thread (the event loop by default) every
+    `interval` seconds from a background thread and aggregates folded stacks.
+    Frames from everything running on the loop are captured, so the profile
+    of a request also shows whatever else the loop was doing at the time.
+    """
+
+    def __init__(self, interval: float | None = None, thread_id: int | None = None):
+        self.interval = interval or settings.PROFILE_INTERVAL_MS / 1000.0
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.started = self.elapsed = 0.0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def folded(self) -> str:
+        """Brendan Gregg folded format (flamegraph.pl, speedscope, inferno)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# ========================
+# Output
+# ========================
+def _safe_name(label: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")[:80] or "profile"
+
+
+def write_profile(sampler: StackSampler, kind: str, label: str) -> str:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    name = f"{stamp}_{kind}_{_safe_name(label)}_{int(sampler.elapsed * 1000)}ms.folded"
+    with open(os.path.join(settings.PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        f.write(sampler.folded())
+    return name
+
+
+def list_profiles(limit: int = 100) -> list[dict]:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    entries = []
+    for name in sorted(os.listdir(settings.PROFILE_DIR), reverse=True)[:limit]:
+        if not name.endswith(".folded"):
+            continue
+        path = os.path.join(settings.PROFILE_DIR, name)
+        entries.append({
+            "name": name,
+            "size": os.path.getsize(path),
+            "created_at": datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat(),
+        })
+    return entries
+
+
+def profile_path(name: str) -> str | None:
+    """Resolve a listed profile name to its path (no directory traversal)."""
+    if name != os.path.basename(name) or not name.endswith(".folded"):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def prune_profiles():
+    profiles = list_profiles(limit=10 ** 6)
+    for entry in profiles[settings.PROFILE_KEEP:]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, entry["name"]))
+        except OSError:
+            pass
+
+
+# ========================
+# Entry points: requests and background jobs
+# ========================
+def should_profile_request(headers) -> bool:
+    token = settings.ADMIN_TOKEN
+    if token and headers.get("x-profile") == token:
+        return True
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+@asynccontextmanager
+async def profile_job(kind: str, label: str):
+    """
+    Profile a background job (ingestion, clustering) when PROFILE_JOBS is on.
+    A no-op when disabled or when another profile is already running.
+    """
+    if not settings.PROFILE_JOBS or not _active.acquire(blocking=False):
+        yield
+        return
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        _active.release()
+        await asyncio.to_thread(write_profile, sampler, kind, label)
+        prune_profiles()
+
+
+async def profile_request(request, call_next):
+    """Middleware body: profile selected requests, pass everything else through."""
+    if not should_profile_request(request.headers) or not _active.acquire(blocking=False):
+        return await call_next(request)
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        sampler.stop()
+        _active.release()
+    label = f"{request.method} {route_template(request.scope)}"
+    name = await asyncio.to_thread(write_profile, sampler, "request", label)
+    prune_profiles()
+    response.headers["X-Profile-Name"] = name
+    return response
@@ -1,7 +1,8 @@
 # core/queries.py
-from core.db import threats_collection, alerts_collection
+from core.db import threats_read_collection, alerts_read_collection
 from datetime import datetime
 from bson import ObjectId
+from core.querylog import traced
 
 def serialize_doc(doc):
     """
@@ -29,21 +30,24 @@ def serialize_doc(doc):
 # Queries
 # ------------------------
 
+@traced
 async def get_sample_cves(limit: int = 5):
-    cursor = threats_collection.find({"cve_id": {"$exists": True}}).limit(limit)
+    cursor = threats_read_collection.find({"cve_id": {"$exists": True}}).limit(limit)
     docs = await cursor.to_list(length=limit)
     return [serialize_doc(d) for d in docs]
 
 
+@traced
 async def count_by_source():
     pipeline = [
         {"$group": {"_id": "$source", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}}
     ]
-    docs = await threats_collection.aggregate(pipeline).to_list(length=50)
+    docs = await threats_read_collection.aggregate(pipeline).to_list(length=50)
     return [serialize_doc(d) for d in docs]
 
 
+@traced
 async def get_top_iocs(limit: int = 10, role: str | None = None):
     query = {"indicator": {"$exists": True}}
 
@@ -55,11 +59,12 @@ async def get_top_iocs(limit: int = 10, role: str | None = None):
     elif role == "operational":
         query.update({"type": {"$in": ["ip", "domain", "url"]}})
 
-    cursor = threats_collection.find(query).sort("confidence", -1).limit(limit)
+    cursor = threats_read_collection.find(query).sort("confidence", -1).limit(limit)
     docs = await cursor.to_list(length=limit)
     return [serialize_doc(d) for d in docs]
 
 
+@traced
 async def get_trending_cves(limit: int = 10, role: str | None = None):
     query = {"cve_id": {"$exists": True}}
 
@@ -71,15 +76,16 @@ async def get_trending_cves(limit: int = 10, role: str | None = None):
     elif role == "operational":
         query.update({"cvss_score": {"$gte": 7}})
 
-    cursor = threats_collection.find(query).sort("epss_score", -1).limit(limit)
+    cursor = threats_read_collection.find(query).sort("epss_score", -1).limit(limit)
     docs = await cursor.to_list(length=limit)
     return [serialize_doc(d) for d in docs]
 
 
+@traced
 async def get_alerts(limit: int = 10, role: str | None = None):
     query = {}
     if role:
         query["role"] = role
-    cursor = alerts_collection.find(query).sort("created_at", -1).limit(limit)
+    cursor = alerts_read_collection.find(query).sort("created_at", -1).limit(limit)
     docs = await cursor.to_list(length=limit)
     return [serialize_doc(d) for d in docs]
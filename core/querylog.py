@@ -0,0 +1,241 @@
+# core/querylog.py
+import contextvars
+import functools
+import heapq
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from pymongo import monitoring
+from core.settings import settings
+
+# Commands that are driver housekeeping, not application queries
+_IGNORED = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "buildInfo",
+            "endSessions", "killCursors", "getLastError", "listIndexes", "createIndexes"}
+
+
+# ========================
+# Query shapes
+# ========================
+def query_shape(value, depth: int = 0):
+    """
+    Replace literal values with "?" but keep field names and operators, so
+    {"cve_id": "CVE-2024-1"} and {"cve_id": "CVE-2025-9"} share one shape.
+    """
+    if depth > 6:
+        return "…"
+    if isinstance(value, dict):
+        return {k: query_shape(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(v, dict) for v in value):
+            return [query_shape(v, depth + 1) for v in value[:8]]
+        return ["?"]
+    return "?"
+
+
+def command_shape(name: str, cmd: dict):
+    if name == "find":
+        return {"filter": query_shape(cmd.get("filter", {})), "sort": query_shape(cmd.get("sort", {}))}
+    if name in ("update", "delete"):
+        statements = cmd.get("updates" if name == "update" else "deletes") or [{}]
+        return {"q": query_shape(statements[0].get("q", {})), "n": "many" if len(statements) > 1 else 1}
+    if name == "aggregate":
+        return {"pipeline": [next(iter(stage), "?") for stage in cmd.get("pipeline", [])]}
+    if name in ("count", "findAndModify", "findandmodify"):
+        return {"q": query_shape(cmd.get("query", {}))}
+    if name == "distinct":
+        return {"key": cmd.get("key"), "q": query_shape(cmd.get("query", {}))}
+    return {}
+
+
+def _docs_returned(name: str, reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    return int(reply.get("n", 0) or 0)
+
+
+# ========================
+# Caller scopes
+# ========================
+class QueryScope:
+    """Counts the operations issued under one request/job/function."""
+
+    __slots__ = ("label", "parent", "counts", "lock")
+
+    def __init__(self, label: str, parent: "QueryScope | None"):
+        self.label = label if parent is None else f"{parent.label} > {label}"
+        self.parent = parent
+        self.counts: Counter = Counter()
+        self.lock = threading.Lock()
+
+
+# Motor runs commands on executor threads with a copy of the caller's context,
+# so the listener sees the scope active at the await site.
+_current_scope: contextvars.ContextVar[QueryScope | None] = contextvars.ContextVar("db_scope", default=None)
+
+
+class db_scope:
+    """
+    Attribute Mongo operations to a caller and check the scope for N+1
+    patterns on exit. Usable as `with db_scope("label"):` or as a decorator
+    on async functions.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+
+    def __enter__(self):
+        scope = QueryScope(self.label, _current_scope.get())
+        self._token = _current_scope.set(scope)
+        return scope
+
+    def __exit__(self, *exc):
+        scope = _current_scope.get()
+        _current_scope.reset(self._token)
+        query_log.check_n_plus_one(scope)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with db_scope(self.label):
+                return await fn(*args, **kwargs)
+        return wrapper
+
+
+def traced(fn):
+    """Decorator: scope an async function under its own name."""
+    return db_scope(f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}")(fn)
+
+
+# ========================
+# Operation log
+# ========================
+class QueryLog:
+    """
+    Aggregates per-shape stats, keeps the slowest operations (top-K and a
+    ring buffer of recent ops over SLOW_OP_MS) and N+1 findings.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.shapes: dict[tuple, dict] = {}
+            self.slowest: list = []  # min-heap of (ms, seq, op)
+            self.recent_slow: deque = deque(maxlen=settings.SLOW_OP_BUFFER)
+            self.n_plus_one: deque = deque(maxlen=settings.SLOW_OP_BUFFER)
+            self._seq = 0
+            self.since = datetime.utcnow()
+
+    def record(self, collection: str, op: str, shape, ms: float, docs: int, ok: bool):
+        scope = _current_scope.get()
+        caller = scope.label if scope is not None else "-"
+        shape_str = repr(shape)
+        key = (collection, op, shape_str)
+        if scope is not None:
+            with scope.lock:
+                scope.counts[key] += 1
+
+        with self._lock:
+            stats = self.shapes.get(key)
+            if stats is None:
+                if len(self.shapes) >= settings.SLOW_OP_MAX_SHAPES:
+                    stats = None
+                else:
+                    stats = self.shapes[key] = {"collection": collection, "op": op, "shape": shape,
+                                                "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                "docs": 0, "callers": {}}
+            if stats is not None:
+                stats["count"] += 1
+                stats["errors"] += 0 if ok else 1
+                stats["total_ms"] += ms
+                stats["max_ms"] = max(stats["max_ms"], ms)
+                stats["docs"] += docs
+                callers = stats["callers"]
+                if caller in callers or len(callers) < 10:
+                    callers[caller] = callers.get(caller, 0) + 1
+
+            if ms < settings.SLOW_OP_MS and len(self.slowest) >= settings.SLOW_OP_BUFFER:
+                if ms <= self.slowest[0][0]:
+                    return
+            entry = {"at": datetime.utcnow().isoformat(), "collection": collection, "op": op,
+                     "shape": shape, "ms": round(ms, 2), "docs": docs, "ok": ok, "caller": caller}
+            self._seq += 1
+            if len(self.slowest) < settings.SLOW_OP_BUFFER:
+                heapq.heappush(self.slowest, (ms, self._seq, entry))
+            elif ms > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (ms, self._seq, entry))
+            if ms >= settings.SLOW_OP_MS:
+                self.recent_slow.append(entry)
+
+    def check_n_plus_one(self, scope: QueryScope):
+        threshold = settings.N_PLUS_ONE_THRESHOLD
+        for (collection, op, shape), count in scope.counts.items():
+            if count < threshold:
+                continue
+            finding = {"at": datetime.utcnow().isoformat(), "caller": scope.label,
+                       "collection": collection, "op": op, "shape": shape, "count": count}
+            with self._lock:
+                self.n_plus_one.append(finding)
+            print(f"⚠️ N+1 pattern: {scope.label} ran {op} on {collection} {count}x with shape {shape}")
+
+    # ---------- views ----------
+    def slowest_ops(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            ranked = sorted(self.slowest, reverse=True)[:limit]
+        return [entry for _, _, entry in ranked]
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            return list(self.recent_slow)[-limit:][::-1]
+
+    def top_shapes(self, limit: int = 50, sort: str = "total_ms") -> list[dict]:
+        with self._lock:
+            rows = [dict(s, callers=dict(s["callers"])) for s in self.shapes.values()]
+        for row in rows:
+            row["avg_ms"] = round(row["total_ms"] / row["count"], 3) if row["count"] else 0.0
+            row["total_ms"] = round(row["total_ms"], 2)
+            row["max_ms"] = round(row["max_ms"], 2)
+        return sorted(rows, key=lambda r: r.get(sort, 0), reverse=True)[:limit]
+
+    def findings(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            return list(self.n_plus_one)[-limit:][::-1]
+
+
+# single shared log fed by the Mongo client listener
+query_log = QueryLog()
+
+
+class QueryLogListener(monitoring.CommandListener):
+    """Records duration, docs returned, shape and caller of every command."""
+
+    def __init__(self):
+        self._started: dict[int, tuple] = {}
+
+    def started(self, event):
+        name = event.command_name
+        if name in _IGNORED:
+            return
+        cmd = event.command
+        collection = cmd.get("collection") if name == "getMore" else cmd.get(name)
+        if not isinstance(collection, str):
+            collection = "-"
+        self._started[event.request_id] = (collection, name, command_shape(name, cmd))
+
+    def _finish(self, event, ok: bool, reply: dict | None):
+        started = self._started.pop(event.request_id, None)
+        if started is None:
+            return
+        collection, name, shape = started
+        docs = _docs_returned(name, reply) if reply else 0
+        query_log.record(collection, name, shape, event.duration_micros / 1000.0, docs, ok)
+
+    def succeeded(self, event):
+        self._finish(event, True, event.reply)
+
+    def failed(self, event):
+        self._finish(event, False, None)
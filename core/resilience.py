@@ -0,0 +1,214 @@
+# core/resilience.py
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
+from core.metrics import fetch_duration, fetch_records
+from core.settings import settings
+
+# Retryable HTTP statuses (rate limiting + transient upstream errors)
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Built-in per-source overrides; settings.SOURCE_POLICIES wins over these.
+# Reddit and ThreatFox are the usual hangers, so they get short budgets.
+DEFAULT_SOURCE_POLICIES = {
+    "nvd": {"timeout": 30, "budget": 120, "retries": 3},
+    # own breaker: a throttled backfill must not open the circuit for the regular NVD sync
+    "nvd-backfill": {"timeout": 30, "budget": 120, "retries": 3},
+    "epss": {"timeout": 30, "budget": 90},
+    "kev": {"timeout": 30, "budget": 90},
+    "mitre": {"timeout": 45, "budget": 120},
+    "otx": {"timeout": 20, "budget": 60},
+    "threatfox": {"timeout": 15, "budget": 40},
+    "reddit": {"timeout": 10, "budget": 25, "retries": 1},
+}
+
+
+class SourcePolicy:
+    """Timeout budget, retry and circuit-breaker settings for one source."""
+
+    FIELDS = ("timeout", "budget", "retries", "backoff_base", "backoff_max", "failure_threshold", "cooldown")
+
+    def __init__(self, **overrides):
+        self.timeout = float(settings.FETCH_TIMEOUT)   # per HTTP request
+        self.budget = float(settings.FETCH_TIMEOUT) * 2  # whole fetch incl. retries
+        self.retries = 2
+        self.backoff_base = 1.0
+        self.backoff_max = 30.0
+        self.failure_threshold = 3   # consecutive failures before the circuit opens
+        self.cooldown = 300.0        # seconds the circuit stays open
+        for key, value in overrides.items():
+            if key in self.FIELDS:
+                setattr(self, key, type(getattr(self, key))(value))
+
+    def as_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+
+def get_policy(source: str) -> SourcePolicy:
+    overrides = dict(DEFAULT_SOURCE_POLICIES.get(source, {}))
+    overrides.update(settings.SOURCE_POLICIES.get(source, {}))
+    return SourcePolicy(**overrides)
+
+
+def source_timeout(source: str) -> float:
+    """Per-request timeout for a source's HTTP calls."""
+    return get_policy(source).timeout
+
+
+def retry_after_seconds(resp: httpx.Response) -> float | None:
+    """Parse a Retry-After header given as seconds or as an HTTP date."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+# ========================
+# Circuit breaker
+# ========================
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open once `cooldown` has passed (one trial call);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.calls = 0
+        self.failures = 0
+        self.skipped = 0
+        self.retries = 0
+        self.last_error: str | None = None
+        self.last_success_at: datetime | None = None
+        self.last_failure_at: datetime | None = None
+        self.last_duration_s: float | None = None
+
+    def allow(self, policy: SourcePolicy) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < policy.cooldown:
+                self.skipped += 1
+                return False
+            self.state = "half_open"
+        return True
+
+    def record_success(self, duration: float):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_success_at = datetime.utcnow()
+        self.last_duration_s = round(duration, 3)
+
+    def record_failure(self, error: Exception, duration: float, policy: SourcePolicy):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"[:300]
+        self.last_failure_at = datetime.utcnow()
+        self.last_duration_s = round(duration, 3)
+        if self.state == "half_open" or self.consecutive_failures >= policy.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def status(self, policy: SourcePolicy) -> dict:
+        reopens_in = None
+        if self.state == "open":
+            reopens_in = round(max(policy.cooldown - (time.monotonic() - self.opened_at), 0.0), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "reopens_in_s": reopens_in,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "skipped": self.skipped,
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at.isoformat() if self.last_success_at else None,
+            "last_failure_at": self.last_failure_at.isoformat() if self.last_failure_at else None,
+            "last_duration_s": self.last_duration_s,
+            "policy": policy.as_dict(),
+        }
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, source: str):
+        super().__init__(f"circuit open for {source}, skipping until cool-down passes")
+        self.source = source
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(source: str) -> CircuitBreaker:
+    if source not in _breakers:
+        _breakers[source] = CircuitBreaker(source)
+    return _breakers[source]
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+async def call_with_policy(source: str, fetch_func, *args, **kwargs):
+    """
+    Run a fetcher under its source policy: skip while the circuit is open,
+    retry transient errors with exponential backoff (honoring Retry-After),
+    and never exceed the source's total time budget. Raises on final failure.
+    """
+    policy = get_policy(source)
+    breaker = get_breaker(source)
+    if not breaker.allow(policy):
+        raise CircuitOpenError(source)
+
+    breaker.calls += 1
+    started = time.monotonic()
+    deadline = started + policy.budget
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"{source} exceeded its {policy.budget}s budget")
+            result = await asyncio.wait_for(fetch_func(*args, **kwargs), timeout=remaining)
+            breaker.record_success(time.monotonic() - started)
+            fetch_duration.observe(time.monotonic() - started, source, "ok")
+            if hasattr(result, "__len__"):
+                fetch_records.inc(source, amount=len(result))
+            return result
+        except Exception as e:
+            wait = None
+            if _is_retryable(e) and attempt < policy.retries:
+                wait = min(policy.backoff_max, policy.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                if isinstance(e, httpx.HTTPStatusError):
+                    wait = max(wait, retry_after_seconds(e.response) or 0.0)
+                if time.monotonic() + wait >= deadline:
+                    wait = None  # the retry could not finish inside the budget
+            if wait is None:
+                breaker.record_failure(e, time.monotonic() - started, policy)
+                fetch_duration.observe(time.monotonic() - started, source, "error")
+                raise
+            attempt += 1
+            breaker.retries += 1
+            print(f"⚠️ {source} fetch failed ({e}); retry {attempt}/{policy.retries} in {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+
+def sources_health() -> dict:
+    """Breaker state and last outcome for every source seen so far."""
+    names = sorted(set(DEFAULT_SOURCE_POLICIES) | set(_breakers))
+    return {name: get_breaker(name).status(get_policy(name)) for name in names}
@@ -0,0 +1,191 @@
+# core/retention.py
+import asyncio
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from core.columnar import open_dataset, partition_value, to_arrow_table, write_parquet
+from core.db import db
+from core.settings import settings
+
+# Per collection: timestamp that ages a record, and the columns kept as
+# typed Parquet columns (the full document is also kept as JSON in "doc")
+ARCHIVE_SPECS = {
+    "threats": {
+        "timestamp": "fetched_at",
+        "columns": {
+            "_id": "string", "cve_id": "string", "indicator": "string", "type": "string",
+            "source": "string", "title": "string", "description": "string",
+            "cvss_score": "float", "epss_score": "float", "percentile": "float",
+            "kev_exploited": "bool", "priority": "string", "score": "float",
+            "published": "timestamp", "fetched_at": "timestamp",
+        },
+    },
+    "alerts": {
+        "timestamp": "created_at",
+        "columns": {
+            "_id": "string", "threat_id": "string", "priority": "string", "title": "string",
+            "role": "string", "created_at": "timestamp",
+        },
+    },
+}
+PARTITIONS = {"source": "string", "day": "string"}
+
+
+# ========================
+# Policies
+# ========================
+def policies() -> list[dict]:
+    """
+    Expand RETENTION_DAYS into concrete policies. Keys are "<collection>" or
+    "<collection>:<source>"; a collection-wide policy excludes sources that
+    have their own. 0 or missing means keep forever.
+    """
+    per_source = defaultdict(list)
+    for key in settings.RETENTION_DAYS:
+        collection, _, source = key.partition(":")
+        if source:
+            per_source[collection].append(source)
+
+    out = []
+    for key, days in settings.RETENTION_DAYS.items():
+        if not days:
+            continue
+        collection, _, source = key.partition(":")
+        if collection not in ARCHIVE_SPECS:
+            continue
+        if source:
+            match = {"source": source}
+        elif per_source[collection]:
+            match = {"source": {"$nin": per_source[collection]}}
+        else:
+            match = {}
+        out.append({"key": key, "collection": collection, "days": days, "match": match})
+    return out
+
+
+# ========================
+# Archive writes
+# ========================
+def _write_batch(collection: str, docs: list[dict], run_id: str) -> int:
+    """Group one batch by (source, day) and write one Parquet file per group."""
+    spec = ARCHIVE_SPECS[collection]
+    groups = defaultdict(list)
+    for doc in docs:
+        ts = doc.get(spec["timestamp"])
+        day = ts.strftime("%Y-%m-%d") if isinstance(ts, datetime) else "unknown"
+        groups[(partition_value(doc.get("source")), day)].append(doc)
+
+    for (source, day), group in groups.items():
+        table = to_arrow_table(group, spec["columns"], json_column="doc")
+        path = os.path.join(settings.ARCHIVE_DIR, collection, f"source={source}", f"day={day}",
+                            f"part-{run_id}-{uuid.uuid4().hex[:8]}.parquet")
+        write_parquet(table, path)
+    return len(groups)
+
+
+async def archive_policy(policy: dict, now: datetime | None = None) -> dict:
+    """
+    Archive records older than the policy to Parquet, then arm their TTL:
+    purge_at = now + grace, so the TTL index removes them only after the
+    archive file is on disk. Re-ingested records get purge_at cleared.
+    """
+    now = now or datetime.utcnow()
+    collection = db[policy["collection"]]
+    ts_field = ARCHIVE_SPECS[policy["collection"]]["timestamp"]
+    query = {
+        **policy["match"],
+        ts_field: {"$lt": now - timedelta(days=policy["days"])},
+        "purge_at": {"$exists": False},
+    }
+    purge_at = now + timedelta(hours=settings.RETENTION_GRACE_HOURS)
+    run_id = now.strftime("%Y%m%dT%H%M%S")
+    archived = files = 0
+    while True:
+        cursor = collection.find(query).sort(ts_field, 1).limit(settings.RETENTION_BATCH)
+        docs = await cursor.to_list(length=settings.RETENTION_BATCH)
+        if not docs:
+            break
+        files += await asyncio.to_thread(_write_batch, policy["collection"], docs, run_id)
+        await collection.update_many({"_id": {"$in": [d["_id"] for d in docs]}}, {"$set": {"purge_at": purge_at}})
+        archived += len(docs)
+    return {"policy": policy["key"], "archived": archived, "files": files}
+
+
+async def run_retention() -> dict:
+    """Scheduled job: apply every retention policy."""
+    results = [await archive_policy(p) for p in policies()]
+    archived = sum(r["archived"] for r in results)
+    if archived:
+        print(f"✅ Archived {archived} records for retention: {results}")
+    return {"archived": archived, "policies": results}
+
+
+# ========================
+# Historical lookups
+# ========================
+def search_archive(collection: str = "threats", cve_id: str | None = None, indicator: str | None = None,
+                   source: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                   limit: int = 100) -> list[dict]:
+    """
+    Look up archived records, newest first. Source and date bounds prune
+    partitions (directories); cve_id / indicator are pushed down to the
+    Parquet reader. Day partitions are read newest first until `limit`
+    matches are found, so a small limit does not scan old days.
+    Reads ARCHIVE_DIR on this node: with several nodes it must be shared storage.
+    """
+    import json
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    spec = ARCHIVE_SPECS[collection]
+    conditions = []
+    if cve_id:
+        conditions.append(ds.field("cve_id") == cve_id)
+    if indicator:
+        conditions.append(ds.field("indicator") == indicator)
+    if source:
+        conditions.append(ds.field("source") == partition_value(source))
+    if start:
+        conditions.append(ds.field("day") >= start.strftime("%Y-%m-%d"))
+    if end:
+        conditions.append(ds.field("day") <= end.strftime("%Y-%m-%d"))
+    filter_expr = None
+    for condition in conditions:
+        filter_expr = condition if filter_expr is None else filter_expr & condition
+
+    dataset = open_dataset(os.path.join(settings.ARCHIVE_DIR, collection), PARTITIONS)
+    if dataset is None:
+        return []
+    days = {
+        ds.get_partition_keys(fragment.partition_expression).get("day")
+        for fragment in dataset.get_fragments(filter=filter_expr)
+    }
+    tables, found = [], 0
+    for day in sorted((d for d in days if d), reverse=True):
+        day_filter = ds.field("day") == day
+        table = dataset.to_table(filter=day_filter if filter_expr is None else filter_expr & day_filter,
+                                 columns=["doc", spec["timestamp"]])
+        tables.append(table)
+        found += table.num_rows
+        if found >= limit:
+            break
+    if not tables:
+        return []
+    rows = pa.concat_tables(tables).to_pylist()
+    rows.sort(key=lambda r: r[spec["timestamp"]] or datetime.min, reverse=True)
+    return [json.loads(r["doc"]) for r in rows[:limit]]
+
+
+def archive_stats() -> dict:
+    stats = {}
+    for collection in ARCHIVE_SPECS:
+        base = os.path.join(settings.ARCHIVE_DIR, collection)
+        files = size = 0
+        for root, _, names in os.walk(base):
+            for name in names:
+                if name.endswith(".parquet"):
+                    files += 1
+                    size += os.path.getsize(os.path.join(root, name))
+        stats[collection] = {"files": files, "bytes": size}
+    return stats
@@ -0,0 +1,205 @@
+# core/rollups.py
+"""
+Hourly and daily threat counts for trend dashboards.
+
+Rows are keyed by (t, source, priority, cluster, kev), where t is the hour
+(or UTC day) of the threat's first_seen, and hold a count of canonical
+threats (near-duplicates are not counted again). They are rebuilt
+with $merge for just the buckets that changed since the last refresh:
+hours with new threats, or with threats rescored / reclustered since then.
+Daily rows are re-derived from the hourly ones, so a trend query reads a
+few hundred rollup rows instead of the threats collection.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from core.db import (
+    CANONICAL_FILTER, analytics_db, rollup_state_collection, rollups_daily_collection,
+    rollups_hourly_collection, threats_collection,
+)
+from core.settings import settings
+
+DIMENSIONS = ("source", "priority", "cluster", "kev")
+MERGE_KEY = ["t", *DIMENSIONS]
+GRANULARITY = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+_background_tasks: set[asyncio.Task] = set()
+_refresh_task: asyncio.Task | None = None
+_refresh_again = False
+
+
+# ========================
+# Pipelines
+# ========================
+def _ranges(buckets: list[datetime], step: timedelta) -> list[tuple[datetime, datetime]]:
+    """Coalesce bucket starts into contiguous [start, end) ranges."""
+    ranges = []
+    for t in sorted(set(buckets)):
+        if ranges and ranges[-1][1] == t:
+            ranges[-1] = (ranges[-1][0], t + step)
+        else:
+            ranges.append((t, t + step))
+    return ranges
+
+
+def _in_ranges(field: str, ranges: list[tuple[datetime, datetime]]) -> dict:
+    return {"$or": [{field: {"$gte": start, "$lt": end}} for start, end in ranges]}
+
+
+def _merge_stages(into: str, computed_at: datetime) -> list[dict]:
+    return [
+        {"$project": {
+            "_id": 0,
+            "t": "$_id.t",
+            **{d: f"$_id.{d}" for d in DIMENSIONS},
+            "count": 1,
+            "computed_at": {"$literal": computed_at},
+        }},
+        {"$merge": {"into": into, "on": MERGE_KEY, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def hourly_pipeline(match: dict, computed_at: datetime) -> list[dict]:
+    return [
+        {"$match": {**match, **CANONICAL_FILTER}},
+        {"$group": {
+            # $merge "on" fields must not be null
+            "_id": {
+                "t": {"$dateTrunc": {"date": "$first_seen", "unit": "hour"}},
+                "source": {"$ifNull": ["$source", "unknown"]},
+                "priority": {"$ifNull": ["$priority", "unscored"]},
+                "cluster": {"$ifNull": ["$cluster", -1]},
+                "kev": {"$eq": ["$kev_exploited", True]},
+            },
+            "count": {"$sum": 1},
+        }},
+        *_merge_stages(rollups_hourly_collection.name, computed_at),
+    ]
+
+
+def daily_pipeline(match: dict, computed_at: datetime) -> list[dict]:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"t": {"$dateTrunc": {"date": "$t", "unit": "day"}}, **{d: f"${d}" for d in DIMENSIONS}},
+            "count": {"$sum": "$count"},
+        }},
+        *_merge_stages(rollups_daily_collection.name, computed_at),
+    ]
+
+
+# ========================
+# Refresh
+# ========================
+async def _dirty_hours(since: datetime) -> list[datetime]:
+    """Hours holding threats that were added, rescored or reclustered since `since`."""
+    pipeline = [
+        {"$match": {**CANONICAL_FILTER, "$or": [
+            {"first_seen": {"$gte": since}},
+            {"analyzed_at": {"$gte": since}},
+            {"clustered_at": {"$gte": since}},
+        ]}},
+        {"$group": {"_id": {"$dateTrunc": {"date": "$first_seen", "unit": "hour"}}}},
+    ]
+    rows = await threats_collection.aggregate(pipeline).to_list(length=None)
+    return [r["_id"] for r in rows if r["_id"] is not None]
+
+
+async def refresh_rollups(full: bool = False) -> dict:
+    """
+    Recompute the rollup rows for changed hours (all hours if `full`),
+    then drop rows of those hours that the recomputation did not produce
+    (e.g. a priority that no threat in that hour has any more).
+    """
+    # BSON dates have millisecond precision: compare against what is stored
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    state = await rollup_state_collection.find_one({"_id": "threats"})
+    if full or not state:
+        hour_match = {"first_seen": {"$type": "date"}}
+        day_match, stale = {}, {}
+        hours = None
+    else:
+        hours = await _dirty_hours(state["watermark"])
+        if not hours:
+            await rollup_state_collection.update_one({"_id": "threats"}, {"$set": {"watermark": now}})
+            return {"mode": "incremental", "hours": 0, "days": 0}
+        hour_ranges = _ranges(hours, GRANULARITY["hour"])
+        day_ranges = _ranges([h.replace(hour=0) for h in hours], GRANULARITY["day"])
+        hour_match = _in_ranges("first_seen", hour_ranges)
+        day_match = _in_ranges("t", day_ranges)
+        stale = {"hour": _in_ranges("t", hour_ranges), "day": day_match}
+
+    await threats_collection.aggregate(hourly_pipeline(hour_match, now)).to_list(length=None)
+    await rollups_hourly_collection.delete_many({**stale.get("hour", {}), "computed_at": {"$lt": now}})
+    await rollups_hourly_collection.aggregate(daily_pipeline(day_match, now)).to_list(length=None)
+    await rollups_daily_collection.delete_many({**stale.get("day", {}), "computed_at": {"$lt": now}})
+
+    await rollup_state_collection.update_one(
+        {"_id": "threats"}, {"$set": {"watermark": now, **({"full_at": now} if hours is None else {})}}, upsert=True
+    )
+    if hours is None:
+        return {"mode": "full"}
+    return {"mode": "incremental", "hours": len(hours), "days": len({h.date() for h in hours})}
+
+
+async def run_rollups() -> dict:
+    """Scheduled job: full recomputation, a safety net for the incremental refreshes."""
+    return await refresh_rollups(full=True)
+
+
+async def _refresh_soon():
+    from core.scheduler import acquire_lease, release_lease  # local import: core.scheduler imports this module
+
+    global _refresh_again
+    while True:
+        # coalesce a burst of ingestion / scoring cycles into one refresh
+        await asyncio.sleep(settings.ROLLUP_DEBOUNCE_S)
+        _refresh_again = False
+        if await acquire_lease("ingest:rollups"):
+            try:
+                await refresh_rollups()
+            except Exception as e:
+                print(f"⚠️ Rollup refresh failed: {e}")
+            finally:
+                await release_lease("ingest:rollups")
+        else:
+            # another worker is refreshing; changes after its start need another pass
+            _refresh_again = True
+        if not _refresh_again:
+            return
+
+
+def schedule_rollup_refresh():
+    """Refresh rollups after an ingestion or scoring cycle, off the request path."""
+    global _refresh_task, _refresh_again
+    if not settings.ROLLUPS_ENABLED:
+        return
+    if _refresh_task is not None and not _refresh_task.done():
+        _refresh_again = True
+        return
+    _refresh_task = asyncio.create_task(_refresh_soon())
+    _background_tasks.add(_refresh_task)
+    _refresh_task.add_done_callback(_background_tasks.discard)
+
+
+# ========================
+# Queries
+# ========================
+async def get_trends(granularity: str = "day", start: datetime | None = None, end: datetime | None = None,
+                     group_by: list[str] | None = None, filters: dict | None = None) -> list[dict]:
+    """
+    Threat counts per bucket, summed over the dimensions not in `group_by`.
+    `filters` restricts dimensions to a value, e.g. {"priority": "critical"}.
+    """
+    collection = (rollups_hourly_collection if granularity == "hour" else rollups_daily_collection).name
+    end = end or datetime.utcnow()
+    start = start or end - GRANULARITY[granularity] * (48 if granularity == "hour" else 30)
+    group_by = group_by or []
+    pipeline = [
+        {"$match": {"t": {"$gte": start, "$lt": end}, **(filters or {})}},
+        {"$group": {"_id": {"t": "$t", **{d: f"${d}" for d in group_by}}, "count": {"$sum": "$count"}}},
+        {"$sort": {"_id.t": 1}},
+    ]
+    rows = await analytics_db[collection].aggregate(pipeline).to_list(length=None)
+    return [{**r["_id"], "count": r["count"]} for r in rows]
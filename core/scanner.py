@@ -0,0 +1,336 @@
+# core/scanner.py
+import argparse
+import asyncio
+import codecs
+import json
+import sys
+import time
+from collections import deque
+from core.db import threats_collection
+from core.iocs import normalize_value, strip_port
+from core.settings import settings
+
+# C implementation of Aho-Corasick (requirements.txt); the pure-Python
+# fallback is for development only and far from line rate
+try:
+    import ahocorasick
+    HAS_PYAHOCORASICK = True
+except ImportError:
+    HAS_PYAHOCORASICK = False
+
+MIN_PATTERN_LENGTH = 4  # shorter indicators match far too much free text
+MAX_LINE_LENGTH = 1 << 20  # characters buffered before a newline-free run is scanned as a line
+
+
+def _lower_with_offsets(text: str) -> tuple[str, list[int] | None]:
+    """
+    Lowercased text, plus a map from its offsets to offsets in `text` when
+    lowercasing changed the length (e.g. "İ" becomes two characters).
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered, None
+    parts, origin = [], []
+    for i, ch in enumerate(text):
+        low = ch.lower()
+        parts.append(low)
+        origin.extend([i] * len(low))
+    origin.append(len(text))
+    return "".join(parts), origin
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch in "-_"
+
+
+def _on_boundary(text: str, start: int, end: int) -> bool:
+    """
+    Reject matches embedded in a longer token, e.g. `evil.com` inside
+    `notevil.com` or `evil.com.au`. A leading dot is allowed so
+    subdomains of a listed domain still match.
+    """
+    if start > 0 and _is_word_char(text[start - 1]):
+        return False
+    if end < len(text):
+        nxt = text[end]
+        if _is_word_char(nxt):
+            return False
+        if nxt == "." and end + 1 < len(text) and _is_word_char(text[end + 1]):
+            return False
+    return True
+
+
+# ========================
+# Aho-Corasick automaton
+# ========================
+class _PyAutomaton:
+    """Pure-Python Aho-Corasick automaton (used when pyahocorasick is missing)."""
+
+    def __init__(self):
+        self.goto: list[dict] = [{}]
+        self.fail: list[int] = [0]
+        self.out: list[list] = [[]]
+
+    def add(self, word: str, payload):
+        state = 0
+        for ch in word:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append((len(word), payload))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                fallback = self.goto[f].get(ch, 0)
+                self.fail[nxt] = fallback if fallback != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text: str):
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, payload in out[state]:
+                yield i - length + 1, i + 1, payload
+
+
+class _CAutomaton:
+    """Thin wrapper giving pyahocorasick the same add/build/find interface."""
+
+    def __init__(self):
+        self._automaton = ahocorasick.Automaton()
+        self._payloads: dict[str, list] = {}
+
+    def add(self, word: str, payload):
+        self._payloads.setdefault(word, []).append(payload)
+
+    def build(self):
+        for word, payloads in self._payloads.items():
+            self._automaton.add_word(word, (len(word), payloads))
+        self._automaton.make_automaton()
+
+    def find(self, text: str):
+        if not self._payloads:
+            return
+        for end, (length, payloads) in self._automaton.iter(text):
+            for payload in payloads:
+                yield end - length + 1, end + 1, payload
+
+
+def build_automaton(patterns: dict[str, tuple]):
+    automaton = _CAutomaton() if HAS_PYAHOCORASICK else _PyAutomaton()
+    for word, payload in patterns.items():
+        automaton.add(word, payload)
+    automaton.build()
+    return automaton
+
+
+# ========================
+# Log scanner
+# ========================
+class LogScanner:
+    """
+    Finds stored indicators (domains, URLs, hashes, IPs) inside free-text
+    log lines. The automaton is rebuilt in the background and swapped in
+    atomically, so scans in progress keep using the previous one.
+    """
+
+    def __init__(self):
+        self._automaton = build_automaton({})
+        self.patterns = 0
+        self.built_at: float | None = None
+        self.build_seconds: float | None = None
+        # (latest fetched_at, count) of the stored indicators the automaton was built from
+        self.version: tuple | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def stored_version(self) -> tuple:
+        """Cheap fingerprint of the stored indicators: newest fetched_at and count."""
+        query = {"indicator": {"$exists": True}}
+        latest = await threats_collection.find_one(query, {"fetched_at": 1}, sort=[("fetched_at", -1)])
+        count = await threats_collection.count_documents(query)
+        return (latest or {}).get("fetched_at"), count
+
+    async def load_patterns(self) -> dict[str, tuple]:
+        patterns = {}
+        projection = {"indicator": 1, "type": 1, "source": 1, "priority": 1}
+        async for doc in threats_collection.find({"indicator": {"$exists": True}}, projection):
+            value = normalize_value(doc.get("indicator"))
+            payload = (doc.get("indicator"), doc.get("type"), doc.get("source"), doc.get("priority"))
+            for word in {value, strip_port(value)}:
+                if len(word) >= MIN_PATTERN_LENGTH:
+                    patterns[word] = payload
+        return patterns
+
+    async def rebuild(self):
+        """Reload indicators and rebuild the automaton off the event loop."""
+        async with self._lock:
+            started = time.perf_counter()
+            version = await self.stored_version()
+            patterns = await self.load_patterns()
+            automaton = await asyncio.to_thread(build_automaton, patterns)
+            self._automaton = automaton
+            self.patterns = len(patterns)
+            self.version = version
+            self._checked_at = time.monotonic()
+            self.built_at = time.time()
+            self.build_seconds = round(time.perf_counter() - started, 3)
+            print(f"✅ Log scanner automaton rebuilt: {self.patterns} patterns in {self.build_seconds}s")
+            if not HAS_PYAHOCORASICK:
+                print("⚠️ pyahocorasick not installed: log scans use the slow pure-Python automaton")
+
+    async def ensure_built(self):
+        """
+        Build on first use, then rebuild whenever the stored indicators
+        changed (checked every IOC_REFRESH_SECONDS): the sync that triggers
+        schedule_scanner_rebuild runs in one worker only.
+        """
+        if self.built_at is not None and time.monotonic() - self._checked_at < settings.IOC_REFRESH_SECONDS:
+            return
+        version = await self.stored_version()
+        self._checked_at = time.monotonic()
+        if self.built_at is None or version != self.version:
+            await self.rebuild()
+
+    def scan_text(self, text: str):
+        """Yield (start, end, payload) for each indicator found in text; offsets are into `text`."""
+        lowered, origin = _lower_with_offsets(text)
+        for start, end, payload in self._automaton.find(lowered):
+            if _on_boundary(lowered, start, end):
+                if origin is not None:
+                    start, end = origin[start], origin[end - 1] + 1
+                yield start, end, payload
+
+    def scan_line(self, line: str, line_no: int, fmt: str = "text"):
+        """
+        Scan one log line. NDJSON lines are scanned field by field, with
+        offsets relative to the field value; plain lines use line offsets.
+        """
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                for field, value in _string_fields(record):
+                    for match in self._matches(value, line_no, field):
+                        yield match
+                return
+        yield from self._matches(line, line_no, None)
+
+    def _matches(self, text: str, line_no: int, field: str | None):
+        for start, end, (indicator, ioc_type, source, priority) in self.scan_text(text):
+            yield {
+                "line": line_no,
+                "field": field,
+                "start": start,
+                "end": end,
+                "text": text[start:end],
+                "indicator": indicator,
+                "type": ioc_type,
+                "source": source,
+                "priority": priority,
+            }
+
+    def stats(self) -> dict:
+        return {
+            "patterns": self.patterns,
+            "engine": "pyahocorasick" if HAS_PYAHOCORASICK else "python",
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+        }
+
+
+def _string_fields(record: dict, prefix: str = ""):
+    """Yield (dotted_path, value) for every string value in a JSON object."""
+    for key, value in record.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, str):
+            yield path, value
+        elif isinstance(value, dict):
+            yield from _string_fields(value, path + ".")
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                if isinstance(item, str):
+                    yield f"{path}.{i}", item
+                elif isinstance(item, dict):
+                    yield from _string_fields(item, f"{path}.{i}.")
+
+
+async def scan_stream(chunks, fmt: str = "text"):
+    """
+    Scan an async iterator of byte/str chunks line by line, yielding matches
+    as they are found. Only the current partial line is buffered, up to
+    MAX_LINE_LENGTH characters; a longer run without a newline is scanned
+    as a line of its own (an indicator straddling that cut is missed).
+    """
+    await log_scanner.ensure_built()
+    # multi-byte characters may be split across chunks
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    line_no = 0
+    async for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        pending += chunk
+        lines = pending.split("\n")
+        pending = lines.pop()
+        while len(pending) > MAX_LINE_LENGTH:
+            lines.append(pending[:MAX_LINE_LENGTH])
+            pending = pending[MAX_LINE_LENGTH:]
+        for line in lines:
+            line_no += 1
+            for match in log_scanner.scan_line(line.rstrip("\r"), line_no, fmt):
+                yield match
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        line_no += 1
+        for match in log_scanner.scan_line(pending.rstrip("\r"), line_no, fmt):
+            yield match
+
+
+# single shared scanner used by the API and ingestion
+log_scanner = LogScanner()
+
+
+# ========================
+# CLI
+# ========================
+async def _cli(path: str, fmt: str):
+    async def read_chunks():
+        stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", errors="replace")
+        try:
+            while True:
+                chunk = stream.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    async for match in scan_stream(read_chunks(), fmt):
+        sys.stdout.write(json.dumps(match) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan log lines for known IOCs")
+    parser.add_argument("path", nargs="?", default="-", help="log file (default: stdin)")
+    parser.add_argument("--format", choices=["text", "ndjson"], default="text")
+    args = parser.parse_args()
+    asyncio.run(_cli(args.path, args.format))
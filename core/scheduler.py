@@ -0,0 +1,234 @@
+# core/scheduler.py
+import asyncio
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from core.clustering import assign_new_threats
+from core.db import locks_collection, runs_collection
+from core.extractor import SOURCES, INDICATOR_SOURCES, schedule_scanner_rebuild
+from core.graph import run_graph, update_graph
+from core.profiler import profile_job
+from core.querylog import db_scope
+from core.retention import run_retention
+from core.rollups import run_rollups, schedule_rollup_refresh
+from core.scoring import run_scoring
+from core.settings import settings
+from core.sightings import run_sightings
+from core.similarity import run_similarity, update_index
+from core.snapshot import run_snapshot
+
+# identifies this worker in leases and run history
+HOST = socket.gethostname()
+OWNER_ID = f"{HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# feeds plus maintenance jobs; all share leases, intervals and run history
+JOBS = {
+    **SOURCES,
+    "retention": run_retention,
+    "snapshot": run_snapshot,
+    "rollups": run_rollups,
+    "similarity": run_similarity,
+    "graph": run_graph,
+    "scoring": run_scoring,
+    "sightings": run_sightings,
+}
+# jobs whose output is written to this node's disk: every node keeps its own
+# copy, so their lease is taken per host instead of cluster-wide
+NODE_LOCAL_JOBS = {"snapshot"}
+
+
+def lease_name(job: str) -> str:
+    return f"ingest:{job}@{HOST}" if job in NODE_LOCAL_JOBS else f"ingest:{job}"
+
+
+# ========================
+# Mongo-backed lease
+# ========================
+async def acquire_lease(name: str, ttl: int | None = None) -> bool:
+    """
+    Take (or renew) the lease for `name`. Succeeds if nobody holds it,
+    the previous holder's lease expired, or we already own it.
+    """
+    ttl = ttl or settings.SCHEDULER_LEASE_SECONDS
+    now = datetime.utcnow()
+    try:
+        await locks_collection.update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": OWNER_ID}]},
+            {"$set": {"owner": OWNER_ID, "acquired_at": now, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # lease document exists and is held by another live owner
+        return False
+
+
+async def release_lease(name: str):
+    await locks_collection.delete_one({"_id": name, "owner": OWNER_ID})
+
+
+async def keep_lease(name: str):
+    """Renew a lease while a long sync is running."""
+    interval = max(settings.SCHEDULER_LEASE_SECONDS // 3, 1)
+    while True:
+        await asyncio.sleep(interval)
+        await acquire_lease(name)
+
+
+# ========================
+# Scheduler
+# ========================
+class IngestionScheduler:
+    """
+    Runs each job in JOBS (the core.extractor.SOURCES feeds plus maintenance
+    jobs) on its own interval (with jitter), holding a Mongo lease so only
+    one worker/node runs a job at a time, and records every run in
+    `ingestion_runs`.
+    """
+
+    def __init__(self):
+        self._loops: dict[str, asyncio.Task] = {}
+        self._running: dict[str, asyncio.Task] = {}
+        self.next_run: dict[str, datetime] = {}
+
+    def interval(self, source: str) -> int:
+        return settings.SCHEDULE_INTERVALS.get(source, settings.SCHEDULE_DEFAULT_INTERVAL)
+
+    def _jittered(self, seconds: float) -> float:
+        jitter = seconds * settings.SCHEDULER_JITTER
+        return max(seconds + random.uniform(-jitter, jitter), 1.0)
+
+    # ---------- single run ----------
+    async def run_source(self, source: str, trigger: str = "schedule") -> dict:
+        """Sync one source under its lease and record the run."""
+        lease = lease_name(source)
+        if not await acquire_lease(lease):
+            return {"source": source, "status": "skipped", "reason": "lease held by another worker"}
+
+        run = {
+            "source": source,
+            "owner": OWNER_ID,
+            "trigger": trigger,
+            "status": "running",
+            "started_at": datetime.utcnow(),
+        }
+        run_id = (await runs_collection.insert_one(run)).inserted_id
+        keeper = asyncio.create_task(keep_lease(lease))
+        started = asyncio.get_running_loop().time()
+        try:
+            with db_scope(f"ingest:{source}"):
+                async with profile_job("ingest", source):
+                    counts = await JOBS[source]()
+            update = {"status": "success", "counts": counts}
+            if source in INDICATOR_SOURCES:
+                schedule_scanner_rebuild()
+            if source in SOURCES:
+                if settings.CLUSTER_ASSIGN_ON_INGEST:
+                    update["clustering"] = await self.after_ingest("clustering:assign", assign_new_threats)
+                if settings.SIMILARITY_UPDATE_ON_INGEST:
+                    # same lease as the full rebuild job, so the two never write the index at once
+                    update["similarity"] = await self.after_ingest("ingest:similarity", update_index)
+                if settings.GRAPH_UPDATE_ON_INGEST:
+                    update["graph"] = await self.after_ingest("ingest:graph", update_graph)
+                schedule_rollup_refresh()
+        except Exception as e:
+            counts = {}
+            update = {"status": "error", "error": str(e)}
+            print(f"❌ Scheduled sync of {source} failed: {e}")
+        finally:
+            keeper.cancel()
+            await release_lease(lease)
+
+        update["finished_at"] = datetime.utcnow()
+        update["duration_s"] = round(asyncio.get_running_loop().time() - started, 3)
+        await runs_collection.update_one({"_id": run_id}, {"$set": update})
+        return {"source": source, **update, "counts": counts}
+
+    async def after_ingest(self, lease: str, step) -> dict:
+        """Batched post-ingest step (cluster assignment, index update) under a lease; never fails the sync."""
+        if not await acquire_lease(lease):
+            return {"status": "skipped", "reason": "lease held by another worker"}
+        try:
+            return await step()
+        except Exception as e:
+            print(f"⚠️ Post-ingest step {lease} failed: {e}")
+            return {"status": "error", "error": str(e)}
+        finally:
+            await release_lease(lease)
+
+    # ---------- triggers ----------
+    def trigger(self, sources: list[str] | None = None) -> dict:
+        """Start syncs in the background and return immediately."""
+        sources = sources or list(SOURCES)
+        started, skipped = [], []
+        for source in sources:
+            if source not in JOBS:
+                skipped.append({"source": source, "reason": "unknown source"})
+                continue
+            if source in self._running and not self._running[source].done():
+                skipped.append({"source": source, "reason": "already running"})
+                continue
+            task = asyncio.create_task(self.run_source(source, trigger="manual"))
+            self._running[source] = task
+            started.append(source)
+        return {"triggered": started, "skipped": skipped}
+
+    # ---------- loops ----------
+    async def _loop(self, source: str):
+        # spread the first runs out instead of bursting every feed at startup
+        delay = random.uniform(0, min(self.interval(source), settings.SCHEDULER_STARTUP_SPREAD))
+        while True:
+            self.next_run[source] = datetime.utcnow() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+            task = self._running.get(source)
+            if task is None or task.done():
+                task = asyncio.create_task(self.run_source(source))
+                self._running[source] = task
+            try:
+                await task
+            except Exception as e:
+                print(f"⚠️ Scheduler loop for {source} error: {e}")
+            delay = self._jittered(self.interval(source))
+
+    def start(self):
+        for source in JOBS:
+            if source not in self._loops:
+                self._loops[source] = asyncio.create_task(self._loop(source))
+        print(f"✅ Ingestion scheduler started ({OWNER_ID}) for: {', '.join(JOBS)}")
+
+    async def stop(self):
+        tasks = list(self._loops.values()) + list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # do not keep other workers waiting for our leases to expire
+        await locks_collection.delete_many({"owner": OWNER_ID})
+        self._loops.clear()
+        self._running.clear()
+
+    def status(self) -> dict:
+        return {
+            "owner": OWNER_ID,
+            "enabled": bool(self._loops),
+            "sources": {
+                source: {
+                    "interval_s": self.interval(source),
+                    "running": source in self._running and not self._running[source].done(),
+                    "next_run": self.next_run[source].isoformat() if source in self.next_run else None,
+                }
+                for source in JOBS
+            },
+        }
+
+
+async def get_runs(source: str | None = None, limit: int = 50):
+    query = {"source": source} if source else {}
+    cursor = runs_collection.find(query).sort("started_at", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+# single shared scheduler used by the app
+scheduler = IngestionScheduler()
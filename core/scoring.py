@@ -1,8 +1,17 @@
-import joblib
-import pandas as pd
+import asyncio
+import threading
+import time
 from datetime import datetime
 from core.settings import settings
-from core.db import save_threat, get_all_threats, save_alert
+from core.db import (
+    save_alert, save_scores, save_threat, threats_collection,
+    CANONICAL_FILTER, HEAVY_FIELDS, SCORING_INPUTS,
+)
+from core.epss import epss_table
+from core.metrics import model_inference_duration, scoring_batch_size, scoring_item_duration
+from core.querylog import traced
+from core.rollups import schedule_rollup_refresh
+from core.startup import startup_report
 from core.ws import manager as ws_manager  # for WebSocket broadcasting
 from core.queries import serialize_doc      # ✅ import serializer
 
@@ -19,21 +28,51 @@ WEIGHTS = {
     "epss": 100,  # multiplier
 }
 
-# Try loading AI model (pipeline)
+# Every threat is scored for each role at once (role_scores.<role>), so a
+# role's view is an index scan on role_scores.<role>.score
+ROLES = ("security", "financial", "operational")
+PRIORITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+# AI model (pipeline), loaded on first use: joblib/pandas/sklearn/imblearn
+# take seconds to import, which workers shouldn't pay before serving traffic
 MODEL = None
-try:
-    MODEL = joblib.load(settings.AI_MODEL_PATH)
-    print("✅ AI model loaded for scoring.")
-except Exception as e:
-    MODEL = None
-    print(f"⚠️ AI model not loaded, using rule-based scoring: {e}")
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Return the AI model, loading it once (None if unavailable -> rule-based scoring)."""
+    global MODEL, _model_loaded
+    if _model_loaded:
+        return MODEL
+    with _model_lock:
+        if not _model_loaded:
+            started = time.perf_counter()
+            try:
+                import joblib
+                MODEL = joblib.load(settings.AI_MODEL_PATH)
+                print("✅ AI model loaded for scoring.")
+            except Exception as e:
+                MODEL = None
+                print(f"⚠️ AI model not loaded, using rule-based scoring: {e}")
+            startup_report.record("load AI model", time.perf_counter() - started)
+            _model_loaded = True
+    return MODEL
+
+
+async def load_model():
+    """get_model() without blocking the event loop on the first load."""
+    if _model_loaded:
+        return MODEL
+    return await asyncio.to_thread(get_model)
 
 
-def prepare_ai_features(threat: dict) -> pd.DataFrame:
+def prepare_ai_features(threat: dict):
     """
     Prepare features for the AI model.
     Adjust this to match the feature set your model was trained on.
     """
+    import pandas as pd  # already imported by the model load
     return pd.DataFrame([{
         "title": threat.get("title", ""),
         "description": threat.get("description", ""),
@@ -44,27 +83,73 @@ def prepare_ai_features(threat: dict) -> pd.DataFrame:
     }])
 
 
-async def analyze_threats(threat: dict, role: str | None = None):
+def role_modifier(role: str | None, text: str, cvss: float, kev: bool) -> float:
+    """Points a role adds to the base score (text is the lower-cased summary)."""
+    bonus = 0
+    if role == "security":
+        if kev:
+            bonus += 30
+        if cvss >= 9:
+            bonus += 20
+    elif role == "financial":
+        if "ransomware" in text or "phishing" in text:
+            bonus += 40
+    elif role == "operational":
+        if cvss >= 7:
+            bonus += 25
+        if "supply chain" in text:
+            bonus += 30
+    return bonus
+
+
+def priority_for(score: float) -> str:
+    if score >= 120:
+        return "critical"
+    elif score >= 90:
+        return "high"
+    elif score >= 60:
+        return "medium"
+    return "low"
+
+
+def role_view(threat: dict, role: str | None) -> dict:
+    """The threat with score/priority as `role` sees them (stored role_scores)."""
+    scores = (threat.get("role_scores") or {}).get(role) if role else None
+    return {**threat, **scores} if scores else threat
+
+
+async def analyze_threats(threat: dict, role: str | None = None, alert: bool = True):
     """
     Score a threat using AI model if available, else rule-based heuristics.
-    Role-specific modifiers are applied in both cases.
-    Generates & broadcasts alerts if severity is high/critical.
+    score/priority are stored without role modifiers, and role_scores holds
+    them with each role's modifiers; the returned threat shows `role`'s.
+    Generates & broadcasts alerts when the priority rises to high/critical
+    (never with alert=False, e.g. for backfilled or migrated threats).
     """
+    previous = role_view(threat, role).get("priority")
+    # as read: a stored threat keeps needs_rescore if these changed meanwhile
+    inputs = {f: threat.get(f) for f in SCORING_INPUTS}
     summary = (threat.get("description") or "") + " " + (threat.get("title") or "")
     cvss = threat.get("cvss_score") or 0
+    filled = {}
+    if threat.get("epss_score") is None and threat.get("cve_id"):
+        # O(1) lookup in the daily EPSS table for CVEs stored without a score
+        filled = epss_table.get(threat["cve_id"]) or {}
+        threat.update(filled)
     epss = threat.get("epss_score") or 0
     kev = threat.get("kev_exploited", False)
 
     score = 0
-    priority = "low"
 
     # ================================
     # 1. AI-based scoring
     # ================================
-    if MODEL:
+    model = await load_model()
+    if model:
         try:
             X = prepare_ai_features(threat)
-            pred_label = MODEL.predict(X)[0]
+            with model_inference_duration.time():
+                pred_label = model.predict(X)[0]
 
             if pred_label == "high":
                 score = 90
@@ -82,7 +167,7 @@ async def analyze_threats(threat: dict, role: str | None = None):
     # ================================
     # 2. Rule-based scoring (if no AI or AI failed)
     # ================================
-    if not MODEL or score == 0:
+    if not model or score == 0:
         text = summary.lower()
         for keyword, w in WEIGHTS.items():
             if keyword in text:
@@ -93,49 +178,41 @@ async def analyze_threats(threat: dict, role: str | None = None):
             score += WEIGHTS.get("kev_exploited", 50)
 
     # ================================
-    # 3. Role-based modifiers
+    # 3. Role-based modifiers, for every role
     # ================================
     text = summary.lower()
-    if role == "security":
-        if kev:
-            score += 30
-        if cvss >= 9:
-            score += 20
-    elif role == "financial":
-        if "ransomware" in text or "phishing" in text:
-            score += 40
-    elif role == "operational":
-        if cvss >= 7:
-            score += 25
-        if "supply chain" in text:
-            score += 30
-
-    # ================================
-    # 4. Priority assignment
-    # ================================
-    if score >= 120:
-        priority = "critical"
-    elif score >= 90:
-        priority = "high"
-    elif score >= 60:
-        priority = "medium"
-    else:
-        priority = "low"
+    role_scores = {}
+    for r in ROLES:
+        role_score = float(score + role_modifier(r, text, cvss, kev))
+        role_scores[r] = {"score": role_score, "priority": priority_for(role_score)}
 
     # Attach analysis metadata
     threat["score"] = float(score)
-    threat["priority"] = priority
+    threat["priority"] = priority_for(score)
+    threat["role_scores"] = role_scores
     threat["analyzed_at"] = datetime.utcnow()
 
-    # Save updated threat
-    await save_threat(threat)
+    # Save the scores: only they are written back for a stored threat
+    if threat.get("_id") is not None:
+        await save_scores(threat, inputs, filled)
+    else:
+        threat["needs_rescore"] = False
+        await save_threat(threat)
+
+    # ================================
+    # 4. Requested role's view
+    # ================================
+    threat.update(role_view(threat, role))
+    priority = threat["priority"]
 
     # ================================
-    # 5. Generate alerts for high/critical
+    # 5. Generate alerts when the priority rises to high/critical
+    #    (near-duplicates are alerted once, via their canonical threat)
     # ================================
+    rose = PRIORITY_RANK[priority] > PRIORITY_RANK.get(previous, -1)
     try:
-        if priority in ("high", "critical"):
-            alert = {
+        if alert and rose and priority in ("high", "critical") and not threat.get("duplicate_of"):
+            alert_doc = {
                 "title": f"High-priority threat detected: {priority.upper()}",
                 "description": threat.get("description") or threat.get("title") or "",
                 "severity": priority,
@@ -143,11 +220,11 @@ async def analyze_threats(threat: dict, role: str | None = None):
                 "threat_ref": threat.get("cve_id") or threat.get("indicator") or str(threat.get("_id")),
                 "created_at": datetime.utcnow(),
             }
-            alert_id = await save_alert(alert)
-            alert["id"] = alert_id
+            alert_id = await save_alert(alert_doc)
+            alert_doc["id"] = alert_id
 
             # ✅ Serialize before broadcasting
-            alert_out = serialize_doc(alert)
+            alert_out = serialize_doc(alert_doc)
 
             try:
                 await ws_manager.broadcast({"type": "alert", "alert": alert_out})
@@ -159,14 +236,63 @@ async def analyze_threats(threat: dict, role: str | None = None):
     return threat
 
 
+@traced
 async def get_scored_threats(limit: int = 50, role: str | None = None):
     """
-    Retrieve and score threats, sorted by score.
+    Highest-scored threats as `role` sees them, read from the stored scores
+    (an index scan on role_scores.<role>.score, or score without a role).
+    Threats are scored by the scheduled "scoring" job, not here.
+    """
+    field = f"role_scores.{role}.score" if role in ROLES else "score"
+    query = {**CANONICAL_FILTER, field: {"$ne": None}}
+    cursor = threats_collection.find(query, HEAVY_FIELDS).sort(field, -1).limit(limit)
+    return [role_view(t, role) for t in await cursor.to_list(length=limit)]
+
+
+@traced
+async def rescore_pending(limit: int = 500, role: str | None = None):
+    """
+    Rescore threats flagged by delta re-enrichment (core.enrichment) or
+    ingestion. Threats flagged with rescore_quiet (backfill, migration) are
+    scored without alerting. Near-duplicates are not scored (they are never
+    shown or alerted on), only unflagged. Returns the number of threats rescored.
+    """
+    cursor = threats_collection.find({"needs_rescore": True}).limit(limit)
+    pending = await cursor.to_list(length=limit)
+    duplicates = [t["_id"] for t in pending if t.get("duplicate_of")]
+    if duplicates:
+        await threats_collection.update_many({"_id": {"$in": duplicates}}, {"$set": {"needs_rescore": False}})
+        pending = [t for t in pending if not t.get("duplicate_of")]
+    scoring_batch_size.observe(len(pending))
+    quiet = []
+    for t in pending:
+        if t.pop("rescore_quiet", False):
+            quiet.append(t["_id"])
+        with scoring_item_duration.time():
+            await analyze_threats(t, role, alert=t["_id"] not in quiet)
+    if quiet:
+        await threats_collection.update_many({"_id": {"$in": quiet}}, {"$unset": {"rescore_quiet": ""}})
+    if pending:
+        schedule_rollup_refresh()
+    return len(pending)
+
+
+async def run_scoring(limit: int | None = None) -> dict:
+    """
+    Scheduled job: score new threats and threats flagged for rescoring,
+    in batches. Threats scored before role_scores existed are flagged too,
+    quietly: rescoring them must not re-alert on the whole collection.
     """
-    data = await get_all_threats(limit=limit)
-    scored = []
-    for t in data:
-        analyzed = await analyze_threats(t, role)
-        scored.append(analyzed)
-    scored = sorted(scored, key=lambda x: x.get("score", 0), reverse=True)
-    return scored[:limit]
+    limit = limit or settings.SCORING_JOB_LIMIT
+    # equality to null also matches a missing field, and can use the role index
+    flagged = await threats_collection.update_many(
+        {"role_scores.security.score": None, "needs_rescore": {"$ne": True}},
+        {"$set": {"needs_rescore": True, "rescore_quiet": True}},
+    )
+    rescored = 0
+    while rescored < limit:
+        count = await rescore_pending(limit=min(settings.SCORING_JOB_BATCH, limit - rescored))
+        rescored += count
+        if not count:
+            break
+    return {"flagged": flagged.modified_count, "rescored": rescored}
@@ -1,15 +1,29 @@
 # core/settings.py
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
     # Database
     MONGO_URI: str = "mongodb://127.0.0.1:27017"
     MONGO_DB: str = "cyber_threat_platform"
+    # Connection pool / wire (per process; see core.db.client_options)
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None   # fail fast instead of queueing on a busy pool
+    MONGO_COMPRESSORS: Optional[str] = None             # e.g. "zstd,snappy,zlib" (zstd/snappy need zstandard/python-snappy)
+    MONGO_ZLIB_LEVEL: int = -1
+    # Bulk ingestion write concern (feed upserts, backfill, re-enrichment)
+    MONGO_BULK_W: str = "1"                             # "0", "1", "majority", ...
+    MONGO_BULK_JOURNAL: Optional[bool] = None
+    # Dashboard / export / training reads (scoring reads and writes stay on the primary)
+    MONGO_ANALYTICS_READ_PREFERENCE: str = "secondaryPreferred"
+    MONGO_ANALYTICS_MAX_STALENESS_S: int = -1           # -1 = no limit, else >= 90
 
     # API Keys
     OTX_API_KEY: Optional[str] = None
+    NVD_API_KEY: Optional[str] = None
     THREATFOX_API_KEY: Optional[str] = None   # ✅ now matches .env exactly
 
     # AI artifacts
@@ -23,6 +37,155 @@ class Settings(BaseSettings):
 
     # App settings
     FETCH_TIMEOUT: int = 60
+    ENSURE_INDEXES: bool = True     # false on autoscaled workers; run `python -m core.db` once instead
+    MODEL_WARMUP: bool = True       # load the AI model in the background after startup
+    WS_SEND_QUEUE_MAX: int = 1000   # per-client alert backlog before the client is dropped
+    # Per-source overrides of core.resilience.SourcePolicy, e.g.
+    # {"reddit": {"timeout": 5, "budget": 15, "retries": 1, "cooldown": 600}}
+    SOURCE_POLICIES: Dict[str, Dict[str, float]] = {}
+
+    # Near-duplicate detection (MinHash/LSH)
+    DEDUP_THRESHOLD: float = 0.7
+    DEDUP_MIN_TOKENS: int = 8
+    DEDUP_WARM_LIMIT: int = 50000
+    DEDUP_MAX_GROUPS: int = 100000  # per-worker LSH index size; oldest groups evicted beyond it
+
+    # In-memory IOC index
+    IOC_REFRESH_SECONDS: int = 60
+    IOC_REBUILD_SECONDS: int = 3600     # full rebuild: drops indicators deleted by retention
+    IOC_MATCH_MAX_VALUES: int = 50000
+
+    # Ingestion scheduler (intervals in seconds, per source in core.extractor.SOURCES)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULE_INTERVALS: Dict[str, int] = {
+        "nvd": 3600,
+        "otx": 1800,
+        "threatfox": 900,
+        "mitre": 86400,
+        "reddit": 3600,
+        "retention": 21600,
+        "snapshot": 900,
+        "rollups": 86400,                  # full recomputation; incremental refreshes follow ingestion/scoring
+        "similarity": 86400,               # full index rebuild; ingestion appends delta segments
+        "graph": 86400,                    # full rebuild; ingestion merges new edges
+        "scoring": 600,                    # score new / re-enriched threats for every role
+        "sightings": 3600,                 # roll windowed sighting counts forward
+    }
+    SCHEDULE_DEFAULT_INTERVAL: int = 3600
+    SCHEDULER_JITTER: float = 0.1          # +/- fraction of the interval
+    SCHEDULER_STARTUP_SPREAD: int = 300    # first runs are spread over this many seconds
+    SCHEDULER_LEASE_SECONDS: int = 600
+
+    # NVD backfill (NVD allows 5 requests / 30s without an API key, 50 with one)
+    NVD_BACKFILL_PAGE_SIZE: int = 2000      # NVD 2.0 maximum
+    NVD_BACKFILL_CONCURRENCY: int = 4
+    NVD_RATE_LIMIT: Optional[int] = None    # requests per window; None = NVD default for the key
+    NVD_RATE_WINDOW: int = 30
+
+    # EPSS daily scores (full gzipped CSV)
+    EPSS_CSV_URL: str = "https://epss.cyentia.com/epss_scores-current.csv.gz"
+    EPSS_REFRESH_HOURS: int = 12
+
+    # Feed transport: live | record | replay (see core.transport / core.synthetic)
+    FEED_MODE: str = "live"
+    FEED_SNAPSHOT_DIR: str = "data/snapshots/default"
+    REPLAY_LATENCY_MS: int = 0
+    REPLAY_THROUGHPUT_KBPS: int = 0         # 0 = unlimited
+
+    # Delta re-enrichment of stored CVEs (last applied snapshots live in GridFS)
+    EPSS_DELTA_THRESHOLD: float = 0.0005   # ignore EPSS moves smaller than this
+
+    # Admin endpoints / on-demand profiling
+    ADMIN_TOKEN: Optional[str] = None        # required in X-Admin-Token for /admin, X-Profile to profile a request
+    PROFILING_ENABLED: bool = False          # registers the profiling middleware at all (zero overhead when off)
+    PROFILE_SAMPLE_RATE: float = 0.0         # fraction of requests profiled without the header
+    PROFILE_JOBS: bool = False               # profile ingestion / clustering runs
+    PROFILE_INTERVAL_MS: int = 5
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_KEEP: int = 200
+
+    # Mongo command monitoring (slow-op log, N+1 detection)
+    MONGO_MONITORING: bool = True
+    SLOW_OP_MS: float = 100.0
+    SLOW_OP_BUFFER: int = 200           # slowest / recent slow ops / N+1 findings kept
+    SLOW_OP_MAX_SHAPES: int = 1000
+    N_PLUS_ONE_THRESHOLD: int = 25      # same op+shape this many times in one scope
+
+    # Web server (serve.py)
+    WEB_BIND: str = "0.0.0.0:8000"
+    WEB_WORKERS: Optional[int] = None          # default: one per CPU core
+    WEB_WORKER_CONCURRENCY: Optional[int] = None  # in-flight requests per worker before 503
+    WEB_PRELOAD: bool = True                   # load app + model once in the master, share via fork
+    WEB_BACKLOG: int = 2048
+    WEB_KEEPALIVE: int = 5
+    WEB_GRACEFUL_TIMEOUT: int = 30
+    WEB_MAX_REQUESTS: int = 0                  # recycle a worker after this many requests (0 = never)
+
+    # Data retention: archive to Parquet, then expire via TTL index on purge_at
+    # keys are "<collection>" or "<collection>:<source>"; 0 / missing = keep forever
+    RETENTION_DAYS: Dict[str, int] = {
+        "threats:OTX": 90,
+        "threats:ThreatFox": 90,
+        "threats:Reddit": 30,
+        "alerts": 180,
+    }
+    RETENTION_GRACE_HOURS: int = 24     # archived docs stay queryable in Mongo this long
+    RETENTION_BATCH: int = 5000
+    # written by whichever node runs the retention job and read by /threats/archive
+    # on every node: with more than one node this must be shared storage (NFS, a shared volume)
+    ARCHIVE_DIR: str = "data/archive"
+
+    # Columnar analytics snapshot (core/snapshot.py) read by clustering, training, dashboard;
+    # node-local: each node's scheduler refreshes its own copy under a per-host lease
+    ANALYTICS_SNAPSHOT_ENABLED: bool = True
+    ANALYTICS_SNAPSHOT_DIR: str = "data/analytics"
+    SNAPSHOT_MAX_AGE_S: int = 3600          # older than this: jobs read Mongo instead
+    SNAPSHOT_PART_ROWS: int = 50000
+    SNAPSHOT_COMPACT_PARTS: int = 24        # rebuild once this many incremental parts pile up
+    SNAPSHOT_FULL_REBUILD_HOURS: int = 24   # also picks up in-place updates and deletions
+
+    # Scheduled scoring (core/scoring.py run_scoring)
+    SCORING_JOB_LIMIT: int = 20000          # threats scored per run
+    SCORING_JOB_BATCH: int = 500
+
+    # Indicator sighting counters (core/sightings.py)
+    SIGHTINGS_ENABLED: bool = True
+    SIGHTING_DEDUP_HOURS: int = 24          # a source re-listing an indicator counts again after this
+    SIGHTING_WINDOW_DAYS: int = 7           # count_7d window; surge compares it with the one before
+
+    # Trend rollups (core/rollups.py)
+    ROLLUPS_ENABLED: bool = True
+    ROLLUP_DEBOUNCE_S: float = 5.0          # coalesce ingestion / scoring cycles into one refresh
+
+    # Incremental clustering: persisted fit, nearest-centroid assignment at ingest, drift refits
+    CLUSTER_MODEL_DIR: str = "models/clustering"   # local copy; fits are published to GridFS (cluster_models)
+    CLUSTER_MODEL_KEEP: int = 5             # artifact versions kept on disk
+    CLUSTER_ASSIGN_ON_INGEST: bool = True
+    CLUSTER_ASSIGN_BATCH: int = 2000
+    CLUSTER_DRIFT_MIN_SAMPLES: int = 500    # assignments since the fit before drift is judged
+    CLUSTER_DRIFT_OUTLIER_RATE: float = 0.15  # share beyond the fit's p95 distance (5% when stable)
+    CLUSTER_REFIT_LIMIT: int = 5000         # threats in a drift-triggered refit
+    CLUSTER_REFIT_COOLDOWN_H: int = 6
+
+    # Similar-threat search index (core/similarity.py); written under a cluster-wide lease by
+    # whichever node holds it: with more than one node this must be shared storage
+    SIMILARITY_INDEX_DIR: str = "data/similarity"
+    SIMILARITY_UPDATE_ON_INGEST: bool = True
+    SIMILARITY_FEATURES: int = 2 ** 18      # hashed term space
+    SIMILARITY_SVD_COMPONENTS: int = 64
+    SIMILARITY_FIT_SAMPLE: int = 20000      # rows used to fit SVD / IVF lists
+    SIMILARITY_EXACT_MAX_ROWS: int = 200000 # mode=auto goes approximate above this
+    SIMILARITY_NPROBE: int = 8              # IVF lists scanned per approximate query
+    SIMILARITY_RERANK: int = 10             # approximate candidates re-ranked exactly, per result
+    SIMILARITY_BLOCK_ROWS: int = 100000
+    SIMILARITY_MAX_SEGMENTS: int = 20       # delta segments before a full rebuild
+
+    # Correlation graph of CVEs, IOCs, malware and techniques (core/graph.py); written under a
+    # cluster-wide lease by whichever node holds it: with more than one node this must be shared storage
+    GRAPH_DIR: str = "data/graph"
+    GRAPH_UPDATE_ON_INGEST: bool = True
+    GRAPH_MAX_FRONTIER: int = 500           # nodes kept per hop of a pivot / k-hop query
+    GRAPH_MAX_HOPS: int = 4
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,88 @@
+# core/sightings.py
+"""
+Indicator sighting counters (indicator_sightings), one document per
+indicator:
+
+    count, first_seen, last_seen, sources     all-time totals
+    daily.<YYYY-MM-DD>                        sightings per UTC day
+    count_7d                                  sightings in the last SIGHTING_WINDOW_DAYS days
+    surge                                     count_7d minus the window before it
+
+core.db.record_sightings $inc-s all of them as feeds are ingested;
+refresh_windows rolls the windows forward as days pass. Rankings read the
+count / count_7d / surge indexes and never touch the threats collection.
+"""
+from datetime import datetime, timedelta
+from core.db import sightings_collection, sightings_read_collection
+from core.settings import settings
+
+# internal bookkeeping, not returned by queries
+HIDDEN_FIELDS = {"daily": 0, "counted": 0}
+
+
+def _day(t: datetime) -> str:
+    return t.strftime("%Y-%m-%d")
+
+
+def _window_sum(start: str, end: str | None = None) -> dict:
+    """Sum of the daily buckets in [start, end)."""
+    cond = {"$gte": ["$$this.k", start]}
+    if end is not None:
+        cond = {"$and": [cond, {"$lt": ["$$this.k", end]}]}
+    return {"$sum": {"$map": {
+        "input": {"$filter": {"input": {"$objectToArray": "$daily"}, "cond": cond}},
+        "in": "$$this.v",
+    }}}
+
+
+async def refresh_windows() -> dict:
+    """
+    Recompute count_7d / surge from the daily buckets and drop buckets
+    older than two windows, for indicators seen within that span (older
+    ones were zeroed by an earlier run).
+    """
+    now = datetime.utcnow()
+    days = settings.SIGHTING_WINDOW_DAYS
+    window_start = _day(now - timedelta(days=days - 1))
+    previous_start = _day(now - timedelta(days=2 * days - 1))
+    pipeline = [
+        {"$set": {"daily": {"$arrayToObject": {"$filter": {
+            "input": {"$objectToArray": {"$ifNull": ["$daily", {}]}},
+            "cond": {"$gte": ["$$this.k", previous_start]},
+        }}}}},
+        {"$set": {"count_7d": _window_sum(window_start), "_previous": _window_sum(previous_start, window_start)}},
+        {"$set": {"surge": {"$subtract": ["$count_7d", "$_previous"]}}},
+        {"$unset": "_previous"},
+    ]
+    result = await sightings_collection.update_many(
+        {"last_seen": {"$gte": now - timedelta(days=2 * days + 1)}}, pipeline
+    )
+    return {"refreshed": result.modified_count}
+
+
+async def run_sightings() -> dict:
+    """Scheduled job: roll the windowed counters forward."""
+    return await refresh_windows()
+
+
+# ========================
+# Queries
+# ========================
+async def get_top_sighted_iocs(limit: int = 10, window: str = "all") -> list[dict]:
+    """Most-sighted indicators, all time or within the window ("7d")."""
+    field = "count_7d" if window == "7d" else "count"
+    query = {field: {"$gt": 0}}
+    cursor = sightings_read_collection.find(query, HIDDEN_FIELDS).sort(field, -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+async def get_surging_iocs(limit: int = 10, new_within_days: int | None = None) -> list[dict]:
+    """
+    Indicators sighted more in the current window than in the one before,
+    largest increase first; optionally only those first seen recently.
+    """
+    query = {"surge": {"$gt": 0}}
+    if new_within_days:
+        query["first_seen"] = {"$gte": datetime.utcnow() - timedelta(days=new_within_days)}
+    cursor = sightings_read_collection.find(query, HIDDEN_FIELDS).sort("surge", -1).limit(limit)
+    return await cursor.to_list(length=limit)
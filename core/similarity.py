@@ -0,0 +1,383 @@
+# core/similarity.py
+"""
+Persisted vector index for "threats like this one".
+
+    data/similarity/manifest.json         current version, segments, watermark
+    data/similarity/<version>/idf.npy     frozen IDF of the hashed term space
+    data/similarity/<version>/projection.npy, centroids.npy   SVD + IVF lists
+    data/similarity/<version>/seg-NNN/    ids, CSR TF-IDF rows, SVD rows
+
+Descriptions are hashed (no vocabulary to refit), weighted with the IDF
+frozen at build time and L2-normalized, so a dot product is the cosine
+similarity. Everything is saved as .npy and memory-mapped: workers share
+the pages instead of each loading a copy.
+
+- exact: sparse matrix-vector products over row blocks of each segment
+- approx: SVD-reduced rows grouped into IVF lists; only the SIMILARITY_NPROBE
+  lists nearest to the query are scanned, then candidates are re-ranked
+  with the exact sparse scores
+
+Ingestion appends delta segments (threats fetched since the watermark);
+a full rebuild compacts them and refreshes the IDF / SVD / lists.
+
+Builds and updates run under cluster-wide leases (ingest:similarity) on
+whichever node holds them, so every node serving /similar must see the same
+SIMILARITY_INDEX_DIR: one node, or shared storage with more than one.
+"""
+import asyncio
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+from bson import ObjectId
+from core.db import CANONICAL_FILTER, HEAVY_FIELDS, threats_collection, threats_read_collection
+from core.settings import settings
+from core.snapshot import read_state as read_snapshot_state, snapshot_frame, snapshot_usable
+
+_build_lock = asyncio.Lock()
+# (manifest mtime, SimilarityIndex) of the last loaded index
+_index_cache: dict = {}
+
+
+def _manifest_path() -> str:
+    return os.path.join(settings.SIMILARITY_INDEX_DIR, "manifest.json")
+
+
+def read_manifest() -> dict | None:
+    try:
+        with open(_manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(manifest: dict):
+    tmp = f"{_manifest_path()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, _manifest_path())
+
+
+# ========================
+# Text -> vectors
+# ========================
+def _tf(texts: list[str], n_features: int):
+    """Sublinear term frequencies in the hashed term space."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    hasher = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None,
+                               stop_words="english", dtype=np.float32)
+    counts = hasher.transform(texts)
+    np.log1p(counts.data, out=counts.data)
+    return counts
+
+
+def _weight(counts, idf):
+    """TF-IDF rows, L2-normalized (dot product = cosine)."""
+    from sklearn.preprocessing import normalize
+    counts.data *= idf[counts.indices]
+    return normalize(counts, copy=False)
+
+
+def _project(X, projection):
+    from sklearn.preprocessing import normalize
+    return normalize(np.asarray(X @ projection, dtype=np.float32), copy=False)
+
+
+def _topk(scores, k: int):
+    """Indices of the k largest scores, best first."""
+    if len(scores) > k:
+        idx = np.argpartition(-scores, k)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+# ========================
+# Segments
+# ========================
+def _write_segment(path: str, ids: list[str], X, D, centroids=None):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "ids.npy"), np.array([i.encode() for i in ids]))
+    np.save(os.path.join(path, "data.npy"), X.data.astype(np.float32))
+    np.save(os.path.join(path, "indices.npy"), X.indices.astype(np.int32))
+    np.save(os.path.join(path, "indptr.npy"), X.indptr.astype(np.int64))
+    np.save(os.path.join(path, "dense.npy"), D)
+    if centroids is not None:
+        lists = np.concatenate([
+            np.argmax(D[i:i + 65536] @ centroids.T, axis=1) for i in range(0, len(D), 65536)
+        ]) if len(D) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(lists, kind="stable")
+        np.save(os.path.join(path, "order.npy"), order.astype(np.int64))
+        np.save(os.path.join(path, "offsets.npy"), np.searchsorted(lists[order], np.arange(len(centroids) + 1)))
+
+
+class Segment:
+    """One immutable block of indexed rows, memory-mapped."""
+
+    def __init__(self, path: str, n_features: int):
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.ids = load("ids.npy")
+        self.data, self.indices, self.indptr = load("data.npy"), load("indices.npy"), load("indptr.npy")
+        self.dense = load("dense.npy")
+        self.n_features = n_features
+        has_lists = os.path.exists(os.path.join(path, "order.npy"))
+        self.order = load("order.npy") if has_lists else None
+        self.offsets = load("offsets.npy") if has_lists else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, start: int, end: int):
+        """CSR view of rows [start, end) over the mapped arrays (only indptr is copied)."""
+        from scipy.sparse import csr_matrix
+        lo, hi = self.indptr[start], self.indptr[end]
+        return csr_matrix((self.data[lo:hi], self.indices[lo:hi], np.asarray(self.indptr[start:end + 1]) - lo),
+                          shape=(end - start, self.n_features), copy=False)
+
+    def dot(self, row: int, q) -> float:
+        lo, hi = self.indptr[row], self.indptr[row + 1]
+        return float(self.data[lo:hi] @ q[self.indices[lo:hi]])
+
+    def exact(self, q, k: int):
+        """Top-k rows by sparse dot product, one row block at a time."""
+        best_rows, best_scores = [], []
+        for start in range(0, len(self), settings.SIMILARITY_BLOCK_ROWS):
+            end = min(start + settings.SIMILARITY_BLOCK_ROWS, len(self))
+            scores = self.rows(start, end) @ q
+            top = _topk(scores, k)
+            best_rows.append(top + start)
+            best_scores.append(scores[top])
+        if not best_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows, scores = np.concatenate(best_rows), np.concatenate(best_scores)
+        top = _topk(scores, k)
+        return rows[top], scores[top]
+
+    def approx(self, q, qd, centroids, k: int):
+        """Scan the nearest IVF lists on SVD rows, re-rank the candidates exactly."""
+        if self.order is None:
+            return self.exact(q, k)
+        lists = _topk(centroids @ qd, settings.SIMILARITY_NPROBE)
+        candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+        if not len(candidates):
+            return candidates, np.zeros(0, dtype=np.float32)
+        shortlist = candidates[_topk(self.dense[candidates] @ qd, k * settings.SIMILARITY_RERANK)]
+        scores = np.array([self.dot(r, q) for r in shortlist], dtype=np.float32)
+        top = _topk(scores, k)
+        return shortlist[top], scores[top]
+
+
+class SimilarityIndex:
+    def __init__(self, manifest: dict):
+        base = os.path.join(settings.SIMILARITY_INDEX_DIR, manifest["version"])
+        self.manifest = manifest
+        self.n_features = manifest["n_features"]
+        self.idf = np.load(os.path.join(base, "idf.npy"), mmap_mode="r")
+        self.projection = np.load(os.path.join(base, "projection.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(base, "centroids.npy"))
+        self.segments = [Segment(os.path.join(base, s), self.n_features) for s in manifest["segments"]]
+
+    @property
+    def rows(self) -> int:
+        return sum(len(s) for s in self.segments)
+
+    def encode(self, text: str):
+        X = _weight(_tf([text], self.n_features), self.idf)
+        q = np.zeros(self.n_features, dtype=np.float32)
+        q[X.indices] = X.data
+        return q, _project(X, self.projection)[0]
+
+    def search(self, text: str, k: int = 10, mode: str = "auto", exclude: set[str] = frozenset()) -> list[tuple[str, float]]:
+        """(id, cosine) of the k most similar threats, best first."""
+        if mode == "auto":
+            mode = "approx" if self.rows > settings.SIMILARITY_EXACT_MAX_ROWS else "exact"
+        q, qd = self.encode(text)
+        if not q.any():
+            return []
+        # rows of a re-ingested threat can sit in several segments: keep its best
+        want = k + len(exclude)
+        found: dict[str, float] = {}
+        for segment in self.segments:
+            rows, scores = segment.approx(q, qd, self.centroids, want) if mode == "approx" else segment.exact(q, want)
+            for row, score in zip(rows, scores):
+                _id = segment.ids[row].decode()
+                if _id not in exclude and score > found.get(_id, 0.0):
+                    found[_id] = float(score)
+        return sorted(found.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def get_index() -> SimilarityIndex | None:
+    """The current index, reloaded when the manifest changes; None if never built."""
+    try:
+        mtime = os.stat(_manifest_path()).st_mtime
+    except OSError:
+        return None
+    if _index_cache.get("mtime") != mtime:
+        manifest = read_manifest()
+        if manifest is None:
+            return None
+        _index_cache.clear()
+        _index_cache.update(mtime=mtime, index=SimilarityIndex(manifest))
+    return _index_cache["index"]
+
+
+# ========================
+# Build / update
+# ========================
+def _build(ids: list[str], texts: list[str], base: str) -> dict:
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.preprocessing import normalize
+
+    n_features = settings.SIMILARITY_FEATURES
+    counts = _tf(texts, n_features)
+    n = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=n_features)
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    X = _weight(counts, idf)
+
+    rng = np.random.default_rng(42)
+    sample = rng.choice(n, size=min(n, settings.SIMILARITY_FIT_SAMPLE), replace=False)
+    components = max(1, min(settings.SIMILARITY_SVD_COMPONENTS, len(sample) - 1))
+    svd = TruncatedSVD(n_components=components, random_state=42).fit(X[sample])
+    projection = svd.components_.T.astype(np.float32)
+    D = _project(X, projection)
+
+    # IVF lists: about sqrt(n) lists of about sqrt(n) rows each
+    nlist = int(min(max(np.sqrt(n), 1), 4096, len(sample)))
+    kmeans = MiniBatchKMeans(n_clusters=nlist, random_state=42, batch_size=4096, n_init=3).fit(D[sample])
+    centroids = normalize(kmeans.cluster_centers_.astype(np.float32))
+
+    os.makedirs(base, exist_ok=True)
+    np.save(os.path.join(base, "idf.npy"), idf)
+    np.save(os.path.join(base, "projection.npy"), projection)
+    np.save(os.path.join(base, "centroids.npy"), centroids)
+    _write_segment(os.path.join(base, "seg-000"), ids, X, D, centroids)
+    return {"n_features": n_features, "components": components, "nlist": nlist}
+
+
+def _build_delta(index: SimilarityIndex, ids: list[str], texts: list[str], path: str):
+    X = _weight(_tf(texts, index.n_features), index.idf)
+    _write_segment(path, ids, X, _project(X, index.projection))
+
+
+def _drop_old_versions(keep: set[str]):
+    # the version just replaced stays until the next rebuild: workers that
+    # read the previous manifest may still be mapping its segments
+    base = settings.SIMILARITY_INDEX_DIR
+    for name in os.listdir(base):
+        path = os.path.join(base, name)
+        if name not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+async def _load_corpus(query: dict, collection) -> tuple[list[str], list[str]]:
+    ids, texts = [], []
+    async for doc in collection.find(query, {"description": 1, "title": 1}):
+        text = doc.get("description") or doc.get("title") or ""
+        if text:
+            ids.append(str(doc["_id"]))
+            texts.append(str(text))
+    return ids, texts
+
+
+async def build_index() -> dict:
+    """Full rebuild: new IDF, SVD and IVF lists over every canonical threat."""
+    async with _build_lock:
+        started = datetime.utcnow()
+        df = None
+        if snapshot_usable():
+            # columnar snapshot: the build does not touch MongoDB
+            df = await asyncio.to_thread(snapshot_frame, ["_id", "description", "title"], True)
+        if df is not None:
+            text = df["description"].fillna(df["title"]).fillna("").astype(str)
+            df = df[text != ""]
+            ids, texts = df["_id"].astype(str).tolist(), text[text != ""].tolist()
+            # next delta starts where the snapshot ends
+            watermark = read_snapshot_state()["watermark"]
+            started = datetime.fromisoformat(watermark) if watermark else started
+        else:
+            ids, texts = await _load_corpus(CANONICAL_FILTER, threats_read_collection)
+        if not ids:
+            return {"mode": "full", "rows": 0}
+
+        version = started.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+        os.makedirs(settings.SIMILARITY_INDEX_DIR, exist_ok=True)
+        params = await asyncio.to_thread(_build, ids, texts, os.path.join(settings.SIMILARITY_INDEX_DIR, version))
+        replaced = read_manifest()
+        _write_manifest({
+            "version": version,
+            **params,
+            "segments": ["seg-000"],
+            "rows": len(ids),
+            "watermark": started.isoformat(),
+            "built_at": datetime.utcnow().isoformat(),
+            "full_at": datetime.utcnow().isoformat(),
+        })
+        _drop_old_versions({version, replaced["version"] if replaced else None})
+        return {"mode": "full", "rows": len(ids), **params}
+
+
+async def update_index() -> dict:
+    """
+    After ingestion: index threats fetched since the watermark as a new delta
+    segment. Builds from scratch when there is no index yet or too many deltas.
+    """
+    manifest = read_manifest()
+    if manifest is None or len(manifest["segments"]) > settings.SIMILARITY_MAX_SEGMENTS:
+        return await build_index()
+    async with _build_lock:
+        index = get_index()
+        started = datetime.utcnow()
+        query = {**CANONICAL_FILTER, "fetched_at": {"$gte": datetime.fromisoformat(manifest["watermark"])}}
+        ids, texts = await _load_corpus(query, threats_collection)
+        if ids:
+            segment = f"seg-{len(manifest['segments']):03d}"
+            path = os.path.join(settings.SIMILARITY_INDEX_DIR, manifest["version"], segment)
+            await asyncio.to_thread(_build_delta, index, ids, texts, path)
+            manifest["segments"].append(segment)
+            manifest["rows"] += len(ids)
+        manifest["watermark"] = started.isoformat()
+        manifest["built_at"] = datetime.utcnow().isoformat()
+        _write_manifest(manifest)
+        return {"mode": "delta", "rows": len(ids), "segments": len(manifest["segments"])}
+
+
+async def run_similarity() -> dict:
+    """Scheduled job: full rebuild (compacts the delta segments)."""
+    return await build_index()
+
+
+# ========================
+# Queries
+# ========================
+async def similar_to_text(text: str, k: int = 10, mode: str = "auto", exclude: set[str] = frozenset()) -> list[tuple[str, float]]:
+    index = await asyncio.to_thread(get_index)
+    if index is None:
+        raise LookupError("Similarity index not built yet (POST /admin/similarity/run)")
+    return await asyncio.to_thread(index.search, text, k, mode, exclude)
+
+
+async def find_threat(ref: str) -> dict | None:
+    """A threat by ObjectId, CVE id or indicator."""
+    keys = [{"cve_id": ref}, {"indicator": ref}]
+    if ObjectId.is_valid(ref):
+        keys.insert(0, {"_id": ObjectId(ref)})
+    return await threats_read_collection.find_one({"$or": keys}, HEAVY_FIELDS)
+
+
+async def similar_threats(text: str, k: int = 10, mode: str = "auto", exclude: set[str] = frozenset()) -> list[dict]:
+    """The most similar threats as documents, each with its cosine `similarity`."""
+    hits = await similar_to_text(text, k, mode, exclude)
+    keys = [ObjectId(i) if ObjectId.is_valid(i) else i for i, _ in hits]
+    cursor = threats_read_collection.find({"_id": {"$in": keys}}, HEAVY_FIELDS)
+    docs = {str(d["_id"]): d async for d in cursor}
+    # threats deleted since the index was built are dropped
+    return [{**docs[i], "similarity": round(score, 4)} for i, score in hits if i in docs]
+
+
+def index_status() -> dict:
+    manifest = read_manifest()
+    index = get_index() if manifest else None
+    return {**(manifest or {}), "indexed_rows": index.rows if index else 0}
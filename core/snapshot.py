@@ -0,0 +1,250 @@
+# core/snapshot.py
+"""
+Columnar snapshot of the threats collection for analytics.
+
+Clustering, model training and reporting read the projected threat fields
+from Parquet files instead of pulling full BSON documents through Motor:
+
+    data/analytics/_state.json          which parts make up the snapshot
+    data/analytics/gen-<ts>/part-*.parquet
+
+Refreshes are incremental: only documents with fetched_at at or after the
+last watermark are read (from the analytics read preference) and appended
+as a new part. Rows are de-duplicated by _id on load, newest fetched_at
+wins. In-place updates that do not touch fetched_at (scores, clusters) and
+TTL deletions are picked up by the periodic full rebuild, which also
+compacts the parts into a new generation directory.
+
+    python -m core.snapshot           # incremental refresh
+    python -m core.snapshot --full    # rebuild from scratch
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from core.columnar import to_arrow_table, write_parquet
+from core.db import threats_read_collection
+from core.settings import settings
+
+SNAPSHOT_COLUMNS = {
+    "_id": "string", "cve_id": "string", "indicator": "string", "type": "string",
+    "source": "string", "title": "string", "description": "string",
+    "cvss_score": "float", "epss_score": "float", "percentile": "float",
+    "kev_exploited": "bool", "severity": "string", "priority": "string", "score": "float",
+    "cluster": "int", "dedup_group": "string", "duplicate_of": "string",
+    "published": "timestamp", "fetched_at": "timestamp",
+}
+
+_refresh_lock = asyncio.Lock()
+# loaded tables of the current snapshot, keyed by (built_at, columns, canonical_only)
+_cache: dict = {}
+
+
+# ========================
+# State
+# ========================
+def _state_path() -> str:
+    return os.path.join(settings.ANALYTICS_SNAPSHOT_DIR, "_state.json")
+
+
+def read_state() -> dict | None:
+    try:
+        with open(_state_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(state: dict):
+    path = _state_path()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def snapshot_age(state: dict | None = None) -> float | None:
+    """Seconds since the last refresh, None if there is no snapshot."""
+    state = state or read_state()
+    if not state:
+        return None
+    return (datetime.utcnow() - datetime.fromisoformat(state["built_at"])).total_seconds()
+
+
+def snapshot_usable() -> bool:
+    """Whether analytics jobs should read the snapshot rather than Mongo."""
+    if not settings.ANALYTICS_SNAPSHOT_ENABLED:
+        return False
+    age = snapshot_age()
+    return age is not None and age <= settings.SNAPSHOT_MAX_AGE_S
+
+
+# ========================
+# Refresh
+# ========================
+async def _export(query: dict, generation_dir: str) -> tuple[list[str], int, datetime | None]:
+    """Stream matching docs into parts of SNAPSHOT_PART_ROWS rows."""
+    projection = {field: 1 for field in SNAPSHOT_COLUMNS}
+    cursor = threats_read_collection.find(query, projection).sort("fetched_at", 1)
+    cursor.batch_size(min(settings.SNAPSHOT_PART_ROWS, 10000))
+    parts, rows, watermark, chunk = [], 0, None, []
+
+    async def flush():
+        nonlocal rows
+        name = f"part-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.parquet"
+        table = await asyncio.to_thread(to_arrow_table, chunk, SNAPSHOT_COLUMNS)
+        await asyncio.to_thread(write_parquet, table, os.path.join(generation_dir, name))
+        parts.append(name)
+        rows += len(chunk)
+
+    async for doc in cursor:
+        chunk.append(doc)
+        if isinstance(doc.get("fetched_at"), datetime):
+            watermark = doc["fetched_at"]
+        if len(chunk) >= settings.SNAPSHOT_PART_ROWS:
+            await flush()
+            chunk = []
+    if chunk:
+        await flush()
+    return parts, rows, watermark
+
+
+def _drop_old_generations(keep: set[str]):
+    """
+    Remove generations other than `keep`. The generation just replaced is
+    kept until the next full rebuild: workers that read the previous
+    _state.json may still be loading its parts.
+    """
+    base = settings.ANALYTICS_SNAPSHOT_DIR
+    for name in os.listdir(base):
+        if name.startswith("gen-") and name not in keep:
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+
+
+async def refresh_snapshot(full: bool = False) -> dict:
+    """
+    Bring the snapshot up to date. Falls back to a full rebuild when there is
+    no snapshot, it has too many parts, or the last full build is older than
+    SNAPSHOT_FULL_REBUILD_HOURS.
+    """
+    async with _refresh_lock:
+        os.makedirs(settings.ANALYTICS_SNAPSHOT_DIR, exist_ok=True)
+        state = read_state()
+        now = datetime.utcnow()
+        if (state is None or len(state["parts"]) >= settings.SNAPSHOT_COMPACT_PARTS
+                or now - datetime.fromisoformat(state["full_at"]) > timedelta(hours=settings.SNAPSHOT_FULL_REBUILD_HOURS)):
+            full = True
+
+        previous = state["generation"] if state else None
+        if full:
+            generation = f"gen-{now.strftime('%Y%m%dT%H%M%S')}"
+            parts, rows, watermark = await _export({}, os.path.join(settings.ANALYTICS_SNAPSHOT_DIR, generation))
+            state = {
+                "generation": generation,
+                "parts": parts,
+                "rows": rows,
+                "watermark": watermark.isoformat() if watermark else None,
+                "full_at": now.isoformat(),
+            }
+        else:
+            # $gte: docs sharing the watermark's millisecond may have arrived later
+            query = {"fetched_at": {"$gte": datetime.fromisoformat(state["watermark"])}} if state["watermark"] else {}
+            parts, rows, watermark = await _export(query, os.path.join(settings.ANALYTICS_SNAPSHOT_DIR, state["generation"]))
+            state["parts"] += parts
+            state["rows"] += rows
+            if watermark:
+                state["watermark"] = watermark.isoformat()
+
+        state["built_at"] = datetime.utcnow().isoformat()
+        _write_state(state)
+        if full:
+            _drop_old_generations({state["generation"], previous})
+        return {"mode": "full" if full else "incremental", "rows": rows, "parts": len(state["parts"])}
+
+
+async def run_snapshot() -> dict:
+    """Scheduled job: incremental refresh (with periodic full rebuilds)."""
+    return await refresh_snapshot()
+
+
+# ========================
+# Loading
+# ========================
+def load_snapshot(columns: list[str] | None = None, canonical_only: bool = False):
+    """
+    The snapshot as one pyarrow Table (None if there is none), one row per
+    threat, newest first. Only the requested columns are read from disk;
+    the result is cached per process until the next refresh. Also None when
+    the parts cannot be read (e.g. removed by a rebuild on another worker),
+    so callers fall back to MongoDB.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    state = read_state()
+    if not state or not state["parts"]:
+        return None
+
+    wanted = list(columns or SNAPSHOT_COLUMNS)
+    read = list(dict.fromkeys(wanted + ["_id", "fetched_at"] + (["duplicate_of"] if canonical_only else [])))
+    key = (state["built_at"], tuple(read), canonical_only)
+    if key not in _cache:
+        base = os.path.join(settings.ANALYTICS_SNAPSHOT_DIR, state["generation"])
+        try:
+            table = pa.concat_tables([pq.read_table(os.path.join(base, part), columns=read) for part in state["parts"]])
+        except OSError as e:
+            print(f"⚠️ Analytics snapshot unreadable, falling back to MongoDB: {e}")
+            return None
+        table = table.sort_by([("fetched_at", "descending")])
+        if len(state["parts"]) > 1:
+            # newest copy of each _id wins
+            _, first = np.unique(table["_id"].to_numpy(zero_copy_only=False), return_index=True)
+            table = table.take(np.sort(first))
+        if canonical_only:
+            table = table.filter(pc.is_null(table["duplicate_of"]))
+        # entries for older refreshes are dead weight
+        for stale in [k for k in _cache if k[0] != state["built_at"]]:
+            del _cache[stale]
+        _cache[key] = table.select(wanted).combine_chunks()
+    return _cache[key]
+
+
+def snapshot_frame(columns: list[str] | None = None, canonical_only: bool = False, limit: int | None = None):
+    """
+    Snapshot as a pandas DataFrame (None if there is none). Each column
+    becomes its own block, so null-free numeric columns are handed over
+    without copying.
+    """
+    table = load_snapshot(columns, canonical_only)
+    if table is None:
+        return None
+    if limit is not None:
+        table = table.slice(0, limit)
+    return table.to_pandas(split_blocks=True)
+
+
+def numeric_column(table, name: str, fill: float = 0.0):
+    """A numeric column as a NumPy array; zero-copy once nulls are filled."""
+    import pyarrow.compute as pc
+    column = pc.fill_null(table[name], fill).combine_chunks()
+    return column.to_numpy(zero_copy_only=False)
+
+
+def snapshot_status() -> dict:
+    state = read_state()
+    return {
+        "enabled": settings.ANALYTICS_SNAPSHOT_ENABLED,
+        "usable": snapshot_usable(),
+        "age_s": round(snapshot_age(state), 1) if state else None,
+        **(state or {}),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the columnar analytics snapshot")
+    parser.add_argument("--full", action="store_true", help="rebuild instead of appending new documents")
+    print(asyncio.run(refresh_snapshot(full=parser.parse_args().full)))
@@ -0,0 +1,54 @@
+# core/startup.py
+import os
+import time
+from contextlib import contextmanager
+
+# perf_counter at interpreter start is unknown; module import is close enough
+# because app.py imports this first
+_PROCESS_T0 = time.perf_counter()
+
+
+class StartupReport:
+    """Wall time of each import / init phase of a worker, in order."""
+
+    def __init__(self):
+        self.phases: list[dict] = []
+        self.started_at = _PROCESS_T0
+        self.ready_at: float | None = None
+
+    def forked(self):
+        """In a preforked worker: phases so far ran once in the master; time readiness from here."""
+        self.phases.append({"phase": f"forked from master (pid {os.getppid()})", "ms": 0.0})
+        self.started_at = time.perf_counter()
+
+    def record(self, name: str, seconds: float):
+        self.phases.append({"phase": name, "ms": round(seconds * 1000, 2)})
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def ready(self):
+        self.ready_at = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "ready_ms": round((self.ready_at - self.started_at) * 1000, 2) if self.ready_at else None,
+            "phases": list(self.phases),
+        }
+
+    def print(self):
+        print(f"⏱️ Startup report (pid {os.getpid()}):")
+        for p in self.phases:
+            print(f"   {p['ms']:9.2f} ms  {p['phase']}")
+        if self.ready_at:
+            print(f"   {(self.ready_at - self.started_at) * 1000:9.2f} ms  total until ready")
+
+
+# single shared report for this process
+startup_report = StartupReport()
@@ -0,0 +1,187 @@
+# core/synthetic.py
+import argparse
+import gzip
+import io
+import json
+import random
+from datetime import datetime, timedelta
+import httpx
+from core.extractor import NVD_API_URL, KEV_URL, OTX_URL, THREATFOX_URL, MITRE_URL, REDDIT_URL
+from core.settings import settings
+from core.transport import write_snapshot
+
+# ========================
+# Vocabulary for realistic-looking text
+# ========================
+VENDORS = ["Apache", "Microsoft", "Cisco", "Fortinet", "VMware", "Atlassian", "Ivanti", "Citrix",
+           "Oracle", "SAP", "WordPress", "Jenkins", "GitLab", "Zyxel", "F5", "Palo Alto Networks"]
+PRODUCTS = ["Struts", "Exchange Server", "IOS XE", "FortiOS", "vCenter Server", "Confluence",
+            "Connect Secure", "NetScaler ADC", "WebLogic", "NetWeaver", "plugin", "controller",
+            "Runner", "firewall", "BIG-IP", "PAN-OS"]
+FLAWS = ["remote code execution", "SQL injection", "cross-site scripting", "path traversal",
+         "authentication bypass", "privilege escalation", "deserialization of untrusted data",
+         "server-side request forgery", "buffer overflow", "use-after-free", "command injection"]
+VECTORS = ["via a crafted HTTP request", "via a malicious file upload", "through the management interface",
+           "via specially crafted packets", "by sending a crafted serialized object",
+           "through an unauthenticated API endpoint", "via a malicious link"]
+IMPACTS = ["execute arbitrary code", "read sensitive files", "gain administrative privileges",
+           "cause a denial of service", "bypass authentication", "exfiltrate credentials",
+           "deploy ransomware", "install malware"]
+MALWARE = ["Emotet", "QakBot", "Cobalt Strike", "AsyncRAT", "RedLine Stealer", "LockBit", "IcedID",
+           "AgentTesla", "Mirai", "Remcos", "SocGholish", "DarkGate"]
+TLDS = ["com", "net", "org", "ru", "top", "xyz", "info", "cn", "io"]
+
+
+def _description(rng: random.Random, long: bool = False) -> str:
+    text = (f"A {rng.choice(FLAWS)} vulnerability in {rng.choice(VENDORS)} {rng.choice(PRODUCTS)} "
+            f"allows remote attackers to {rng.choice(IMPACTS)} {rng.choice(VECTORS)}.")
+    if long:
+        text += (f" Exploitation has been observed in the wild and is associated with {rng.choice(MALWARE)} "
+                 f"activity. Affected versions before {rng.randint(1, 20)}.{rng.randint(0, 9)}.{rng.randint(0, 30)} "
+                 f"should be upgraded; as a workaround, restrict access {rng.choice(VECTORS)}.")
+    return text
+
+
+# ========================
+# Record generators (shapes match the upstream APIs)
+# ========================
+def synthetic_cve_id(i: int) -> str:
+    year = 2002 + (i % 24)
+    return f"CVE-{year}-{1000 + i // 24:05d}"
+
+
+def nvd_vulnerability(rng: random.Random, i: int, base_time: datetime) -> dict:
+    cvss = round(min(10.0, max(0.0, rng.gauss(6.5, 2.0))), 1)
+    published = base_time - timedelta(minutes=i)
+    item = {
+        "id": synthetic_cve_id(i),
+        "published": published.strftime("%Y-%m-%dT%H:%M:%S.000"),
+        "descriptions": [{"lang": "en", "value": _description(rng, long=rng.random() < 0.3)}],
+        "metrics": {},
+    }
+    if rng.random() < 0.85:
+        item["metrics"]["cvssMetricV31"] = [{"cvssData": {"baseScore": cvss}}]
+    return {"cve": item}
+
+
+def epss_row(rng: random.Random, i: int) -> tuple[str, float, float]:
+    # EPSS is heavily skewed: most CVEs are near zero, a few are very likely exploited
+    score = min(1.0, rng.paretovariate(3.0) / 100.0 - 0.0099) if rng.random() > 0.02 else rng.uniform(0.5, 0.97)
+    score = max(score, 0.00001)
+    return synthetic_cve_id(i), round(score, 5), round(min(1.0, score * 4 + rng.random() * 0.1), 5)
+
+
+def ioc_value(rng: random.Random, i: int) -> tuple[str, str]:
+    kind = i % 5
+    if kind == 0:
+        return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}", "IPv4"
+    if kind == 1:
+        return f"host{i}.{rng.choice(['cdn', 'mail', 'update', 'login'])}-{i % 997}.{rng.choice(TLDS)}", "domain"
+    if kind == 2:
+        return f"http://dl{i}.{rng.choice(TLDS)}/{rng.getrandbits(32):08x}/payload.bin", "URL"
+    if kind == 3:
+        return f"{rng.getrandbits(128):032x}", "FileHash-MD5"
+    return f"{rng.getrandbits(256):064x}", "FileHash-SHA256"
+
+
+def threatfox_ioc(rng: random.Random, i: int) -> dict:
+    value, kind = ioc_value(rng, i)
+    ioc_type = {"IPv4": "ip:port", "domain": "domain", "URL": "url",
+                "FileHash-MD5": "md5_hash", "FileHash-SHA256": "sha256_hash"}[kind]
+    if ioc_type == "ip:port":
+        value = f"{value}:{rng.choice([443, 8080, 4444, 80])}"
+    return {"ioc": value, "ioc_type": ioc_type, "malware": rng.choice(MALWARE),
+            "confidence_level": rng.choice([50, 75, 90, 100])}
+
+
+def mitre_technique(rng: random.Random, i: int) -> dict:
+    return {
+        "type": "attack-pattern",
+        "name": f"{rng.choice(['Exploit', 'Abuse', 'Hijack', 'Modify', 'Steal'])} {rng.choice(PRODUCTS)} {i}",
+        "description": _description(rng, long=True),
+        "external_references": [{"source_name": "mitre-attack", "external_id": f"T{1000 + i}"}],
+    }
+
+
+# ========================
+# Snapshot writer
+# ========================
+def _dump(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def generate_snapshot(out_dir: str, cves: int = 1000, iocs: int = 1000, techniques: int = 200,
+                      kev_fraction: float = 0.05, seed: int = 42, page_size: int | None = None,
+                      latest_page: int = 100) -> dict:
+    """
+    Write a replayable snapshot with synthetic NVD, EPSS, KEV, OTX, ThreatFox,
+    MITRE and Reddit responses at the requested scale. Responses are keyed
+    exactly like the requests the extractor and NVD backfill make.
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2026, 1, 1)
+    page_size = page_size or settings.NVD_BACKFILL_PAGE_SIZE
+    json_headers = {"content-type": "application/json"}
+
+    # NVD: the "latest" page used by fetch_nvd_data plus every backfill page
+    def nvd_page(start: int, size: int) -> bytes:
+        vulns = [nvd_vulnerability(random.Random(seed + i), i, base_time) for i in range(start, min(start + size, cves))]
+        return _dump({"resultsPerPage": size, "startIndex": start, "totalResults": cves, "vulnerabilities": vulns})
+
+    write_snapshot(out_dir, "GET", f"{NVD_API_URL}?resultsPerPage={latest_page}", 200, json_headers,
+                   nvd_page(0, latest_page))
+    for start in range(0, max(cves, 1), page_size):
+        url = str(httpx.URL(NVD_API_URL, params={"startIndex": start, "resultsPerPage": page_size}))
+        write_snapshot(out_dir, "GET", url, 200, json_headers, nvd_page(start, page_size))
+
+    # EPSS: gzipped CSV, like the real daily file
+    csv = io.BytesIO()
+    with gzip.GzipFile(fileobj=csv, mode="wb") as gz:
+        gz.write(b"#model_version:synthetic,score_date:2026-01-01T00:00:00+0000\ncve,epss,percentile\n")
+        for i in range(cves):
+            cve_id, score, pct = epss_row(rng, i)
+            gz.write(f"{cve_id},{score},{pct}\n".encode())
+    write_snapshot(out_dir, "GET", settings.EPSS_CSV_URL, 200, {"content-type": "application/gzip"}, csv.getvalue())
+
+    # KEV
+    kev = [{"cveID": synthetic_cve_id(i), "vendorProject": rng.choice(VENDORS),
+            "product": rng.choice(PRODUCTS), "dateAdded": "2026-01-01",
+            "shortDescription": _description(rng), "knownRansomwareCampaignUse": rng.choice(["Known", "Unknown"])}
+           for i in range(cves) if rng.random() < kev_fraction]
+    write_snapshot(out_dir, "GET", KEV_URL, 200, json_headers, _dump({"vulnerabilities": kev}))
+
+    # OTX: indicators spread over the 10 subscribed pulses fetch_otx asks for
+    half = iocs // 2
+    pulses = [{"name": f"{rng.choice(MALWARE)} campaign {p}", "indicators": []} for p in range(10)]
+    for i in range(half):
+        value, kind = ioc_value(rng, i)
+        pulses[i % 10]["indicators"].append({"indicator": value, "type": kind})
+    write_snapshot(out_dir, "GET", f"{OTX_URL}?limit=10", 200, json_headers, _dump({"results": pulses}))
+
+    # ThreatFox (POST body must match fetch_threatfox's payload)
+    data = [threatfox_ioc(rng, i) for i in range(half, iocs)]
+    write_snapshot(out_dir, "POST", THREATFOX_URL, 200, json_headers,
+                   _dump({"query_status": "ok", "data": data}),
+                   content=_dump({"query": "get_iocs", "limit": 50}))
+
+    # MITRE ATT&CK bundle
+    objects = [mitre_technique(rng, i) for i in range(techniques)]
+    write_snapshot(out_dir, "GET", MITRE_URL, 200, json_headers, _dump({"type": "bundle", "objects": objects}))
+
+    # Reddit
+    children = [{"data": {"title": _description(rng), "url": f"https://example.com/post/{i}", "score": rng.randint(1, 900)}}
+                for i in range(10)]
+    write_snapshot(out_dir, "GET", REDDIT_URL, 200, json_headers, _dump({"data": {"children": children}}))
+
+    return {"cves": cves, "kev": len(kev), "iocs": iocs, "techniques": techniques, "out_dir": out_dir}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic feed snapshot for FEED_MODE=replay")
+    parser.add_argument("--out", default=settings.FEED_SNAPSHOT_DIR)
+    parser.add_argument("--cves", type=int, default=1000)
+    parser.add_argument("--iocs", type=int, default=1000)
+    parser.add_argument("--techniques", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(generate_snapshot(args.out, cves=args.cves, iocs=args.iocs, techniques=args.techniques, seed=args.seed))
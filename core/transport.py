@@ -0,0 +1,152 @@
+# core/transport.py
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import httpx
+from core.settings import settings
+
+# Headers that describe the wire encoding; recorded bodies are stored decoded
+_HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+# ========================
+# Request keys
+# ========================
+def _canonical_body(content: bytes) -> bytes:
+    """JSON bodies are re-serialized so key order/whitespace don't change the key."""
+    if not content:
+        return b""
+    try:
+        return json.dumps(json.loads(content), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        return content
+
+
+def request_key(method: str, url: str, content: bytes = b"") -> tuple[str, str]:
+    """(host, hash) identifying a feed request independent of header/param order."""
+    parsed = httpx.URL(url)
+    params = sorted(parsed.params.multi_items())
+    canonical = f"{method.upper()} {parsed.scheme}://{parsed.host}{parsed.path}?{params}".encode()
+    digest = hashlib.sha1(canonical + b"\n" + _canonical_body(content)).hexdigest()
+    return parsed.host, digest
+
+
+def snapshot_paths(snapshot_dir: str, method: str, url: str, content: bytes = b"") -> tuple[str, str]:
+    host, digest = request_key(method, url, content)
+    base = os.path.join(snapshot_dir, host, digest)
+    return base + ".meta.json", base + ".body.gz"
+
+
+def write_snapshot(snapshot_dir: str, method: str, url: str, status: int, headers: dict,
+                   body: bytes, content: bytes = b""):
+    """Store one response (metadata + gzip-compressed body) for later replay."""
+    meta_path, body_path = snapshot_paths(snapshot_dir, method, url, content)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    with gzip.open(body_path, "wb", compresslevel=6) as f:
+        f.write(body)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "method": method.upper(),
+            "url": url,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in _HOP_HEADERS},
+            "size": len(body),
+        }, f, indent=1)
+
+
+# ========================
+# Transports
+# ========================
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests to the network and saves every response under snapshot_dir."""
+
+    def __init__(self, snapshot_dir: str):
+        self.snapshot_dir = snapshot_dir
+        self._inner = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._inner.handle_async_request(request)
+        raw = httpx.Response(response.status_code, headers=response.headers, stream=response.stream, request=request)
+        body = await raw.aread()  # decoded body
+        await asyncio.to_thread(
+            write_snapshot, self.snapshot_dir, request.method, str(request.url),
+            response.status_code, dict(raw.headers), body, request.content,
+        )
+        headers = {k: v for k, v in raw.headers.items() if k.lower() not in _HOP_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+class _ThrottledStream(httpx.AsyncByteStream):
+    """Streams a gzip file back in chunks, optionally capped at `throughput` bytes/s."""
+
+    def __init__(self, body_path: str, throughput: int, chunk_size: int = 64 * 1024):
+        self.body_path = body_path
+        self.throughput = throughput
+        self.chunk_size = chunk_size
+
+    async def __aiter__(self):
+        with gzip.open(self.body_path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                if self.throughput:
+                    await asyncio.sleep(len(chunk) / self.throughput)
+                yield chunk
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serves recorded (or synthetic) responses from snapshot_dir instead of the
+    network, with a configurable per-request latency and throughput cap.
+    Unknown requests get a 404 so fetchers fail the same way they would live.
+    """
+
+    def __init__(self, snapshot_dir: str, latency_ms: int = 0, throughput_kbps: int = 0):
+        self.snapshot_dir = snapshot_dir
+        self.latency = latency_ms / 1000.0
+        self.throughput = throughput_kbps * 1024
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        meta_path, body_path = snapshot_paths(self.snapshot_dir, request.method, str(request.url), request.content)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not os.path.exists(meta_path):
+            return httpx.Response(404, text=f"no snapshot for {request.method} {request.url}", request=request)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return httpx.Response(
+            meta["status"],
+            headers=meta["headers"],
+            stream=_ThrottledStream(body_path, self.throughput),
+            request=request,
+        )
+
+
+# ========================
+# Client factory used by every fetcher
+# ========================
+def replaying() -> bool:
+    return settings.FEED_MODE == "replay"
+
+
+def feed_client(**kwargs) -> httpx.AsyncClient:
+    """
+    httpx client for feed requests. FEED_MODE selects the transport:
+    live (network), record (network + save responses) or replay (local snapshots).
+    """
+    mode = settings.FEED_MODE
+    if mode == "record":
+        kwargs["transport"] = RecordingTransport(settings.FEED_SNAPSHOT_DIR)
+    elif mode == "replay":
+        kwargs["transport"] = ReplayTransport(
+            settings.FEED_SNAPSHOT_DIR,
+            latency_ms=settings.REPLAY_LATENCY_MS,
+            throughput_kbps=settings.REPLAY_THROUGHPUT_KBPS,
+        )
+    return httpx.AsyncClient(**kwargs)
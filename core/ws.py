@@ -1,22 +1,50 @@
 # core/ws.py
+import asyncio
 import json
-from typing import List
+from typing import Dict, List
 from fastapi import WebSocket
+from core.metrics import Gauge
+from core.settings import settings
 
 class ConnectionManager:
+    """
+    Tracks alert WebSocket clients. Each connection gets its own send queue
+    drained by a writer task, so one slow client never stalls a broadcast.
+    """
+
     def __init__(self):
         self.active: List[WebSocket] = []
+        self._queues: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
 
     async def connect(self, websocket: WebSocket):
         # Accept and add to active connections
         await websocket.accept()
         self.active.append(websocket)
+        queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_MAX)
+        self._queues[websocket] = queue
+        self._writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
 
     def disconnect(self, websocket: WebSocket):
         try:
             self.active.remove(websocket)
         except ValueError:
             pass
+        self._queues.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        try:
+            while True:
+                text = await queue.get()
+                await websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # remove dead connections
+            self.disconnect(websocket)
 
     async def send_personal(self, websocket: WebSocket, message: dict):
         await websocket.send_text(json.dumps(message))
@@ -25,14 +53,25 @@ class ConnectionManager:
         text = json.dumps(message)
         # iterate copy to avoid mutation problems
         for ws in list(self.active):
+            queue = self._queues.get(ws)
+            if queue is None:
+                continue
             try:
-                await ws.send_text(text)
-            except Exception:
-                # remove dead connections
+                queue.put_nowait(text)
+            except asyncio.QueueFull:
+                # client can't keep up; drop it rather than buffer without bound
+                self.disconnect(ws)
                 try:
-                    self.active.remove(ws)
-                except ValueError:
+                    await ws.close(code=1013)
+                except Exception:
                     pass
 
+    def queue_depth(self) -> int:
+        return sum(q.qsize() for q in self._queues.values())
+
 # single shared manager used by the app
 manager = ConnectionManager()
+
+# Scrape-time gauges (no cost on the send path)
+Gauge("websocket_connections", "Open alert WebSocket connections", function=lambda: len(manager.active))
+Gauge("websocket_send_queue_depth", "Messages waiting in WebSocket send queues", function=manager.queue_depth)
@@ -0,0 +1,111 @@
+# serve.py
+"""
+Production launcher: N worker processes behind one listening socket.
+
+    python serve.py                          # WEB_WORKERS (default: one per core) on WEB_BIND
+    python serve.py --workers 8 --bind 0.0.0.0:5000
+    kill -HUP <master pid>                   # graceful restart of all workers
+
+The app and AI model are loaded once in the gunicorn master (preload) and
+inherited by the forked workers, so the model's memory pages are shared
+copy-on-write instead of loaded N times. Each worker runs uvicorn on
+uvloop + httptools (when installed) and answers 503 beyond WEB_WORKER_CONCURRENCY in-flight
+requests. Without gunicorn (e.g. on Windows) it falls back to
+`uvicorn --workers`, which cannot preload.
+"""
+import argparse
+import gc
+import importlib.util
+import multiprocessing
+from core.settings import settings
+from core.startup import startup_report
+
+
+def worker_count() -> int:
+    return settings.WEB_WORKERS or multiprocessing.cpu_count()
+
+
+def uvicorn_kwargs() -> dict:
+    # uvloop does not exist on Windows; "auto" picks asyncio / h11 when missing
+    return {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "auto",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "auto",
+        "limit_concurrency": settings.WEB_WORKER_CONCURRENCY,
+        "backlog": settings.WEB_BACKLOG,
+        "timeout_keep_alive": settings.WEB_KEEPALIVE,
+    }
+
+
+def preload_shared_state():
+    """Run in the master before forking: load what workers should share."""
+    from core.scoring import get_model
+    get_model()
+    # move everything allocated so far out of the GC's generations so worker
+    # collections don't touch (and copy) the shared pages
+    gc.freeze()
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+    from uvicorn.workers import UvicornWorker
+
+    class CTIWorker(UvicornWorker):
+        CONFIG_KWARGS = uvicorn_kwargs()
+
+    class CTIServer(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            if self.cfg.preload_app:
+                preload_shared_state()
+            return app
+
+    CTIServer({
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": CTIWorker,
+        "preload_app": args.preload,
+        "graceful_timeout": settings.WEB_GRACEFUL_TIMEOUT,
+        "timeout": settings.WEB_GRACEFUL_TIMEOUT * 2,
+        "keepalive": settings.WEB_KEEPALIVE,
+        "backlog": settings.WEB_BACKLOG,
+        # recycle workers now and then; jitter keeps them from restarting together
+        "max_requests": settings.WEB_MAX_REQUESTS,
+        "max_requests_jitter": settings.WEB_MAX_REQUESTS // 10,
+        "proc_name": "cyber-threat-platform",
+        "post_fork": lambda server, worker: startup_report.forked(),
+    }).run()
+
+
+def run_uvicorn(args):
+    import uvicorn
+    host, _, port = args.bind.rpartition(":")
+    print("⚠️ gunicorn not available: starting uvicorn workers without preload/model sharing.")
+    uvicorn.run("app:app", host=host or "0.0.0.0", port=int(port), workers=args.workers, **uvicorn_kwargs())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with multiple workers")
+    parser.add_argument("--bind", default=settings.WEB_BIND, help="host:port to listen on")
+    parser.add_argument("--workers", type=int, default=worker_count())
+    parser.add_argument("--no-preload", dest="preload", action="store_false", default=settings.WEB_PRELOAD,
+                        help="import the app in each worker (HUP then also reloads code)")
+    args = parser.parse_args(argv)
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        run_uvicorn(args)
+        return
+    run_gunicorn(args)
+
+
+if __name__ == "__main__":
+    main()
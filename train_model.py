@@ -12,15 +12,23 @@ from sklearn.preprocessing import StandardScaler
 from imblearn.over_sampling import RandomOverSampler
 from imblearn.pipeline import Pipeline as ImbPipeline
 
-from core.db import threats_collection
+from core.db import threats_read_collection
 from core.settings import settings
+from core.snapshot import snapshot_frame, snapshot_usable
 
 
 # ===============================
 # Load Data
 # ===============================
 async def load_data():
-    cursor = threats_collection.find({})
+    fields = ["description", "cvss_score", "epss_score", "percentile", "kev_exploited", "severity"]
+    if snapshot_usable():
+        # columnar snapshot (core/snapshot.py): no query against MongoDB at all
+        df = snapshot_frame(fields)
+        if df is not None:
+            return df
+    # training tolerates replication lag: read from a secondary, only the needed fields
+    cursor = threats_read_collection.find({}, {f: 1 for f in fields})
     data = await cursor.to_list(length=10000)  # pull more samples if available
     return data
 
@@ -47,8 +55,9 @@ def preprocess(data):
         df["kev_exploited"] = False
     df["kev_exploited"] = df["kev_exploited"].fillna(False).astype(int)
 
-    # Label strategy
-    if "severity" in df.columns:
+    # Label strategy (the snapshot always has a severity column, all null
+    # when no fetcher set it: that counts as missing)
+    if "severity" in df.columns and df["severity"].notna().any():
         df["label"] = df["severity"].fillna("low")
     else:
         df["label"] = pd.cut(
@@ -73,7 +82,7 @@ def preprocess(data):
 # ===============================
 async def train_model():
     data = await load_data()
-    if not data:
+    if data is None or len(data) == 0:
         print("No data found in MongoDB. Run /threats/fetch_all first.")
         return
 